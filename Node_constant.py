@@ -4,3 +4,9 @@ GENERATE = "generate"
 QUERY_REWRITE="query_rewrite"
 WEBSEARCH = "web_search"
 ROUTE_QUESTION = "route_question"   # cohérent avec graph.py
+
+
+# Clé des événements de streaming token par token émis par run(..., stream_tokens=True)
+GENERATION_TOKEN = "generation_token"
+# Clé de l'événement émis par run() quand la réponse vient du cache sémantique
+SEMANTIC_CACHE = "semantic_cache"
@@ -0,0 +1,252 @@
+# batch_qa.py
+"""
+Réponses en lot : un fichier JSONL de questions en entrée, un fichier JSONL de réponses en sortie.
+
+Toutes les questions partagent un seul système RAG, un seul retriever (et son routeur
+local) et les modèles du registre. Elles tournent en parallèle, avec une concurrence
+bornée. Les modèles locaux sont enveloppés pour regrouper les appels concurrents
+(ingestion.models.ModelRegistry.enable_micro_batching) : les embeddings des questions
+et les reranks de plusieurs questions partent en un seul passage du modèle.
+
+Chaque réponse est écrite dès qu'elle est prête : id, question, réponse, sources,
+chemin dans le graphe et temps par nœud. Le fichier de sortie sert de point de reprise.
+Une relance avec la même sortie saute les questions déjà répondues et refait celles en
+erreur (sauf --keep-errors).
+
+Entrée : une question par ligne, {"id": "q1", "question": "..."} (sans id : numéro de ligne).
+
+    python batch_qa.py questions.jsonl --files docs/a.pdf docs/b.pdf --concurrency 8
+    python batch_qa.py questions.jsonl --default-corpus -o answers.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from Node_constant import GENERATE, SEMANTIC_CACHE
+from nodes.generate import GENERATION_ERROR_MESSAGE
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+def load_questions(path: str) -> List[Dict[str, Any]]:
+    """Lit le JSONL d'entrée ; chaque question reçoit un id stable (celui du fichier ou le numéro de ligne)."""
+    questions: List[Dict[str, Any]] = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no} : JSON invalide ({e})") from e
+            if isinstance(record, str):
+                record = {"question": record}
+            question = str(record.get("question") or "").strip()
+            if not question:
+                raise ValueError(f"{path}:{line_no} : champ 'question' manquant")
+            qid = str(record.get("id", f"line-{line_no}"))
+            if qid in seen:
+                raise ValueError(f"{path}:{line_no} : id en double {qid!r}")
+            seen.add(qid)
+            questions.append({**record, "id": qid, "question": question})
+    return questions
+
+def load_checkpoint(path: str, retry_errors: bool = True) -> Dict[str, Dict[str, Any]]:
+    """
+    Relit une sortie existante et la réécrit compactée : une ligne par id (la dernière),
+    sans la ligne tronquée d'un arrêt brutal ni, avec `retry_errors`, les questions en erreur.
+    Renvoie les réponses conservées, par id.
+    """
+    if not os.path.exists(path):
+        return {}
+    done: Dict[str, Dict[str, Any]] = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(record, dict) and "id" in record:
+                done[str(record["id"])] = record
+    if retry_errors:
+        done = {qid: record for qid, record in done.items() if not record.get("error")}
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for record in done.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+    return done
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+async def answer_questions(questions: List[Dict[str, Any]], output_path: str, rag: Optional[Any] = None,
+                           retriever: Optional[Any] = None, router: Optional[Any] = None,
+                           corpus_key: Optional[str] = None, concurrency: int = BATCH_CONCURRENCY,
+                           retry_errors: bool = True,
+                           on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Répond aux `questions` (dicts avec "id" et "question") et ajoute une ligne JSON par
+    réponse à `output_path`, au fil de l'eau. Les ids déjà présents dans la sortie sont
+    sautés. Renvoie le bilan du lot (réponses, erreurs, latences).
+    """
+    from graph import document_sources, get_rag_system
+    from instrumentation import RequestTrace
+
+    rag = rag or get_rag_system()
+    done = load_checkpoint(output_path, retry_errors=retry_errors)
+    todo = [q for q in questions if q["id"] not in done]
+    latencies: List[float] = []
+    errors = 0
+    written = set()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    out = open(output_path, "a", encoding="utf-8")
+
+    async def ask(item: Dict[str, Any]) -> None:
+        nonlocal errors
+        async with semaphore:
+            trace = RequestTrace(question=item["question"])
+            config = {"configurable": {"thread_id": f"batch-{os.getpid()}-{item['id']}"}}
+            generation, documents, path, error = "", [], [], None
+            try:
+                async for event in rag.arun(item["question"], retriever=retriever, config=config, router=router,
+                                            corpus_fingerprint=corpus_key, trace=trace):
+                    for node, output in event.items():
+                        path.append(node)
+                        if not isinstance(output, dict):
+                            continue
+                        if output.get("documents"):
+                            documents = output["documents"]
+                        if node in (GENERATE, SEMANTIC_CACHE) and output.get("generation"):
+                            generation = output["generation"]
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            totals = trace.totals()
+            record = {
+                "id": item["id"],
+                "question": item["question"],
+                "answer": generation,
+                "sources": document_sources(documents),
+                "path": path,
+                "source": trace.source,
+                "seconds": round(trace.seconds, 4),
+                "seconds_by_node": totals["seconds_by_node"],
+                "llm_calls": totals["llm_calls"],
+                "prompt_tokens": totals["prompt_tokens"],
+                "completion_tokens": totals["completion_tokens"],
+            }
+            if error or not generation or generation == GENERATION_ERROR_MESSAGE:
+                record["error"] = error or "aucune réponse générée"
+                errors += 1
+            else:
+                latencies.append(trace.seconds)
+            # Écrit tout de suite : la sortie est le point de reprise
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            written.add(item["id"])
+            if on_result is not None:
+                on_result(record)
+
+    start = time.perf_counter()
+    try:
+        # return_exceptions : une question en échec n'interrompt pas les autres, et le
+        # fichier n'est fermé qu'une fois toutes les tâches terminées
+        outcomes = await asyncio.gather(*(ask(item) for item in todo), return_exceptions=True)
+    finally:
+        out.close()
+    wall = time.perf_counter() - start
+    for item, outcome in zip(todo, outcomes):
+        if isinstance(outcome, BaseException):
+            print(f"⚠️ Question {item['id']} interrompue: {type(outcome).__name__}: {outcome}")
+            if item["id"] not in written:
+                # Aucune ligne écrite : la question sera refaite à la reprise
+                errors += 1
+    return {
+        "total": len(questions),
+        "skipped": len(questions) - len(todo),
+        "answered": len(todo) - errors,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_qps": round(len(todo) / wall, 3) if wall > 0 else 0.0,
+        "latency_p50": round(_percentile(latencies, 0.5), 3),
+        "latency_p95": round(_percentile(latencies, 0.95), 3),
+    }
+
+def prepare_corpus(files: Optional[List[str]], default_corpus: bool):
+    """Retriever, routeur local et clé de corpus partagés par tout le lot."""
+    if files:
+        from ingestion.retriever_cache import retriever_registry
+
+        missing = [path for path in files if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"Fichiers introuvables : {', '.join(missing)}")
+        corpus_key, retriever = retriever_registry.get_or_create(files)
+        return retriever, retriever_registry.router(corpus_key), corpus_key
+    if default_corpus:
+        from ingestion.ingestion import DEFAULT_CORPUS_KEY, initialize_default_retriever
+
+        return initialize_default_retriever(), None, DEFAULT_CORPUS_KEY
+    return None, None, None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Réponses en lot à un fichier JSONL de questions.")
+    parser.add_argument("input", help="Fichier JSONL des questions")
+    parser.add_argument("-o", "--output", help="Fichier JSONL des réponses (défaut : <input>.answers.jsonl)")
+    parser.add_argument("--files", nargs="+", help="Documents du corpus (sinon : recherche web et connaissances du modèle)")
+    parser.add_argument("--default-corpus", action="store_true", help="Utiliser le corpus par défaut (URLs prédéfinies)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Questions traitées en parallèle")
+    parser.add_argument("--limit", type=int, help="Ne traiter que les N premières questions")
+    parser.add_argument("--keep-errors", action="store_true", help="À la reprise, ne pas refaire les questions en erreur")
+    parser.add_argument("--no-semantic-cache", action="store_true", help="Désactiver le cache sémantique")
+    parser.add_argument("--no-micro-batching", action="store_true", help="Ne pas regrouper les appels aux modèles locaux")
+    parser.add_argument("--batch-wait-ms", type=float, help="Attente max pour regrouper les appels aux modèles")
+    args = parser.parse_args()
+
+    questions = load_questions(args.input)[: args.limit]
+    output = args.output or f"{os.path.splitext(args.input)[0]}.answers.jsonl"
+
+    from graph import AdaptiveRAGSystem
+    from ingestion.models import model_registry
+
+    batched: Dict[str, Any] = {}
+    uses_models = bool(args.files or args.default_corpus) or not args.no_semantic_cache
+    if uses_models and not args.no_micro_batching:
+        # Avant les retrievers : ils capturent les modèles à leur création
+        kwargs = {} if args.batch_wait_ms is None else {"max_wait_ms": args.batch_wait_ms}
+        batched = model_registry.enable_micro_batching(**kwargs)
+    retriever, router, corpus_key = prepare_corpus(args.files, args.default_corpus)
+    rag = AdaptiveRAGSystem(use_semantic_cache=not args.no_semantic_cache)
+
+    print(f"🚀 {len(questions)} questions, concurrence {args.concurrency}, sortie {output}")
+
+    def progress(record: Dict[str, Any]) -> None:
+        status = f"❌ {record['error']}" if record.get("error") else f"✅ {record['seconds']:.2f}s"
+        print(f"  [{record['id']}] {status}")
+
+    try:
+        summary = asyncio.run(answer_questions(
+            questions, output, rag=rag, retriever=retriever, router=router, corpus_key=corpus_key,
+            concurrency=args.concurrency, retry_errors=not args.keep_errors, on_result=progress,
+        ))
+    except KeyboardInterrupt:
+        print(f"\n⏸️ Interrompu : relancer la même commande pour reprendre (réponses déjà écrites dans {output}).")
+        return
+
+    print(f"\n📊 {summary['answered']} réponses, {summary['errors']} erreurs, {summary['skipped']} déjà faites "
+          f"en {summary['wall_seconds']:.1f}s ({summary['throughput_qps']} q/s, "
+          f"p50 {summary['latency_p50']:.2f}s, p95 {summary['latency_p95']:.2f}s)")
+    for name, model in batched.items():
+        stats = model.batcher.stats()
+        print(f"    {name:<14} {stats['calls']} appels regroupés en {stats['batches']} passages "
+              f"({stats['mean_batch_items']} éléments en moyenne)")
+    print(f"💾 Réponses dans {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+"""Offline benchmarks: fake LLM / search / models, synthetic corpora, JSON reports."""
@@ -0,0 +1,223 @@
+# benchmarks/ann_benchmark.py
+"""
+Recall vs latency of the vector leg's index options, on synthetic embeddings.
+
+The data are unit-norm vectors drawn around random cluster centres (closer to sentence
+embeddings than isotropic noise); queries are noisy copies of held-out vectors, and the
+ground truth is an exact float32 scan. Each configuration is built, then queried, and
+reported with recall@k, p50/p95 query latency, build time and total index size:
+  - flat: exact float32 scan (the reference for latency);
+  - hnsw: Chroma collections over the HNSW_M x HNSW_EF_CONSTRUCTION grid (one collection
+    per pair, since both are fixed at creation), each queried at every ef_search (Chroma
+    only reads ef_search when it loads the index, so the client is reopened each time);
+  - int8 / binary: QuantizedVectorIndex (ingestion/vector_index.py) at every
+    rescore factor, files memory-mapped from a temporary directory.
+In quantized mode the store keeps its vectors only in the quantized files: Chroma holds a
+1-dimension placeholder per chunk, so its HNSW is reduced to the graph links. The total
+`bytes` of those rows counts the codes, the float32 rescoring vectors and that placeholder
+graph (`hnsw_bytes`). `resident_bytes` is what stays in RAM under steady query load: the
+codes (every query scans them all) plus the graph; the float32 vectors are memory-mapped
+and only the candidates' pages are read, so the OS may evict them.
+The report is written as JSON next to the run_benchmarks.py reports.
+
+    python -m benchmarks.ann_benchmark --vectors 100000 --queries 200
+    python -m benchmarks.ann_benchmark --m 8 16 32 --ef-construction 100 200 --ef-search 10 50 100 200
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.run_benchmarks import RESULTS_DIR, git_revision, peak_rss_mb
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int, spread: float, rng: np.random.Generator) -> np.ndarray:
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, size=n)] + spread * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbours(data: np.ndarray, queries: np.ndarray, k: int) -> List[List[int]]:
+    norms = (data ** 2).sum(axis=1)
+    truth = []
+    for query in queries:
+        distances = norms - 2.0 * (data @ query)
+        top = np.argpartition(distances, k - 1)[:k]
+        truth.append(top[np.argsort(distances[top])].tolist())
+    return truth
+
+
+def measure(search: Callable[[np.ndarray], List[int]], queries: np.ndarray, truth: List[List[int]], k: int) -> Dict[str, Any]:
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[:k]) & set(expected))
+    array = np.asarray(latencies) * 1000
+    return {"recall": round(hits / (k * len(queries)), 4), "p50_ms": round(float(np.percentile(array, 50)), 3),
+            "p95_ms": round(float(np.percentile(array, 95)), 3)}
+
+
+def hnsw_bytes(data: np.ndarray, m: int) -> int:
+    """Estimated HNSW size: the float32 vectors plus ~M x 2 neighbours of 4 bytes per vector at level 0."""
+    return data.nbytes + len(data) * m * 2 * 4
+
+
+def placeholder_hnsw_bytes(n_vectors: int, m: int) -> int:
+    """HNSW that Chroma still builds in quantized mode, over PLACEHOLDER_EMBEDDING."""
+    from ingestion.vector_index import PLACEHOLDER_EMBEDDING
+
+    return hnsw_bytes(np.zeros((n_vectors, len(PLACEHOLDER_EMBEDDING)), dtype=np.float32), m)
+
+
+def bench_flat(data: np.ndarray, queries: np.ndarray, truth: List[List[int]], k: int) -> List[Dict[str, Any]]:
+    norms = (data ** 2).sum(axis=1)
+
+    def search(query: np.ndarray) -> List[int]:
+        distances = norms - 2.0 * (data @ query)
+        top = np.argpartition(distances, k - 1)[:k]
+        return top[np.argsort(distances[top])].tolist()
+
+    return [{"index": "flat", "build_s": 0.0, "bytes": data.nbytes, **measure(search, queries, truth, k)}]
+
+
+def bench_hnsw(data: np.ndarray, queries: np.ndarray, truth: List[List[int]], args: argparse.Namespace,
+               workdir: str) -> List[Dict[str, Any]]:
+    import chromadb
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    from ingestion.vector_index import hnsw_metadata
+
+    path = os.path.join(workdir, "chroma")
+    client = chromadb.PersistentClient(path=path)
+    ids = [str(i) for i in range(len(data))]
+    rows = []
+    for m in args.m:
+        for ef_construction in args.ef_construction:
+            name = f"ann-m{m}-efc{ef_construction}"
+            collection = client.create_collection(name, metadata=hnsw_metadata(m, ef_construction, args.ef_search[0]),
+                                                  embedding_function=None)
+            start = time.perf_counter()
+            for offset in range(0, len(data), args.batch_size):
+                collection.add(ids=ids[offset:offset + args.batch_size],
+                               embeddings=data[offset:offset + args.batch_size])
+            build = time.perf_counter() - start
+            size = hnsw_bytes(data, m)
+            for ef_search in args.ef_search:
+                collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+                SharedSystemClient.clear_system_cache()
+                client = chromadb.PersistentClient(path=path)
+                collection = client.get_collection(name)
+
+                def search(query: np.ndarray) -> List[int]:
+                    result = collection.query(query_embeddings=[query], n_results=args.k, include=[])
+                    return [int(i) for i in result["ids"][0]]
+
+                rows.append({"index": "hnsw", "m": m, "ef_construction": ef_construction, "ef_search": ef_search,
+                             "build_s": round(build, 3), "bytes": size, **measure(search, queries, truth, args.k)})
+                print_row(rows[-1])
+            client.delete_collection(name)
+    return rows
+
+
+def bench_quantized(data: np.ndarray, queries: np.ndarray, truth: List[List[int]], args: argparse.Namespace,
+                    workdir: str) -> List[Dict[str, Any]]:
+    from ingestion.vector_index import HNSW_M, QuantizedVectorIndex
+
+    ids = [str(i) for i in range(len(data))]
+    chroma_bytes = placeholder_hnsw_bytes(len(data), HNSW_M)
+    rows = []
+    for quantization in args.quantization:
+        start = time.perf_counter()
+        index = QuantizedVectorIndex(quantization)
+        for offset in range(0, len(data), args.batch_size):
+            index.add(ids[offset:offset + args.batch_size], data[offset:offset + args.batch_size])
+        index.save(os.path.join(workdir, quantization))
+        build = time.perf_counter() - start
+        stats = index.stats()
+        for factor in args.rescore:
+
+            def search(query: np.ndarray) -> List[int]:
+                return [int(i) for i, _ in index.search(query, k=args.k, rescore_factor=factor)]
+
+            rows.append({"index": quantization, "rescore_factor": factor, "build_s": round(build, 3),
+                         "bytes": stats["code_bytes"] + stats["vector_bytes"] + chroma_bytes,
+                         "scanned_bytes": stats["code_bytes"], "float_bytes": stats["vector_bytes"],
+                         "hnsw_bytes": chroma_bytes, "resident_bytes": stats["code_bytes"] + chroma_bytes,
+                         **measure(search, queries, truth, args.k)})
+            print_row(rows[-1])
+    return rows
+
+
+def print_row(row: Dict[str, Any]) -> None:
+    params = ", ".join(f"{key}={row[key]}" for key in ("m", "ef_construction", "ef_search", "rescore_factor") if key in row)
+    print(f"  {row['index']:<7} {params:<40} recall@k {row['recall']:.3f}  p50 {row['p50_ms']:.2f} ms  "
+          f"p95 {row['p95_ms']:.2f} ms  build {row['build_s']:.1f}s  {row['bytes'] / 2**20:.1f} MB"
+          + (f" (scan {row['scanned_bytes'] / 2**20:.1f} MB, resident {row['resident_bytes'] / 2**20:.1f} MB)"
+             if "scanned_bytes" in row else ""))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rappel / latence des index vectoriels (HNSW, int8, binaire).")
+    parser.add_argument("--vectors", type=int, default=20000, help="Vecteurs indexés")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200, help="Centres des vecteurs synthétiques")
+    parser.add_argument("--spread", type=float, default=0.6, help="Dispersion autour des centres")
+    parser.add_argument("--noise", type=float, default=0.3, help="Bruit des requêtes (relatif à spread)")
+    parser.add_argument("-k", "--k", type=int, default=10)
+    parser.add_argument("--m", type=int, nargs="+", default=[16], help="Valeurs de HNSW M")
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--quantization", nargs="*", default=["int8", "binary"], choices=["int8", "binary"])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 4, 16], help="Facteurs de re-notation float32")
+    parser.add_argument("--skip-hnsw", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Fichier JSON du rapport (défaut : benchmarks/results/)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_vectors(args.vectors + args.queries, args.dim, args.clusters, args.spread, rng)
+    data, held_out = vectors[:args.vectors], vectors[args.vectors:]
+    queries = held_out + args.noise * args.spread / np.sqrt(args.dim) * rng.normal(size=held_out.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_neighbours(data, queries, args.k)
+    print(f"🧪 {args.vectors} vecteurs de dimension {args.dim}, {args.queries} requêtes, k={args.k}")
+
+    revision = git_revision()
+    workdir = tempfile.mkdtemp(prefix="rag-ann-")
+    try:
+        rows = bench_flat(data, queries, truth, args.k)
+        print_row(rows[0])
+        if not args.skip_hnsw:
+            rows += bench_hnsw(data, queries, truth, args, workdir)
+        rows += bench_quantized(data, queries, truth, args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {**revision, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "cpu_count": os.cpu_count(),
+                 "args": vars(args), "peak_rss_mb": peak_rss_mb()},
+        "results": rows,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"ann-{time.strftime('%Y%m%d-%H%M%S')}-{revision['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Rapport écrit dans {output}")
+
+
+if __name__ == "__main__":
+    main()
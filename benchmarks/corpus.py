@@ -0,0 +1,80 @@
+# benchmarks/corpus.py
+"""
+Synthetic, reproducible corpora and question sets.
+
+Each document is a sequence of paragraphs, and each paragraph draws its sentences from
+one topic's vocabulary. The semantic chunker therefore finds real breakpoints, and
+questions built from a topic's words have relevant chunks to retrieve. Freshness
+questions ("latest news ...") go down the web search path.
+"""
+import os
+import random
+from typing import List, Tuple
+
+COMMON_WORDS = ["system", "method", "result", "process", "model", "data", "value", "approach", "study",
+                "analysis", "design", "control", "signal", "network", "structure", "pattern"]
+SENTENCE_WORDS = (10, 18)
+SENTENCES_PER_PARAGRAPH = (4, 9)
+# The chunker caps chunks at MAX_CHUNK_CHARS (2000); ~15 sentences of ~110 chars each
+SENTENCES_PER_CHUNK = 15
+
+
+def _topic_vocabulary(rng: random.Random, n_topics: int, words_per_topic: int = 30) -> List[List[str]]:
+    syllables = ["ka", "lo", "mi", "re", "tu", "sa", "no", "vi", "pe", "da", "zo", "fu", "gri", "ban", "tel", "mor"]
+    vocabularies = []
+    for _ in range(n_topics):
+        words = set()
+        while len(words) < words_per_topic:
+            words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+        vocabularies.append(sorted(words))
+    return vocabularies
+
+
+def _sentence(rng: random.Random, vocabulary: List[str]) -> str:
+    n = rng.randint(*SENTENCE_WORDS)
+    words = [rng.choice(vocabulary) if rng.random() < 0.7 else rng.choice(COMMON_WORDS) for _ in range(n)]
+    return " ".join(words).capitalize() + "."
+
+
+class SyntheticCorpus:
+    def __init__(self, target_chunks: int, n_documents: int = 0, n_topics: int = 50, seed: int = 0):
+        self.target_chunks = target_chunks
+        self.n_documents = n_documents or max(1, target_chunks // 20)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.topics = _topic_vocabulary(self.rng, n_topics)
+
+    def documents(self) -> List[Tuple[str, str]]:
+        """(name, text) pairs totalling about `target_chunks * SENTENCES_PER_CHUNK` sentences."""
+        sentences_per_document = max(1, self.target_chunks * SENTENCES_PER_CHUNK // self.n_documents)
+        documents = []
+        for d in range(self.n_documents):
+            paragraphs, written = [], 0
+            while written < sentences_per_document:
+                vocabulary = self.rng.choice(self.topics)
+                n = min(self.rng.randint(*SENTENCES_PER_PARAGRAPH), sentences_per_document - written)
+                paragraphs.append(" ".join(_sentence(self.rng, vocabulary) for _ in range(n)))
+                written += n
+            documents.append((f"doc-{self.seed}-{d:06d}.txt", "\n\n".join(paragraphs)))
+        return documents
+
+    def write(self, directory: str) -> List[str]:
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for name, text in self.documents():
+            path = os.path.join(directory, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            paths.append(path)
+        return paths
+
+    def questions(self, n: int, web_share: float = 0.2) -> List[str]:
+        rng = random.Random(self.seed + 1)
+        questions = []
+        for i in range(n):
+            words = rng.sample(rng.choice(self.topics), 3)
+            if rng.random() < web_share:
+                questions.append(f"What is the latest news about {words[0]} {words[1]}?")
+            else:
+                questions.append(f"How does {words[0]} relate to {words[1]} and {words[2]}?")
+        return questions
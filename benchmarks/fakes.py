@@ -0,0 +1,248 @@
+# benchmarks/fakes.py
+"""
+Deterministic local stand-ins for Groq, Tavily and the HuggingFace models.
+
+- `FakeChatModel` answers the prompts of chains/ and nodes/ with a configurable latency
+  (per call and per streamed token). `with_structured_output` returns valid RouteQuery,
+  GradeDocuments, GradeDocumentsBatch, RewrittenQuestion, GradeAnswer and
+  GradeHallucinations objects. Its decisions follow simple rules: freshness words
+  route to web search, and a document is relevant when it shares enough question terms.
+  Token usage is reported so the instrumentation sees realistic counts.
+- `FakeSearchTool` mimics TavilySearch.invoke/ainvoke output.
+- `FakeEmbeddings` (feature hashing) and `FakeCrossEncoder` (term overlap) replace the
+  local models; both count their work for throughput figures.
+"""
+import asyncio
+import re
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_FRESHNESS = re.compile(r"\b(today|latest|news|current|this week|right now|price|weather)\b", re.IGNORECASE)
+_STOPWORDS = {"the", "and", "for", "are", "what", "how", "does", "with", "about", "which", "that", "this",
+              "from", "into", "question", "user", "document", "retrieved", "explain", "detail"}
+
+
+def terms(text: str) -> Set[str]:
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 2 and w not in _STOPWORDS}
+
+
+def overlap(question: str, document: str) -> float:
+    """Share of the question terms found in the document."""
+    q = terms(question)
+    return len(q & terms(document)) / len(q) if q else 0.0
+
+
+def _between(text: str, start: str, end: Optional[str] = None) -> str:
+    i = text.find(start)
+    if i < 0:
+        return ""
+    text = text[i + len(start):]
+    if end is not None and end in text:
+        text = text[: text.find(end)]
+    return text.strip()
+
+
+class FakeChatModel(BaseChatModel):
+    latency: float = 0.05          # seconds before the first token
+    token_latency: float = 0.0     # seconds per streamed token
+    relevance_threshold: float = 0.34
+    answer_words: int = 60
+    structured_schema: Optional[Any] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Any:
+        model = self.model_copy(update={"structured_schema": schema})
+        return model | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+    # --- Responses ---
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(m.content) for m in messages)
+        human = str(messages[-1].content) if messages else ""
+        schema = self.structured_schema
+        if schema is None:
+            return self._answer(prompt, human)
+        name = schema.__name__
+        if name == "RouteQuery":
+            datasource = "web_search" if _FRESHNESS.search(human) else "vectorstore"
+            return schema(datasource=datasource).model_dump_json()
+        if name == "GradeDocuments":
+            document = _between(human, "Retrieved document:", "User question:")
+            question = _between(human, "User question:")
+            relevant = overlap(question, document) >= self.relevance_threshold
+            return schema(binary_score="yes" if relevant else "no").model_dump_json()
+        if name == "GradeDocumentsBatch":
+            documents = _between(human, "Retrieved documents:", "User question:")
+            question = _between(human, "User question:")
+            parts = re.split(r"^\[(\d+)\] ", documents, flags=re.MULTILINE)
+            verdicts = [
+                {"index": int(parts[i]),
+                 "binary_score": "yes" if overlap(question, parts[i + 1]) >= self.relevance_threshold else "no"}
+                for i in range(1, len(parts) - 1, 2)
+            ]
+            return schema.model_validate({"verdicts": verdicts}).model_dump_json()
+        if name in ("RewrittenQuestion", "RewriteQuestion"):
+            question = (_between(human, "Original Question:", "Provide") or _between(human, "standalone question:")
+                        or human).strip()
+            return schema(rewritten_question=f"{question} explained in detail").model_dump_json()
+        if name == "GradeAnswer":
+            return schema(binary_score="yes").model_dump_json()
+        if name == "GradeHallucinations":
+            return schema(binary_score=True).model_dump_json()
+        raise ValueError(f"FakeChatModel: no canned output for schema {name}")
+
+    def _answer(self, prompt: str, human: str) -> str:
+        context = _between(prompt, "Context:", "Question:") or prompt
+        words = _WORD.findall(context)[: self.answer_words]
+        return "According to the context, " + " ".join(words) + "."
+
+    @staticmethod
+    def _usage(prompt_chars: int, content: str) -> Dict[str, int]:
+        input_tokens, output_tokens = prompt_chars // 4 + 1, len(content) // 4 + 1
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        content = self._respond(messages)
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        return AIMessage(content=content, usage_metadata=self._usage(prompt_chars, content))
+
+    # --- BaseChatModel ---
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[Any] = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[Any] = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    def _chunks(self, messages: List[BaseMessage]) -> Iterator[ChatGenerationChunk]:
+        message = self._message(messages)
+        pieces = re.findall(r"\S+\s*", str(message.content)) or [""]
+        for i, piece in enumerate(pieces):
+            usage = message.usage_metadata if i == len(pieces) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[Any] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            if run_manager is not None:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[Any] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(messages):
+            if self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+def fake_llm_factory(latency: float = 0.05, token_latency: float = 0.0):
+    """Factory for chains.llm.set_llm_factory (ChatGroq keyword arguments are ignored)."""
+
+    def factory(**kwargs: Any) -> FakeChatModel:
+        return FakeChatModel(latency=latency, token_latency=token_latency)
+
+    return factory
+
+
+class FakeSearchTool:
+    """TavilySearch stand-in: deterministic results mentioning the query terms."""
+
+    def __init__(self, latency: float = 0.2, max_results: int = 5):
+        self.latency = latency
+        self.max_results = max_results
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _results(self, query: str) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+        slug = "-".join(sorted(terms(query)))[:60] or "empty"
+        return {"query": query, "results": [
+            {"url": f"https://search.example/{slug}/{i}",
+             "content": f"Result {i} about {query}. " + " ".join(sorted(terms(query))) * 3,
+             "score": round(0.95 - 0.1 * i, 2)}
+            for i in range(self.max_results)
+        ]}
+
+    def invoke(self, query: str, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return self._results(query)
+
+    async def ainvoke(self, query: str, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        return self._results(query)
+
+
+@lru_cache(maxsize=200_000)
+def _feature(word: str, dim: int) -> Tuple[int, float]:
+    h = zlib.crc32(word.encode("utf-8"))
+    return h % dim, 1.0 if (h >> 16) & 1 else -1.0
+
+
+class FakeEmbeddings(Embeddings):
+    """Feature-hashing bag-of-words embeddings: similar texts get close vectors."""
+
+    def __init__(self, dim: int = 384, latency_per_text: float = 0.0):
+        self.dim = dim
+        self.latency_per_text = latency_per_text
+        self.texts_embedded = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        if self.latency_per_text:
+            time.sleep(self.latency_per_text * len(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _WORD.findall(text.lower()):
+                index, sign = _feature(word, self.dim)
+                vectors[row, index] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        with self._lock:
+            self.texts_embedded += len(texts)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+class FakeCrossEncoder:
+    """HuggingFaceCrossEncoder stand-in (`score(pairs)`), scoring by term overlap."""
+
+    model_name = "fake-cross-encoder"
+
+    def __init__(self, latency_per_pair: float = 0.0):
+        self.latency_per_pair = latency_per_pair
+        self.pairs_scored = 0
+
+    def score(self, pairs: Sequence[Tuple[str, str]]) -> List[float]:
+        if self.latency_per_pair:
+            time.sleep(self.latency_per_pair * len(pairs))
+        self.pairs_scored += len(pairs)
+        return [overlap(query, text) for query, text in pairs]
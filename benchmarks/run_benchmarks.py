@@ -0,0 +1,276 @@
+# benchmarks/run_benchmarks.py
+"""
+Offline end-to-end benchmark of the ingestion pipeline and AdaptiveRAGSystem.
+
+Groq, Tavily and the HuggingFace models are replaced by the deterministic fakes of
+benchmarks/fakes.py, so results depend only on this code and the machine. For every
+corpus size:
+  1. ingestion: synthetic .txt files -> PersistentCorpus.sync_files (load, semantic
+     chunking, embedding, Chroma + BM25), reported as docs/s, chunks/s, embeddings/s;
+  2. queries: questions through AdaptiveRAGSystem.arun with a RequestTrace each,
+     reported as p50/p95 per node and per request, LLM calls, tokens and throughput.
+Peak RSS is sampled after each phase. The report is written as JSON (commit hash
+included) and can be compared with an earlier one with --compare.
+
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 --questions 50
+    python -m benchmarks.run_benchmarks --sizes 100000 --llm-latency 0.3 --concurrency 8
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/<old>.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.fakes import FakeCrossEncoder, FakeEmbeddings, FakeSearchTool, fake_llm_factory
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values)
+    return {"count": len(values), "p50": round(float(np.percentile(array, 50)), 6),
+            "p95": round(float(np.percentile(array, 95)), 6), "mean": round(float(array.mean()), 6),
+            "max": round(float(array.max()), 6)}
+
+
+def git_revision() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except Exception:
+        return {"commit": None, "dirty": None}
+
+
+@contextlib.contextmanager
+def quiet(enabled: bool):
+    """Silences the pipeline's per-source prints during the timed phases."""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def install_fakes(args: argparse.Namespace) -> Dict[str, Any]:
+    from chains.llm import set_llm_factory
+    from concurrency import TokenBucket
+    from ingestion.models import CROSS_ENCODER, EMBEDDINGS, model_registry
+    from nodes import web_search
+
+    embeddings = FakeEmbeddings(latency_per_text=args.embedding_latency)
+    cross_encoder = FakeCrossEncoder(latency_per_pair=args.rerank_latency)
+    search_tool = FakeSearchTool(latency=args.search_latency)
+    model_registry.register(EMBEDDINGS, embeddings)
+    model_registry.register(CROSS_ENCODER, cross_encoder)
+    set_llm_factory(fake_llm_factory(latency=args.llm_latency, token_latency=args.token_latency))
+    web_search.set_search_tool(search_tool)
+    web_search.rate_limiter = TokenBucket(rate=args.search_rate, capacity=max(1.0, args.search_rate))
+    if not args.web_cache:
+        web_search.set_web_search_cache(None)
+    return {"embeddings": embeddings, "cross_encoder": cross_encoder, "search_tool": search_tool}
+
+
+def bench_ingestion(size: int, workdir: str, fakes: Dict[str, Any], args: argparse.Namespace):
+    from ingestion.store import PersistentCorpus
+
+    generator = SyntheticCorpus(size, seed=args.seed)
+    paths = generator.write(os.path.join(workdir, f"docs-{size}"))
+    embeddings = fakes["embeddings"]
+    embedded_before = embeddings.texts_embedded
+    start = time.perf_counter()
+    with quiet(not args.verbose):
+        corpus = PersistentCorpus(os.path.join(workdir, f"store-{size}"), vector_index=args.vector_index)
+        corpus.sync_files(paths)
+    seconds = time.perf_counter() - start
+    chunks = len(corpus.bm25_index)
+    texts = embeddings.texts_embedded - embedded_before
+    result = {
+        "target_chunks": size, "documents": len(paths), "chunks": chunks, "texts_embedded": texts,
+        "seconds": round(seconds, 3),
+        "docs_per_s": round(len(paths) / seconds, 2), "chunks_per_s": round(chunks / seconds, 2),
+        "embeddings_per_s": round(texts / seconds, 2), "peak_rss_mb": peak_rss_mb(),
+    }
+    print(f"📥 {size:>7} chunks visés : {chunks} chunks, {len(paths)} docs en {seconds:.1f}s "
+          f"({result['chunks_per_s']:.0f} chunks/s, {result['embeddings_per_s']:.0f} embeddings/s)")
+    return corpus, generator, result
+
+
+def summarize_traces(traces: List[Any], wall: float, concurrency: int) -> Dict[str, Any]:
+    per_node: Dict[str, List[float]] = defaultdict(list)
+    requests, paths = [], defaultdict(int)
+    totals = defaultdict(int)
+    for trace in traces:
+        requests.append(trace.seconds)
+        nodes = [step.node for step in trace.steps]
+        paths["web_search" if "web_search" in nodes else "vectorstore"] += 1
+        for step in trace.steps:
+            per_node[step.node].append(step.seconds)
+        for key, value in trace.totals().items():
+            if key != "seconds_by_node":
+                totals[key] += value
+    return {
+        "requests": len(traces), "concurrency": concurrency, "wall_seconds": round(wall, 3),
+        "throughput_qps": round(len(traces) / wall, 2) if wall else 0.0,
+        "request_latency": percentiles(requests),
+        "nodes": {node: percentiles(values) for node, values in sorted(per_node.items())},
+        "paths": dict(paths), **totals,
+    }
+
+
+def bench_queries(corpus: Any, generator: SyntheticCorpus, args: argparse.Namespace) -> Dict[str, Any]:
+    from graph import AdaptiveRAGSystem
+    from ingestion.ingestion import build_local_router, create_advanced_retriever
+    from instrumentation import RequestTrace
+
+    with quiet(not args.verbose):
+        retriever = create_advanced_retriever([], corpus.vectorstore, bm25_index=corpus.bm25_index,
+                                              vector_index=corpus.vector_index)
+        router = build_local_router(corpus.vectorstore, vector_index=corpus.vector_index) if args.local_router else None
+        rag = AdaptiveRAGSystem(grading_mode=args.grading_mode, use_semantic_cache=args.semantic_cache,
+                                use_local_router=args.local_router, speculation=args.speculation)
+    questions = generator.questions(args.questions)
+    traces: List[Any] = []
+
+    async def ask(i: int, question: str, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            trace = RequestTrace(question=question)
+            config = {"configurable": {"thread_id": f"bench-{i}"}}
+            async for _ in rag.arun(question, retriever=retriever, config=config, router=router,
+                                    corpus_fingerprint=f"bench-{generator.target_chunks}", trace=trace):
+                pass
+            traces.append(trace)
+
+    async def run_all() -> None:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        await asyncio.gather(*(ask(i, q, semaphore) for i, q in enumerate(questions)))
+
+    start = time.perf_counter()
+    with quiet(not args.verbose):
+        asyncio.run(run_all())
+    wall = time.perf_counter() - start
+    result = summarize_traces(traces, wall, args.concurrency)
+    result["peak_rss_mb"] = peak_rss_mb()
+    latency = result["request_latency"]
+    print(f"❓ {len(traces)} questions en {wall:.1f}s : p50 {latency['p50'] * 1000:.0f} ms, "
+          f"p95 {latency['p95'] * 1000:.0f} ms ({result['throughput_qps']} q/s)")
+    for node, stats in result["nodes"].items():
+        print(f"    {node:<16} p50 {stats['p50'] * 1000:8.1f} ms   p95 {stats['p95'] * 1000:8.1f} ms   n={stats['count']}")
+    return result
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    old_runs = {run["size"]: run for run in baseline.get("runs", [])}
+    print(f"\n=== Comparaison avec {baseline_path} ({baseline.get('meta', {}).get('commit')}) ===")
+
+    def delta(new: Optional[float], old: Optional[float]) -> str:
+        if not new or not old:
+            return "n/a"
+        return f"{new:.4g} vs {old:.4g} ({(new - old) / old * 100:+.1f}%)"
+
+    if not set(old_runs) & {run["size"] for run in current["runs"]}:
+        print("Aucune taille de corpus commune.")
+    for run in current["runs"]:
+        old = old_runs.get(run["size"])
+        if old is None:
+            continue
+        print(f"[{run['size']} chunks]")
+        print(f"  chunks/s          {delta(run['ingestion']['chunks_per_s'], old['ingestion']['chunks_per_s'])}")
+        if "queries" in run and "queries" in old:
+            new_q, old_q = run["queries"], old["queries"]
+            for key in ("p50", "p95"):
+                print(f"  request {key}       {delta(new_q['request_latency'].get(key), old_q['request_latency'].get(key))}")
+            for node, stats in new_q["nodes"].items():
+                old_stats = old_q["nodes"].get(node, {})
+                print(f"  {node:<16}  p95 {delta(stats.get('p95'), old_stats.get('p95'))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark hors ligne (LLM, recherche web et modèles factices).")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Tailles de corpus (chunks visés)")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Latence par appel LLM (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Latence par token streamé (s)")
+    parser.add_argument("--search-latency", type=float, default=0.2, help="Latence de la recherche web (s)")
+    parser.add_argument("--search-rate", type=float, default=0.0, help="Débit max de la recherche web (0 = illimité)")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Latence par texte embeddé (s)")
+    parser.add_argument("--rerank-latency", type=float, default=0.0, help="Latence par paire reclassée (s)")
+    parser.add_argument("--grading-mode", default="parallel", choices=["parallel", "single_call"])
+    parser.add_argument("--local-router", action="store_true", help="Activer le routeur local")
+    parser.add_argument("--semantic-cache", action="store_true", help="Activer le cache sémantique")
+    parser.add_argument("--web-cache", action="store_true", help="Activer le cache de recherche web")
+    parser.add_argument("--speculation", default="off", choices=["off", "rewrite", "full"],
+                        help="Repli spéculatif (réécriture / recherche web) pendant la 1re recherche")
+    parser.add_argument("--vector-index", default="hnsw", choices=["hnsw", "int8", "binary"],
+                        help="Branche vectorielle : HNSW de Chroma ou index quantifié (cf. benchmarks/ann_benchmark.py)")
+    parser.add_argument("--skip-queries", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Répertoire de travail (temporaire par défaut)")
+    parser.add_argument("--keep", action="store_true", help="Conserver les stores créés")
+    parser.add_argument("--output", help="Fichier JSON du rapport (défaut : benchmarks/results/)")
+    parser.add_argument("--compare", help="Rapport JSON précédent à comparer")
+    parser.add_argument("--verbose", action="store_true", help="Afficher les logs du pipeline")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-bench-")
+    revision = git_revision()
+    report: Dict[str, Any] = {
+        "meta": {**revision, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "platform": platform.platform(), "cpu_count": os.cpu_count(), "args": vars(args)},
+        "runs": [],
+    }
+    fakes = install_fakes(args)
+    try:
+        for size in args.sizes:
+            corpus, generator, ingestion = bench_ingestion(size, workdir, fakes, args)
+            run: Dict[str, Any] = {"size": size, "ingestion": ingestion}
+            if not args.skip_queries:
+                run["queries"] = bench_queries(corpus, generator, args)
+            report["runs"].append(run)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}-{revision['commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Rapport écrit dans {output} (pic RSS {report['peak_rss_mb']} MB)")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
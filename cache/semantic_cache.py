@@ -0,0 +1,277 @@
+# cache/semantic_cache.py
+"""
+Semantic answer cache placed in front of the whole graph.
+
+Questions are embedded with the ingestion embedding model; a new question whose cosine
+similarity with a cached one exceeds the threshold, for the same corpus fingerprint,
+gets the stored generation and sources back without routing, retrieval, grading or
+generation. Entries expire after a TTL and are evicted least-recently-used beyond
+`max_entries`. Storage is pluggable: in-process (default) or SQLite on disk.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+SEMANTIC_CACHE_BACKEND = os.getenv("SEMANTIC_CACHE_BACKEND", "memory")  # memory | sqlite | off
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "./semantic_cache.sqlite3")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+
+@dataclass
+class CacheEntry:
+    fingerprint: str
+    question: str
+    embedding: np.ndarray
+    generation: str
+    sources: List[Dict[str, Any]]
+    created_at: float = field(default_factory=time.time)
+    last_access: float = field(default_factory=time.time)
+    id: Optional[int] = None
+
+    def documents(self) -> List[Document]:
+        return [Document(page_content=s.get("page_content", ""), metadata=s.get("metadata", {})) for s in self.sources]
+
+
+def _normalize(vector: Any) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _serialize_documents(documents: List[Any]) -> List[Dict[str, Any]]:
+    sources = []
+    for doc in documents or []:
+        metadata = getattr(doc, "metadata", {}) or {}
+        sources.append({
+            "page_content": getattr(doc, "page_content", str(doc)),
+            # Only JSON-friendly metadata survives the SQLite backend
+            "metadata": {k: v for k, v in metadata.items() if isinstance(v, (str, int, float, bool)) or v is None},
+        })
+    return sources
+
+
+class InMemoryCacheBackend:
+    """Process-local backend: one OrderedDict in LRU order, vectors stacked per fingerprint at lookup."""
+
+    def __init__(self):
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def search(self, fingerprint: str, vector: np.ndarray, min_created_at: float) -> Tuple[Optional[CacheEntry], float]:
+        with self._lock:
+            candidates = [e for e in self._entries.values() if e.fingerprint == fingerprint and e.created_at >= min_created_at]
+            if not candidates:
+                return None, 0.0
+            similarities = np.stack([e.embedding for e in candidates]) @ vector
+            best = int(np.argmax(similarities))
+            entry = candidates[best]
+            entry.last_access = time.time()
+            self._entries.move_to_end(entry.id)
+            return entry, float(similarities[best])
+
+    def add(self, entry: CacheEntry) -> None:
+        with self._lock:
+            entry.id = self._next_id
+            self._next_id += 1
+            self._entries[entry.id] = entry
+
+    def evict(self, max_entries: int, min_created_at: float) -> int:
+        with self._lock:
+            expired = [k for k, e in self._entries.items() if e.created_at < min_created_at]
+            for k in expired:
+                del self._entries[k]
+            evicted = len(expired)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """On-disk backend: survives restarts and can be shared by several worker processes."""
+
+    def __init__(self, path: str = SEMANTIC_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS semantic_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fingerprint TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                generation TEXT NOT NULL,
+                sources TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_semantic_cache_fp ON semantic_cache (fingerprint, created_at)")
+        self._conn.commit()
+
+    def search(self, fingerprint: str, vector: np.ndarray, min_created_at: float) -> Tuple[Optional[CacheEntry], float]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, question, embedding, generation, sources, created_at, last_access "
+                "FROM semantic_cache WHERE fingerprint = ? AND created_at >= ?",
+                (fingerprint, min_created_at),
+            ).fetchall()
+            if not rows:
+                return None, 0.0
+            matrix = np.stack([np.frombuffer(r[2], dtype=np.float32) for r in rows])
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            row = rows[best]
+            now = time.time()
+            self._conn.execute("UPDATE semantic_cache SET last_access = ? WHERE id = ?", (now, row[0]))
+            self._conn.commit()
+        entry = CacheEntry(
+            fingerprint=fingerprint,
+            question=row[1],
+            embedding=matrix[best],
+            generation=row[3],
+            sources=json.loads(row[4]),
+            created_at=row[5],
+            last_access=now,
+            id=row[0],
+        )
+        return entry, float(similarities[best])
+
+    def add(self, entry: CacheEntry) -> None:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO semantic_cache (fingerprint, question, embedding, generation, sources, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.fingerprint,
+                    entry.question,
+                    entry.embedding.astype(np.float32).tobytes(),
+                    entry.generation,
+                    json.dumps(entry.sources),
+                    entry.created_at,
+                    entry.last_access,
+                ),
+            )
+            self._conn.commit()
+            entry.id = cursor.lastrowid
+
+    def evict(self, max_entries: int, min_created_at: float) -> int:
+        with self._lock:
+            evicted = self._conn.execute("DELETE FROM semantic_cache WHERE created_at < ?", (min_created_at,)).rowcount
+            evicted += self._conn.execute(
+                "DELETE FROM semantic_cache WHERE id NOT IN "
+                "(SELECT id FROM semantic_cache ORDER BY last_access DESC LIMIT ?)",
+                (max_entries,),
+            ).rowcount
+            self._conn.commit()
+            return evicted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM semantic_cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM semantic_cache").fetchone()[0]
+
+
+def _default_embed(text: str) -> List[float]:
+    # Imported lazily: the embedding model is only loaded once the cache is actually used
+    from ingestion.models import get_embeddings
+    return get_embeddings().embed_query(text)
+
+
+class SemanticCache:
+    """Cosine-similarity cache of final answers, keyed by corpus fingerprint."""
+
+    def __init__(
+        self,
+        backend: Optional[Any] = None,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds: float = SEMANTIC_CACHE_TTL,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        embed_fn: Callable[[str], List[float]] = _default_embed,
+    ):
+        self.backend = backend if backend is not None else InMemoryCacheBackend()
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.embed_fn = embed_fn
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()  # lookups run concurrently in the blocking pool
+
+    def _min_created_at(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+
+    def embed(self, question: str) -> np.ndarray:
+        return _normalize(self.embed_fn(question))
+
+    def lookup(self, question: str, fingerprint: str, vector: Optional[np.ndarray] = None) -> Optional[CacheEntry]:
+        """Returns the closest cached answer above the threshold, or None (counted as a miss)."""
+        vector = self.embed(question) if vector is None else vector
+        entry, similarity = self.backend.search(fingerprint, vector, self._min_created_at())
+        hit = entry is not None and similarity >= self.threshold
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if hit:
+            print(f"⚡ Cache sémantique: hit (similarité {similarity:.3f}) pour « {entry.question} »")
+            return entry
+        return None
+
+    def store(self, question: str, fingerprint: str, generation: str, documents: List[Any],
+              vector: Optional[np.ndarray] = None) -> None:
+        vector = self.embed(question) if vector is None else vector
+        self.backend.add(CacheEntry(
+            fingerprint=fingerprint,
+            question=question,
+            embedding=vector,
+            generation=generation,
+            sources=_serialize_documents(documents),
+        ))
+        self.backend.evict(self.max_entries, self._min_created_at())
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def create_semantic_cache(backend: str = SEMANTIC_CACHE_BACKEND) -> Optional[SemanticCache]:
+    """Builds the cache selected by SEMANTIC_CACHE_BACKEND ('memory', 'sqlite' or 'off')."""
+    backend = (backend or "off").lower()
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        return SemanticCache(backend=SQLiteCacheBackend(SEMANTIC_CACHE_PATH))
+    return SemanticCache(backend=InMemoryCacheBackend())
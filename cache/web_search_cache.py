@@ -0,0 +1,104 @@
+# cache/web_search_cache.py
+"""
+Persistent cache of web search results, keyed by the normalised query.
+
+Repeated and trivially reworded questions ("What is X?" / "what is x") hit SQLite
+instead of the Tavily API. Results are stored already converted to Documents (content +
+JSON-friendly metadata) and expire after a TTL; the oldest entries are evicted beyond
+`max_entries`.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+WEB_SEARCH_CACHE_BACKEND = os.getenv("WEB_SEARCH_CACHE_BACKEND", "sqlite")  # sqlite | memory | off
+WEB_SEARCH_CACHE_PATH = os.getenv("WEB_SEARCH_CACHE_PATH", "./web_search_cache.sqlite3")
+WEB_SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "21600"))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("WEB_SEARCH_CACHE_MAX_ENTRIES", "10000"))
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation and spacing do not change what the search engine returns."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", query.lower())).strip()
+
+
+class WebSearchCache:
+    def __init__(self, path: str = WEB_SEARCH_CACHE_PATH, ttl_seconds: float = WEB_SEARCH_CACHE_TTL,
+                 max_entries: int = WEB_SEARCH_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS web_search_cache (
+                query TEXT PRIMARY KEY,
+                documents TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_web_search_cache_created ON web_search_cache (created_at)")
+        self._conn.commit()
+
+    def get(self, query: str) -> Optional[List[Document]]:
+        """Fresh Document copies for the query, or None (counted as a miss)."""
+        min_created_at = time.time() - self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT documents FROM web_search_cache WHERE query = ? AND created_at >= ?",
+                (normalize_query(query), min_created_at),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in json.loads(row[0])]
+
+    def put(self, query: str, documents: List[Document]) -> None:
+        payload = json.dumps([{"page_content": d.page_content, "metadata": d.metadata} for d in documents], default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO web_search_cache (query, documents, created_at) VALUES (?, ?, ?)",
+                (normalize_query(query), payload, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM web_search_cache WHERE query NOT IN "
+                "(SELECT query FROM web_search_cache ORDER BY created_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM web_search_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM web_search_cache").fetchone()[0]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+def create_web_search_cache(backend: str = WEB_SEARCH_CACHE_BACKEND) -> Optional[WebSearchCache]:
+    """Builds the cache selected by WEB_SEARCH_CACHE_BACKEND ('sqlite', 'memory' or 'off')."""
+    backend = (backend or "off").lower()
+    if backend == "off":
+        return None
+    if backend == "memory":
+        return WebSearchCache(":memory:")
+    return WebSearchCache(WEB_SEARCH_CACHE_PATH)
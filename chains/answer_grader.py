@@ -1,12 +1,9 @@
 ### Answer Grader
 
+from typing import Any
 from pydantic import BaseModel, Field  # Corrected: Import BaseModel and Field from Pydantic
-from langchain import hub
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
-import os
+from chains.llm import get_llm, lazy_chain
 # Data model
 
 class GradeAnswer(BaseModel):
@@ -17,14 +14,6 @@ class GradeAnswer(BaseModel):
     )
 
 
-# LLM with function call
-llm = ChatGroq(
-    model="llama-3.1-8b-instant",
-    temperature=0.0,
-    api_key=os.getenv("GROQ_API_KEY")
-)
-structured_llm_grader = llm.with_structured_output(GradeAnswer)
-
 # Prompt
 system = """You are a grader assessing whether an answer addresses / resolves a question \n 
      Give a binary score 'yes' or 'no'. Yes' means that the answer resolves the question."""
@@ -35,4 +24,14 @@ answer_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-answer_grader = answer_prompt | structured_llm_grader
+# LLM with function call, built on first use
+@lazy_chain
+def get_answer_grader():
+    structured_llm_grader = get_llm().with_structured_output(GradeAnswer)
+    return answer_prompt | structured_llm_grader
+
+def __getattr__(name: str) -> Any:
+    # Compatibility: `from chains.answer_grader import answer_grader` builds the chain on demand
+    if name == "answer_grader":
+        return get_answer_grader()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,15 +1,7 @@
-import os
-from langchain.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
+from typing import Any
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.documents import Document
-
-# Initialize the language model
-llm = ChatGroq(
-    temperature=0, 
-    model_name="llama-3.1-8b-instant", # Or your preferred model
-    api_key=os.environ.get("GROQ_API_KEY")
-)
+from chains.llm import get_llm, lazy_chain
 
 # Define the generation prompt template
 prompt = ChatPromptTemplate.from_messages([
@@ -17,6 +9,14 @@ prompt = ChatPromptTemplate.from_messages([
     ("human", "Question: {question}"),
 ])
 
-# Create the generation chain
-generation_chain = prompt | llm | StrOutputParser()
+# Create the generation chain (the language model is initialized on first use)
+@lazy_chain
+def get_generation_chain():
+    return prompt | get_llm() | StrOutputParser()
+
+def __getattr__(name: str) -> Any:
+    # Compatibility: `from chains.generation import generation_chain` builds the chain on demand
+    if name == "generation_chain":
+        return get_generation_chain()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
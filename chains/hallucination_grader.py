@@ -1,13 +1,9 @@
 # chains/hallucination_grader.py (Version Corrigée)
+from typing import Any
 from langchain_core.runnables import RunnableSequence
 from pydantic import BaseModel, Field
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-llm = ChatGroq(
-    model="llama-3.1-8b-instant",
-    temperature=0.0
-)
+from chains.llm import get_llm, lazy_chain
 class GradeHallucinations(BaseModel):
     """Binary score for hallucination present in generation answer."""
 
@@ -16,8 +12,6 @@ class GradeHallucinations(BaseModel):
     )
 
 
-structured_llm_grader = llm.with_structured_output(GradeHallucinations)
-
 system = """You are a grader assessing whether an LLM generation is grounded in / supported by a set of retrieved facts. \n 
      Give a binary score 'yes' or 'no'. 'Yes' means that the answer is grounded in / supported by the set of facts."""
 hallucination_prompt = ChatPromptTemplate.from_messages(
@@ -27,4 +21,13 @@ hallucination_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-hallucination_grader: RunnableSequence = hallucination_prompt | structured_llm_grader
+@lazy_chain
+def get_hallucination_grader() -> RunnableSequence:
+    structured_llm_grader = get_llm().with_structured_output(GradeHallucinations)
+    return hallucination_prompt | structured_llm_grader
+
+def __getattr__(name: str) -> Any:
+    # Compatibility: `from chains.hallucination_grader import hallucination_grader` builds the chain on demand
+    if name == "hallucination_grader":
+        return get_hallucination_grader()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,67 @@
+# chains/llm.py
+"""
+Lazy construction of the chat models and chains.
+
+Importing a chain module used to build a ChatGroq client (and import langchain_groq)
+at import time. Clients are now created on first use and shared by every chain asking
+for the same settings; chains are built on first access through `lazy_chain` getters.
+`set_llm_factory` swaps the model factory, e.g. for a fake chat model in tests and
+benchmarks, and drops the clients and chains built with the previous one.
+"""
+import functools
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.1-8b-instant")
+
+
+def groq_factory(**kwargs: Any) -> Any:
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(**kwargs)
+
+
+_factory: Callable[..., Any] = groq_factory
+_llms: Dict[Tuple, Any] = {}
+_chains: List[Dict[str, Any]] = []
+_lock = threading.RLock()
+
+
+def get_llm(model: str = LLM_MODEL, temperature: float = 0.0, **kwargs: Any) -> Any:
+    """Shared chat model for these settings (created on first call)."""
+    key = (model, temperature, tuple(sorted(kwargs.items())))
+    with _lock:
+        llm = _llms.get(key)
+        if llm is None:
+            llm = _factory(model=model, temperature=temperature, **kwargs)
+            _llms[key] = llm
+        return llm
+
+
+def set_llm_factory(factory: Optional[Callable[..., Any]]) -> None:
+    """Replaces the chat model factory (None restores ChatGroq)."""
+    global _factory
+    with _lock:
+        _factory = factory or groq_factory
+        _llms.clear()
+        for built in _chains:
+            built.clear()
+
+
+def lazy_chain(build: Callable[[], Any]) -> Callable[[], Any]:
+    """Decorator turning a chain builder into a getter that builds once, on first call."""
+    built: Dict[str, Any] = {}
+    _chains.append(built)
+
+    @functools.wraps(build)
+    def get() -> Any:
+        chain = built.get("chain")
+        if chain is None:
+            with _lock:
+                chain = built.get("chain")
+                if chain is None:
+                    chain = built["chain"] = build()
+        return chain
+
+    return get
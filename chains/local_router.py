@@ -0,0 +1,176 @@
+# chains/local_router.py
+"""
+Local fast path for question routing.
+
+Decides the obvious cases without a Groq round trip by comparing the question embedding
+with topic prototypes of the corpus (k-means centroids of the chunk embeddings, built at
+ingestion time) and with the corpus vocabulary (IDF-weighted term overlap). When the
+signals disagree or are lukewarm, it abstains and the LLM router (chains/router_query.py)
+decides. Sending a question to the web without the LLM needs strong negative evidence:
+low similarity and almost none of the question's content words in the corpus.
+"""
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+LOCAL_ROUTER_HIGH = float(os.getenv("LOCAL_ROUTER_HIGH", "0.55"))
+LOCAL_ROUTER_LOW = float(os.getenv("LOCAL_ROUTER_LOW", "0.25"))
+LOCAL_ROUTER_MIN_OVERLAP = float(os.getenv("LOCAL_ROUTER_MIN_OVERLAP", "0.5"))
+# Below this overlap (and LOCAL_ROUTER_LOW similarity) the question is off-corpus
+LOCAL_ROUTER_WEB_OVERLAP = float(os.getenv("LOCAL_ROUTER_WEB_OVERLAP", "0.2"))
+LOCAL_ROUTER_PROTOTYPES = int(os.getenv("LOCAL_ROUTER_PROTOTYPES", "8"))
+LOCAL_ROUTER_SAMPLE = int(os.getenv("LOCAL_ROUTER_SAMPLE", "20000"))  # vectors read from a quantized index
+
+# Questions about fresh facts cannot be answered from an uploaded corpus
+_FRESHNESS_PATTERN = re.compile(
+    r"\b(today|tonight|yesterday|latest|breaking|news|current(ly)?|this (week|month|year)|right now|"
+    r"weather|stock|price|score|aujourd'hui|hier|actualit[ée]s?|derni[èe]res?|en ce moment|20[2-9]\d)\b",
+    re.IGNORECASE,
+)
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+# Question words carry no topic: they must not count against the corpus
+_STOPWORDS = frozenset("""
+    the and are was were for from with what which who whom whose when where why how does did doing done
+    can could should would will shall may might must has have had having not but about into onto over under
+    between than then that this these those there their them they its your you our all any some each
+    more most other such only own same very also just been being is explain describe tell give show list
+    les des une est sont que qui quoi quel quelle quels quelles comment pourquoi quand dans pour par avec
+    sur sous entre plus moins mais donc car aux ces cette leur leurs nous vous ils elles fait faire
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if len(t) > 2]
+
+
+def content_terms(text: str) -> List[str]:
+    return [t for t in tokenize(text) if t not in _STOPWORDS]
+
+
+@dataclass
+class RouteDecision:
+    """Outcome of the local router. `datasource` is None when the LLM must decide."""
+
+    datasource: Optional[str]
+    reason: str
+    similarity: float = 0.0
+    overlap: float = 0.0
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on L2-normalised rows; returns normalised centroids."""
+    k = max(1, min(k, len(vectors)))
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+
+def _default_embed(text: str) -> List[float]:
+    from ingestion.models import get_embeddings
+    return get_embeddings().embed_query(text)
+
+
+class LocalRouter:
+    """Embedding-prototype + vocabulary router built once per corpus."""
+
+    def __init__(
+        self,
+        prototypes: Optional[np.ndarray],
+        document_frequency: Dict[str, int],
+        n_documents: int,
+        high: float = LOCAL_ROUTER_HIGH,
+        low: float = LOCAL_ROUTER_LOW,
+        min_overlap: float = LOCAL_ROUTER_MIN_OVERLAP,
+        web_overlap: float = LOCAL_ROUTER_WEB_OVERLAP,
+        embed_fn: Callable[[str], List[float]] = _default_embed,
+    ):
+        self.prototypes = prototypes
+        self.document_frequency = document_frequency
+        self.n_documents = n_documents
+        self.high = high
+        self.low = low
+        self.min_overlap = min_overlap
+        self.web_overlap = web_overlap
+        self.embed_fn = embed_fn
+
+    @classmethod
+    def from_embeddings(cls, embeddings: Any, texts: Iterable[str], n_prototypes: int = LOCAL_ROUTER_PROTOTYPES,
+                        **kwargs: Any) -> "LocalRouter":
+        texts = list(texts)
+        prototypes = None
+        if embeddings is not None and len(embeddings):
+            matrix = np.asarray(embeddings, dtype=np.float32)
+            matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+            prototypes = _kmeans(matrix, n_prototypes)
+        document_frequency: Counter = Counter()
+        for text in texts:
+            document_frequency.update(set(tokenize(text)))
+        return cls(prototypes, dict(document_frequency), len(texts), **kwargs)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore: Any, where: Optional[Dict[str, Any]] = None,
+                         vector_index: Optional[Any] = None, **kwargs: Any) -> "LocalRouter":
+        """
+        Builds the router from the embeddings already stored (no re-embedding): in Chroma,
+        or in the quantized vector index when the store keeps its vectors there, in which
+        case prototypes are fitted on an evenly spaced sample of the chunks.
+        """
+        if vector_index is None:
+            result = vectorstore.get(where=where, include=["embeddings", "documents"])
+            return cls.from_embeddings(result.get("embeddings"), result.get("documents") or [], **kwargs)
+        result = vectorstore.get(where=where, include=["documents"])
+        embeddings = vector_index.vectors(where=where, limit=LOCAL_ROUTER_SAMPLE)
+        return cls.from_embeddings(embeddings, result.get("documents") or [], **kwargs)
+
+    def _similarity(self, vector: np.ndarray) -> float:
+        if self.prototypes is None:
+            return 0.0
+        vector = vector / (np.linalg.norm(vector) + 1e-12)
+        return float(np.max(self.prototypes @ vector))
+
+    def _overlap(self, terms: Iterable[str]) -> float:
+        """
+        Share of the IDF mass of the question's content words carried by corpus terms.
+        An unseen word weighs as much as the rarest corpus term, not more: a phrasing
+        word missing from the corpus ("relate") must not outweigh the topic words.
+        """
+        total = matched = 0.0
+        for term in set(terms):
+            df = self.document_frequency.get(term, 0)
+            idf = math.log(1 + self.n_documents / (1 + max(df, 1)))
+            total += idf
+            if df:
+                matched += idf
+        return matched / total if total else 0.0
+
+    def decide(self, question: str, vector: Optional[Any] = None) -> RouteDecision:
+        vector = np.asarray(self.embed_fn(question) if vector is None else vector, dtype=np.float32)
+        similarity = self._similarity(vector)
+        terms = content_terms(question)
+        overlap = self._overlap(terms) if self.n_documents else 0.0
+        fresh = bool(_FRESHNESS_PATTERN.search(question))
+
+        if similarity >= self.high and overlap >= self.min_overlap and not fresh:
+            return RouteDecision("vectorstore", "close to corpus topics", similarity, overlap)
+        if terms and self.n_documents and similarity <= self.low and overlap < self.web_overlap:
+            return RouteDecision("web_search", "far from corpus topics", similarity, overlap)
+        if fresh and similarity < self.high:
+            return RouteDecision("web_search", "asks for fresh information", similarity, overlap)
+        return RouteDecision(None, "uncertain", similarity, overlap)
+
+
+def decide_without_corpus() -> RouteDecision:
+    """With no retriever, retrieval can only come back empty: go straight to the web."""
+    return RouteDecision("web_search", "no corpus")
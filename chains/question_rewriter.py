@@ -1,12 +1,11 @@
 # ### Question Rewriter ###
 
 # 1. Imports
+from typing import Any
 from pydantic import BaseModel, Field
-from langchain_groq import ChatGroq
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
-import os
+from langchain_core.runnables import RunnableLambda
+from chains.llm import get_llm, lazy_chain
 # 2. Data model for structured output
 class RewriteQuestion(BaseModel):
     """Rewritten question optimized for retrieval."""
@@ -15,15 +14,7 @@ class RewriteQuestion(BaseModel):
         description="A new, standalone question that is improved for vectorstore retrieval, taking chat history into account.",
     )
 
-# 3. LLM with structured output
-llm = ChatGroq(
-    model="llama-3.1-8b-instant",
-    temperature=0.0,
-    api_key=os.getenv("GROQ_API_KEY")
-)
-structured_llm_rewriter = llm.with_structured_output(RewriteQuestion)
-
-# 4. Prompt (Corrected to include chat history)
+# 3. Prompt (Corrected to include chat history)
 system = """You are a question re-writer. Your task is to convert a given question, potentially a follow-up, into a better, standalone question that is optimized for vectorstore retrieval.
 Use the provided chat history to understand the context and resolve any ambiguities or references in the latest question."""
 
@@ -38,13 +29,19 @@ re_write_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-# 5. Parser JSON
-
-# 6. Chaîne Finale (CORRIGÉE avec .bind() et le parser)
-question_rewriter = (
-    re_write_prompt 
-    | structured_llm_rewriter = llm.with_structured_output(RewriteQuestion)
-    | StrOutputParser
+# 4. Chaîne Finale : LLM à sortie structurée (créé au premier appel), puis extraction de la question
+@lazy_chain
+def get_question_rewriter():
+    structured_llm_rewriter = get_llm().with_structured_output(RewriteQuestion)
+    return (
+        re_write_prompt
+        | structured_llm_rewriter
+        | RunnableLambda(lambda result: result.rewritten_question)
+    )
 
-)
+def __getattr__(name: str) -> Any:
+    # Compatibilité : `from chains.question_rewriter import question_rewriter` construit la chaîne à la demande
+    if name == "question_rewriter":
+        return get_question_rewriter()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
@@ -1,17 +1,17 @@
 # chains/retriever_grader.py (Non-JSON Version)
 
 # 1. Imports
+from typing import Any, List
 from pydantic import BaseModel, Field
-from langchain_groq import ChatGroq
-from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableLambda
+from chains.llm import get_llm, lazy_chain
 import os
-llm = ChatGroq(
-    model="llama-3.1-8b-instant",
-    temperature=0.0,
-    api_key=os.getenv("GROQ_API_KEY")
-)
+# Timeout par appel : un document dont la note n'arrive pas à temps est conservé (fail-open)
+GRADER_TIMEOUT = float(os.getenv("GRADER_TIMEOUT", "15"))
+
+def _grader_llm() -> Any:
+    return get_llm(timeout=GRADER_TIMEOUT, max_retries=1)
+
 class GradeDocuments(BaseModel):
     """Binary score for relevance check on retrieved documents."""
 
@@ -20,8 +20,6 @@ class GradeDocuments(BaseModel):
     )
 
 
-structured_llm_grader = llm.with_structured_output(GradeDocuments)
-
 system = """You are a grader assessing relevance of a retrieved document to a user question. \n 
     If the document contains keyword(s) or semantic meaning related to the question, grade it as relevant. \n
     Give a binary score 'yes' or 'no' score to indicate whether the document is relevant to the question."""
@@ -32,4 +30,50 @@ grade_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-retrieval_grader = grade_prompt | structured_llm_grader
+@lazy_chain
+def get_retrieval_grader():
+    structured_llm_grader = _grader_llm().with_structured_output(GradeDocuments)
+    return grade_prompt | structured_llm_grader
+
+
+# --- Variante "un seul appel" : toutes les notes en une réponse structurée ---
+class DocumentVerdict(BaseModel):
+    """Relevance verdict for one numbered document."""
+
+    index: int = Field(description="Number of the document, as given in the prompt")
+    binary_score: str = Field(
+        description="Document is relevant to the question, 'yes' or 'no'"
+    )
+
+
+class GradeDocumentsBatch(BaseModel):
+    """Binary relevance scores for a list of retrieved documents."""
+
+    verdicts: List[DocumentVerdict] = Field(
+        description="Exactly one verdict per document, in the same order"
+    )
+
+
+batch_system = """You are a grader assessing relevance of retrieved documents to a user question. \n 
+    The documents are numbered. For each document, if it contains keyword(s) or semantic meaning related to the question, grade it as relevant. \n
+    Return exactly one verdict per document with its number and a binary score 'yes' or 'no'."""
+batch_grade_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", batch_system),
+        ("human", "Retrieved documents: \n\n {documents} \n\n User question: {question}"),
+    ]
+)
+
+@lazy_chain
+def get_batch_retrieval_grader():
+    structured_llm_batch_grader = _grader_llm().with_structured_output(GradeDocumentsBatch)
+    return batch_grade_prompt | structured_llm_batch_grader
+
+
+def __getattr__(name: str) -> Any:
+    # Compatibilité : `from chains.retriever_grader import retrieval_grader` construit la chaîne à la demande
+    if name == "retrieval_grader":
+        return get_retrieval_grader()
+    if name == "batch_retrieval_grader":
+        return get_batch_retrieval_grader()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,9 @@
 # chains/router_query.py (Version Corrigée)
 
-from typing import Literal
+from typing import Any, Literal
 from pydantic import BaseModel, Field
-from langchain_groq import ChatGroq
-from langchain_core.output_parsers import StrOutputParser # Ajout de l'import
 from langchain_core.prompts import ChatPromptTemplate
-import os
+from chains.llm import get_llm, lazy_chain
 
 # Modèle Pydantic (inchangé)
 class RouteQuery(BaseModel):
@@ -15,13 +13,6 @@ class RouteQuery(BaseModel):
         description="Étant donné une question, choisir de la router vers 'web_search' ou 'vectorstore'.",
     )
 
-# LLM (sans .with_structured_output)
-llm = ChatGroq(
-    # Pour de meilleures performances, envisagez "llama3-8b-8192"
-    model="llama-3.1-8b-instant", 
-    temperature=0.0
-)
-
 system = """You are an expert at routing a user question to a vectorstore or web search.
 The vectorstore contains documents related to agents, prompt engineering, and adversarial attacks.
 Use the vectorstore for questions on these topics. For all else, use web-search."""
@@ -32,11 +23,14 @@ route_prompt = ChatPromptTemplate.from_messages(
     ]
 )
 
-structured_llm_rewriter = llm.with_structured_output(RouteQuery)
+# Chaîne Finale, construite au premier appel (le client LLM n'est pas créé à l'import)
+@lazy_chain
+def get_question_router():
+    structured_llm_router = get_llm().with_structured_output(RouteQuery)
+    return route_prompt | structured_llm_router
 
-
-# Chaîne Finale (CORRIGÉE avec .bind() et le parser)
-question_router = (
-    route_prompt 
-    | structured_llm_rewriter
-)
+def __getattr__(name: str) -> Any:
+    # Compatibilité : `from chains.router_query import question_router` construit la chaîne à la demande
+    if name == "question_router":
+        return get_question_router()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,311 @@
+# checkpointer.py
+"""
+Bounded LangGraph checkpointers.
+
+MemorySaver keeps every checkpoint of every thread_id (with full `documents` lists) for
+the lifetime of the process. The savers below keep only the last `max_history`
+checkpoints per thread, evict idle threads (TTL, and LRU beyond `max_threads` for the
+in-memory variant), and can compact heavy channels before they are stored: Document
+lists are replaced by lightweight references ({"chunk_id", "source"}).
+
+Compaction is safe for this graph because every run starts from a fresh initial state
+(see AdaptiveRAGSystem._prepare); it would not be for graphs that resume interrupted
+runs from a checkpoint and read the compacted channels back. Node outputs copied into
+checkpoint metadata ("writes") are always stored as references.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional, Sequence, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import InMemorySaver, MemorySaver
+
+from concurrency import run_blocking
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError:  # langgraph-checkpoint-sqlite is only needed for CHECKPOINTER_BACKEND=sqlite
+    SqliteSaver = None
+
+CHECKPOINTER_BACKEND = os.getenv("CHECKPOINTER_BACKEND", "memory")  # memory | sqlite | unbounded
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "./checkpoints.sqlite3")
+CHECKPOINT_MAX_HISTORY = int(os.getenv("CHECKPOINT_MAX_HISTORY", "3"))
+CHECKPOINT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "1000"))
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", "21600"))
+CHECKPOINT_COMPACT_DOCUMENTS = os.getenv("CHECKPOINT_COMPACT_DOCUMENTS", "true").lower() == "true"
+
+DEFAULT_COMPACT_CHANNELS = ("documents",)
+
+
+def compact_documents(value: Any) -> Any:
+    """Replaces Document objects by {"chunk_id", "source"} references; other items are kept."""
+    if not isinstance(value, list):
+        return value
+    compacted = []
+    for item in value:
+        metadata = getattr(item, "metadata", None)
+        if metadata is None:
+            compacted.append(item)
+        else:
+            compacted.append({"chunk_id": metadata.get("chunk_id"), "source": metadata.get("source")})
+    return compacted
+
+
+class _Compactor:
+    """Shared compaction of checkpoint values and pending writes."""
+
+    compact_channels: Tuple[str, ...] = ()
+
+    def _compact_checkpoint(self, checkpoint: Checkpoint) -> Checkpoint:
+        values = checkpoint.get("channel_values") or {}
+        compacted = {k: compact_documents(values[k]) for k in self.compact_channels if k in values}
+        if not compacted:
+            return checkpoint
+        return {**checkpoint, "channel_values": {**values, **compacted}}
+
+    @staticmethod
+    def _compact_metadata(metadata: CheckpointMetadata) -> CheckpointMetadata:
+        """Node outputs copied into metadata["writes"] are descriptive only: always stored as references."""
+        writes = metadata.get("writes")
+        if not isinstance(writes, dict):
+            return metadata
+        compacted = {
+            node: {k: compact_documents(v) for k, v in output.items()} if isinstance(output, dict) else output
+            for node, output in writes.items()
+        }
+        return {**metadata, "writes": compacted}
+
+    def _compact_writes(self, writes: Sequence[Tuple[str, Any]]) -> Sequence[Tuple[str, Any]]:
+        if not self.compact_channels:
+            return writes
+        return [(c, compact_documents(v) if c in self.compact_channels else v) for c, v in writes]
+
+
+class BoundedMemorySaver(_Compactor, InMemorySaver):
+    """In-memory checkpointer with per-thread history limit, idle-thread TTL/LRU eviction and compaction."""
+
+    def __init__(
+        self,
+        max_history: int = CHECKPOINT_MAX_HISTORY,
+        max_threads: int = CHECKPOINT_MAX_THREADS,
+        ttl_seconds: float = CHECKPOINT_TTL,
+        compact_channels: Iterable[str] = DEFAULT_COMPACT_CHANNELS if CHECKPOINT_COMPACT_DOCUMENTS else (),
+    ):
+        super().__init__()
+        self.max_history = max(1, max_history)
+        self.max_threads = max_threads
+        self.ttl_seconds = ttl_seconds
+        self.compact_channels = tuple(compact_channels)
+        self._lock = threading.RLock()
+        self._last_access: "OrderedDict[str, float]" = OrderedDict()
+        self._blob_keys: Dict[str, Set[tuple]] = defaultdict(set)
+        self._write_keys: Dict[str, Set[tuple]] = defaultdict(set)
+        self.evicted_threads = 0
+
+    # --- Bookkeeping ---
+    def _touch(self, thread_id: str) -> None:
+        self._last_access[thread_id] = time.monotonic()
+        self._last_access.move_to_end(thread_id)
+
+    def _prune_history(self, thread_id: str, checkpoint_ns: str) -> None:
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_history:
+            return
+        for checkpoint_id in sorted(checkpoints)[: -self.max_history]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+            self._write_keys[thread_id].discard((thread_id, checkpoint_ns, checkpoint_id))
+        # Channel blobs are shared between checkpoints: keep those still referenced
+        referenced = set()
+        for serialized, _, _ in checkpoints.values():
+            for channel, version in self.serde.loads_typed(serialized)["channel_versions"].items():
+                referenced.add((thread_id, checkpoint_ns, channel, version))
+        stale = [k for k in self._blob_keys[thread_id] if k[1] == checkpoint_ns and k not in referenced]
+        for key in stale:
+            self.blobs.pop(key, None)
+            self._blob_keys[thread_id].discard(key)
+
+    def _evict_idle(self) -> None:
+        now = time.monotonic()
+        while self._last_access:
+            thread_id, last_access = next(iter(self._last_access.items()))
+            expired = self.ttl_seconds > 0 and now - last_access > self.ttl_seconds
+            if not expired and len(self._last_access) <= self.max_threads:
+                break
+            self.delete_thread(thread_id)
+            self.evicted_threads += 1
+
+    # --- BaseCheckpointSaver ---
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self._lock:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id in self._last_access:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], **kwargs: Any) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            items = list(super().list(config, **kwargs))
+        yield from items
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        checkpoint, metadata = self._compact_checkpoint(checkpoint), self._compact_metadata(metadata)
+        with self._lock:
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            thread_id = config["configurable"]["thread_id"]
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            self._blob_keys[thread_id].update((thread_id, checkpoint_ns, k, v) for k, v in new_versions.items())
+            self._touch(thread_id)
+            self._prune_history(thread_id, checkpoint_ns)
+            self._evict_idle()
+            return saved
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        writes = self._compact_writes(writes)
+        with self._lock:
+            super().put_writes(config, writes, task_id, task_path)
+            configurable = config["configurable"]
+            thread_id = configurable["thread_id"]
+            self._write_keys[thread_id].add((thread_id, configurable.get("checkpoint_ns", ""), configurable["checkpoint_id"]))
+
+    def delete_thread(self, thread_id: str) -> None:
+        # Uses the per-thread key indexes instead of scanning every write and blob
+        with self._lock:
+            self.storage.pop(thread_id, None)
+            for key in self._write_keys.pop(thread_id, ()):
+                self.writes.pop(key, None)
+            for key in self._blob_keys.pop(thread_id, ()):
+                self.blobs.pop(key, None)
+            self._last_access.pop(thread_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            checkpoints = sum(len(c) for namespaces in self.storage.values() for c in namespaces.values())
+            blob_bytes = sum(len(v[1]) for v in self.blobs.values())
+            return {
+                "threads": len(self._last_access),
+                "checkpoints": checkpoints,
+                "blobs": len(self.blobs),
+                "blob_bytes": blob_bytes,
+                "evicted_threads": self.evicted_threads,
+            }
+
+
+if SqliteSaver is not None:
+
+    class BoundedSqliteSaver(_Compactor, SqliteSaver):
+        """
+        SQLite checkpointer (state survives restarts, nothing kept in RAM) with the same
+        history limit, idle-thread TTL and compaction. SqliteSaver has no async API; the
+        async methods run the sync ones in the shared blocking pool.
+        """
+
+        def __init__(
+            self,
+            conn: sqlite3.Connection,
+            max_history: int = CHECKPOINT_MAX_HISTORY,
+            ttl_seconds: float = CHECKPOINT_TTL,
+            compact_channels: Iterable[str] = DEFAULT_COMPACT_CHANNELS if CHECKPOINT_COMPACT_DOCUMENTS else (),
+            sweep_interval: float = 60.0,
+        ):
+            super().__init__(conn)
+            self.max_history = max(1, max_history)
+            self.ttl_seconds = ttl_seconds
+            self.compact_channels = tuple(compact_channels)
+            self.sweep_interval = sweep_interval
+            self._last_sweep = 0.0
+
+        @classmethod
+        def from_path(cls, path: str = CHECKPOINT_DB_PATH, **kwargs: Any) -> "BoundedSqliteSaver":
+            return cls(sqlite3.connect(path, check_same_thread=False), **kwargs)
+
+        def setup(self) -> None:
+            if self.is_setup:
+                return
+            super().setup()
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+            )
+
+        def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                new_versions: ChannelVersions) -> RunnableConfig:
+            saved = super().put(config, self._compact_checkpoint(checkpoint), self._compact_metadata(metadata), new_versions)
+            thread_id = str(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"]["checkpoint_ns"]
+            with self.cursor() as cur:
+                cur.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                    "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT ?)",
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.max_history),
+                )
+                cur.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                    "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+                )
+                cur.execute(
+                    "INSERT INTO thread_activity (thread_id, last_seen) VALUES (?, ?) "
+                    "ON CONFLICT(thread_id) DO UPDATE SET last_seen = excluded.last_seen",
+                    (thread_id, time.time()),
+                )
+            self._sweep_idle()
+            return saved
+
+        def put_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                       task_path: str = "") -> None:
+            super().put_writes(config, self._compact_writes(writes), task_id, task_path)
+
+        def _sweep_idle(self) -> None:
+            now = time.time()
+            if self.ttl_seconds <= 0 or now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+            with self.cursor() as cur:
+                expired = [r[0] for r in cur.execute(
+                    "SELECT thread_id FROM thread_activity WHERE last_seen < ?", (now - self.ttl_seconds,)
+                ).fetchall()]
+            for thread_id in expired:
+                self.delete_thread(thread_id)
+
+        def delete_thread(self, thread_id: str) -> None:
+            super().delete_thread(thread_id)
+            with self.cursor() as cur:
+                cur.execute("DELETE FROM thread_activity WHERE thread_id = ?", (str(thread_id),))
+
+        # --- Async API (SqliteSaver only implements the sync one) ---
+        async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+            return await run_blocking(self.get_tuple, config)
+
+        async def alist(self, config: Optional[RunnableConfig], **kwargs: Any) -> AsyncIterator[CheckpointTuple]:
+            for item in await run_blocking(lambda: list(self.list(config, **kwargs))):
+                yield item
+
+        async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                       new_versions: ChannelVersions) -> RunnableConfig:
+            return await run_blocking(self.put, config, checkpoint, metadata, new_versions)
+
+        async def aput_writes(self, config: RunnableConfig, writes: Sequence[Tuple[str, Any]], task_id: str,
+                              task_path: str = "") -> None:
+            await run_blocking(self.put_writes, config, writes, task_id, task_path)
+
+        async def adelete_thread(self, thread_id: str) -> None:
+            await run_blocking(self.delete_thread, thread_id)
+
+
+def create_checkpointer(backend: str = CHECKPOINTER_BACKEND) -> Any:
+    """Builds the checkpointer selected by CHECKPOINTER_BACKEND ('memory', 'sqlite' or 'unbounded')."""
+    backend = (backend or "memory").lower()
+    if backend == "unbounded":
+        return MemorySaver()
+    if backend == "sqlite":
+        if SqliteSaver is None:
+            raise ImportError("CHECKPOINTER_BACKEND=sqlite requires the langgraph-checkpoint-sqlite package")
+        return BoundedSqliteSaver.from_path(CHECKPOINT_DB_PATH)
+    return BoundedMemorySaver()
@@ -0,0 +1,142 @@
+# concurrency.py
+"""
+Helpers shared by the async execution path.
+
+Blocking work (retriever.invoke, cross-encoder scoring, PDF parsing...) must never run
+on the event loop. It is pushed to a single bounded thread pool so that many concurrent
+questions can share one loop without spawning an unbounded number of threads.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", str(min(32, (os.cpu_count() or 1) + 4))))
+
+_blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix="rag-blocking")
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    return _blocking_executor
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking callable in the shared bounded pool, keeping the caller's context vars."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_blocking_executor, call)
+
+
+class TokenBucket:
+    """
+    Rate limiter shared by threads and async tasks: `rate` calls per second on average,
+    bursts of up to `capacity`. Each call reserves its slot under a lock, then waits
+    (time.sleep or asyncio.sleep) only as long as needed — no fixed delay.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes one token (possibly going negative) and returns how long to wait for it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1.0
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> float:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self) -> float:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent calls of a batched function. The first caller of a batch waits
+    up to `max_wait` seconds (less once `max_batch` items are queued) for other threads
+    to join, then makes a single `fn(all_items)` call and hands every caller its slice.
+    `fn` must return one result per item, in order. With no concurrent callers the
+    only cost is `max_wait`.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], Sequence[Any]], max_batch: int = 64, max_wait: float = 0.005):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[List[Any], Future]] = []
+        self._pending_items = 0
+        self._full = threading.Event()
+        self._calls = 0
+        self._batches = 0
+        self._items = 0
+
+    def submit(self, items: Sequence[Any]) -> List[Any]:
+        items = list(items)
+        if not items:
+            return []
+        future: Future = Future()
+        with self._lock:
+            self._pending.append((items, future))
+            self._pending_items += len(items)
+            self._calls += 1
+            leader = len(self._pending) == 1
+            full = self._full
+            if self._pending_items >= self.max_batch:
+                full.set()
+        if leader:
+            full.wait(self.max_wait)
+            with self._lock:
+                batch, self._pending, self._pending_items = self._pending, [], 0
+                self._full = threading.Event()
+                self._batches += 1
+            self._run(batch)
+        return future.result()
+
+    def _run(self, batch: List[Tuple[List[Any], Future]]) -> None:
+        flat = [item for items, _ in batch for item in items]
+        try:
+            results = list(self.fn(flat))
+            if len(results) != len(flat):
+                raise ValueError(f"batched function returned {len(results)} results for {len(flat)} items")
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        with self._lock:
+            self._items += len(flat)
+        offset = 0
+        for items, future in batch:
+            future.set_result(results[offset:offset + len(items)])
+            offset += len(items)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "batches": self._batches,
+                "items": self._items,
+                "mean_batch_items": round(self._items / self._batches, 2) if self._batches else 0.0,
+            }
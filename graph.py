@@ -1,49 +1,171 @@
 # graph.py
 
-from langchain_core.runnables import RunnableConfig
-import time, traceback, os
-from typing import Dict, Any, Optional, Iterator
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+import time, traceback, os, threading
+from typing import Dict, Any, AsyncIterator, List, Optional, Iterator
 from dotenv import load_dotenv
 from langgraph.graph import END, StateGraph
-from langgraph.checkpoint.memory import MemorySaver
 
 # --- Import des composants du graphe ---
-from chains.answer_grader import answer_grader
-from chains.retriever_grader import retrieval_grader
-from chains.router_query import question_router, RouteQuery
-from chains.hallucination_grader import hallucination_grader
-from nodes.generate import generate
-from nodes.query_rewrite import query_rewrite
-from nodes.web_search import web_search
-from nodes.retriever import retrieve_documents   # ✅ Nouveau import
-from Node_constant import RETRIEVE, GRADE_DOCUMENTS, GENERATE, WEBSEARCH, QUERY_REWRITE, ROUTE_QUESTION
+# Les chaînes LLM sont construites au premier appel (cf. chains/llm.py)
+from chains.retriever_grader import get_retrieval_grader, get_batch_retrieval_grader
+from chains.router_query import get_question_router, RouteQuery
+from chains.local_router import decide_without_corpus
+from nodes.generate import generate, agenerate, GENERATION_ERROR_MESSAGE
+from nodes.query_rewrite import query_rewrite, aquery_rewrite
+from nodes.web_search import web_search, aweb_search
+from nodes.retriever import retrieve_documents, aretrieve_documents   # ✅ Nouveau import
+from nodes.speculation import SPECULATION_MODE, Speculation
+from Node_constant import RETRIEVE, GRADE_DOCUMENTS, GENERATE, WEBSEARCH, QUERY_REWRITE, ROUTE_QUESTION, GENERATION_TOKEN, SEMANTIC_CACHE
 from state import GraphState
+from cache.semantic_cache import SemanticCache, create_semantic_cache
+from concurrency import run_blocking
+from checkpointer import create_checkpointer
+from instrumentation import (INSTRUMENTATION, RequestTrace, install_client_retry_counter, instrument_node,
+                             instrumentation_callback, record_cache)
 
 # --- Initialisation ---
 load_dotenv()
 
-class AdaptiveRAGSystem:
+# "parallel" : un appel par document, lancés en parallèle ; "single_call" : un seul appel pour tous
+GRADING_MODE = os.getenv("GRADING_MODE", "parallel")
+GRADING_MAX_CONCURRENCY = int(os.getenv("GRADING_MAX_CONCURRENCY", "5"))
+# Routage local (embeddings + vocabulaire du corpus) avant de solliciter le routeur LLM
+USE_LOCAL_ROUTER = os.getenv("USE_LOCAL_ROUTER", "true").lower() == "true"
+
+def _is_relevant(score: Any) -> bool:
+    """Interprète une note 'yes'/'no' (ou booléenne) renvoyée par le grader."""
+    value = getattr(score, "binary_score", score)
+    if isinstance(value, str):
+        return value.strip().lower() in ("yes", "true", "oui")
+    return bool(value)
+
+class _AnswerRecorder:
+    """Suit les événements d'un run pour mémoriser la réponse finale et ses sources."""
+
     def __init__(self):
+        self.generation = ""
+        self.documents: List[Any] = []
+        self.used_web_search = False
+
+    def observe(self, event: Dict[str, Any]) -> None:
+        if WEBSEARCH in event:
+            self.used_web_search = True
+        for node_output in event.values():
+            if not isinstance(node_output, dict):
+                continue
+            if node_output.get("documents"):
+                self.documents = node_output["documents"]
+            if node_output.get("generation"):
+                self.generation = node_output["generation"]
+
+    def cacheable(self) -> bool:
+        # Une réponse tirée du web vieillit vite : elle n'est pas mise en cache
+        return bool(self.generation) and self.generation != GENERATION_ERROR_MESSAGE and not self.used_web_search
+
+def document_sources(documents: List[Any]) -> List[Dict[str, Any]]:
+    """Résumé JSON des documents d'une réponse : source, chunk et score (rerank ou web)."""
+    sources = []
+    for doc in documents or []:
+        metadata = getattr(doc, "metadata", None) or {}
+        score = metadata.get("rerank_score", metadata.get("score"))
+        sources.append({
+            "source": metadata.get("source", "N/A"),
+            "chunk_id": metadata.get("chunk_id"),
+            "score": round(score, 4) if isinstance(score, float) else score,
+        })
+    return sources
+
+class AdaptiveRAGSystem:
+    def __init__(self, grading_mode: str = GRADING_MODE, grading_concurrency: int = GRADING_MAX_CONCURRENCY,
+                 semantic_cache: Optional[SemanticCache] = None, use_semantic_cache: bool = True,
+                 use_local_router: bool = USE_LOCAL_ROUTER, checkpointer: Optional[Any] = None,
+                 instrument: bool = INSTRUMENTATION, speculation: str = SPECULATION_MODE):
+        self.grading_mode = grading_mode
+        # Réécriture / recherche web de repli lancées en parallèle de la 1re recherche (cf. nodes/speculation.py)
+        self.speculation = speculation
+        # Temps, tokens, relances et hits de cache par nœud (cf. instrumentation.py)
+        self.instrument = instrument
+        if instrument:
+            install_client_retry_counter()
+        self.use_local_router = use_local_router
+        self.route_stats = {"local": 0, "llm": 0}
+        self._route_stats_lock = threading.Lock()  # nœuds de routage lancés depuis plusieurs threads / tâches
+        self.grading_concurrency = grading_concurrency
+        self.semantic_cache = (semantic_cache or create_semantic_cache()) if use_semantic_cache else None
         self.workflow = StateGraph(GraphState)
         self._setup_workflow()
-        memory = MemorySaver()
-        self.app = self.workflow.compile(checkpointer=memory)
+        # Historique borné par thread, threads inactifs évincés (cf. checkpointer.py)
+        self.checkpointer = checkpointer if checkpointer is not None else create_checkpointer()
+        self.app = self.workflow.compile(checkpointer=self.checkpointer)
         print("✅ Graphe LangGraph compilé avec succès.")
 
-    def _route_question(self, state: GraphState) -> Dict[str, Any]:
+    def _count_route(self, kind: str) -> None:
+        with self._route_stats_lock:
+            self.route_stats[kind] += 1
+
+    def _local_route(self, state: GraphState, config: RunnableConfig) -> Optional[Dict[str, Any]]:
+        """
+        Chemin rapide sans appel réseau : renvoie la route si le routeur local est confiant,
+        None s'il faut demander au LLM.
+        """
+        if not self.use_local_router:
+            return None
+        configurable = config.get("configurable", {})
+        if configurable.get("retriever") is None:
+            decision = decide_without_corpus()
+        else:
+            router = configurable.get("router")
+            if router is None:
+                return None
+            try:
+                decision = router.decide(state["question"], configurable.get("question_embedding"))
+            except Exception as e:
+                print(f"⚠️ Erreur du routeur local: {e}")
+                return None
+        if decision.datasource is None:
+            print(f"🤔 Routeur local incertain (sim={decision.similarity:.2f}, overlap={decision.overlap:.2f}) → LLM")
+            return None
+        self._count_route("local")
+        print(f"⚡ Routage local → {decision.datasource} ({decision.reason})")
+        return {**self._route_from_source(decision), "route": "local"}
+
+    def _route_question(self, state: GraphState, config: RunnableConfig) -> Dict[str, Any]:
         print("---NŒUD: ROUTAGE DE LA QUESTION---")
+        local = self._local_route(state, config)
+        if local is not None:
+            return local
         question = state["question"]
+        self._count_route("llm")
         try:
-            source: RouteQuery = question_router.invoke({"question": question})
-            datasource = str(source.datasource).strip().lower()
-            if datasource == WEBSEARCH:
-                return {"next": WEBSEARCH}
-            elif datasource == RETRIEVE:
-                return {"next": RETRIEVE}
-            else:
-                return {"next": RETRIEVE}
+            source: RouteQuery = get_question_router().invoke({"question": question})
+            return {**self._route_from_source(source), "route": "llm"}
         except Exception as e:
             print(f"⚠️ Erreur de routage: {e}")
+            return {"next": RETRIEVE, "route": "llm"}
+
+    async def _aroute_question(self, state: GraphState, config: RunnableConfig) -> Dict[str, Any]:
+        print("---NŒUD: ROUTAGE DE LA QUESTION (async)---")
+        local = self._local_route(state, config)
+        if local is not None:
+            return local
+        question = state["question"]
+        self._count_route("llm")
+        try:
+            source: RouteQuery = await get_question_router().ainvoke({"question": question})
+            return {**self._route_from_source(source), "route": "llm"}
+        except Exception as e:
+            print(f"⚠️ Erreur de routage: {e}")
+            return {"next": RETRIEVE, "route": "llm"}
+
+    @staticmethod
+    def _route_from_source(source: Any) -> Dict[str, Any]:
+        datasource = str(source.datasource).strip().lower()
+        if datasource == WEBSEARCH:
+            return {"next": WEBSEARCH}
+        elif datasource == RETRIEVE:
+            return {"next": RETRIEVE}
+        else:
             return {"next": RETRIEVE}
 
     def _grade_documents(self, state: GraphState) -> Dict[str, Any]:
@@ -52,20 +174,92 @@ class AdaptiveRAGSystem:
         documents = state["documents"]
         if not documents:
             return {"documents": [], "question": question}
-        filtered_docs = []
-        for d in documents:
+        if self.grading_mode == "single_call":
+            keep = self._grade_single_call(question, documents)
+        else:
+            keep = self._grade_parallel(question, documents)
+        filtered_docs = [d for d, k in zip(documents, keep) if k]
+        print(f"✅ {len(filtered_docs)}/{len(documents)} document(s) pertinent(s).")
+        return {"documents": filtered_docs, "question": question}
+
+    async def _agrade_documents(self, state: GraphState) -> Dict[str, Any]:
+        print("---NŒUD: ÉVALUATION DOCUMENTS (async)---")
+        question = state["question"]
+        documents = state["documents"]
+        if not documents:
+            return {"documents": [], "question": question}
+        if self.grading_mode == "single_call":
             try:
-                doc_text = getattr(d, "page_content", str(d))
-                score = retrieval_grader.invoke({"question": question, "document": doc_text})
-                if getattr(score, "binary_score", False):
-                    filtered_docs.append(d)
+                result = await get_batch_retrieval_grader().ainvoke(
+                    {"question": question, "documents": self._number_documents(documents)}
+                )
             except Exception as e:
-                print(f"⚠️ Erreur d’éval: {e}")
-                filtered_docs.append(d)
+                print(f"⚠️ Erreur d’éval groupée: {e}")
+                result = None
+            keep = self._keep_from_verdicts(result, len(documents))
+        else:
+            scores = await get_retrieval_grader().abatch(
+                self._grading_inputs(question, documents),
+                config={"max_concurrency": self.grading_concurrency},
+                return_exceptions=True,
+            )
+            keep = self._keep_from_scores(scores)
+        filtered_docs = [d for d, k in zip(documents, keep) if k]
+        print(f"✅ {len(filtered_docs)}/{len(documents)} document(s) pertinent(s).")
         return {"documents": filtered_docs, "question": question}
 
-    def _decide_to_generate(self, state: GraphState) -> str:
+    @staticmethod
+    def _grading_inputs(question: str, documents: List[Any]) -> List[Dict[str, str]]:
+        return [{"question": question, "document": getattr(d, "page_content", str(d))} for d in documents]
+
+    @staticmethod
+    def _number_documents(documents: List[Any]) -> str:
+        return "\n\n".join(f"[{i}] {getattr(d, 'page_content', str(d))}" for i, d in enumerate(documents))
+
+    def _grade_parallel(self, question: str, documents: List[Any]) -> List[bool]:
+        """Un appel par document, exécutés en parallèle (concurrence bornée)."""
+        scores = get_retrieval_grader().batch(
+            self._grading_inputs(question, documents),
+            config={"max_concurrency": self.grading_concurrency},
+            return_exceptions=True,
+        )
+        return self._keep_from_scores(scores)
+
+    @staticmethod
+    def _keep_from_scores(scores: List[Any]) -> List[bool]:
+        keep = []
+        for score in scores:
+            if isinstance(score, Exception):
+                print(f"⚠️ Erreur d’éval: {score}")
+                keep.append(True)  # fail-open : on garde le document
+            else:
+                keep.append(_is_relevant(score))
+        return keep
+
+    def _grade_single_call(self, question: str, documents: List[Any]) -> List[bool]:
+        """Un seul appel structuré qui renvoie un verdict par document numéroté."""
+        try:
+            result = get_batch_retrieval_grader().invoke(
+                {"question": question, "documents": self._number_documents(documents)}
+            )
+        except Exception as e:
+            print(f"⚠️ Erreur d’éval groupée: {e}")
+            result = None
+        return self._keep_from_verdicts(result, len(documents))
+
+    @staticmethod
+    def _keep_from_verdicts(result: Any, n_documents: int) -> List[bool]:
+        keep = [True] * n_documents  # fail-open pour les documents sans verdict
+        for verdict in getattr(result, "verdicts", []) or []:
+            if 0 <= verdict.index < n_documents:
+                keep[verdict.index] = _is_relevant(verdict)
+        return keep
+
+    def _decide_to_generate(self, state: GraphState, config: RunnableConfig) -> str:
         if state["documents"]:
+            speculation = config.get("configurable", {}).get("speculation")
+            if speculation is not None:
+                speculation.cancel()  # le repli spéculatif ne servira pas
             return GENERATE
         else:
             return QUERY_REWRITE if state["query_rewrite_count"] < 1 else WEBSEARCH
@@ -77,12 +271,19 @@ class AdaptiveRAGSystem:
         return END
 
     def _setup_workflow(self):
-        self.workflow.add_node(RETRIEVE, retrieve_documents)  # ✅ Utilise le nœud importé
-        self.workflow.add_node(GRADE_DOCUMENTS, self._grade_documents)
-        self.workflow.add_node(QUERY_REWRITE, query_rewrite)
-        self.workflow.add_node(WEBSEARCH, web_search)
-        self.workflow.add_node(GENERATE, generate)
-        self.workflow.add_node(ROUTE_QUESTION, self._route_question)
+        # Chaque nœud a une version sync (run/stream) et async (arun/astream)
+        nodes = {
+            RETRIEVE: (retrieve_documents, aretrieve_documents),  # ✅ Utilise le nœud importé
+            GRADE_DOCUMENTS: (self._grade_documents, self._agrade_documents),
+            QUERY_REWRITE: (query_rewrite, aquery_rewrite),
+            WEBSEARCH: (web_search, aweb_search),
+            GENERATE: (generate, agenerate),
+            ROUTE_QUESTION: (self._route_question, self._aroute_question),
+        }
+        for name, (func, afunc) in nodes.items():
+            if self.instrument:
+                func, afunc = instrument_node(name, func, afunc)
+            self.workflow.add_node(name, RunnableLambda(func, afunc=afunc, name=name))
 
         self.workflow.set_entry_point(ROUTE_QUESTION)
         self.workflow.add_conditional_edges(
@@ -104,12 +305,19 @@ class AdaptiveRAGSystem:
             {GENERATE: GENERATE, END: END}
         )
 
-    def run(self, question: str, retriever: Optional[Any] = None, config: Optional[Dict] = None) -> Iterator[Dict[str, Any]]:
-        if not self.app:
-            return iter([])
+    def _prepare(self, question: str, retriever: Optional[Any], config: Optional[Dict], router: Optional[Any] = None,
+                 trace: Optional[RequestTrace] = None):
         if config is None:
             config = {"configurable": {}}
-        config["configurable"]["retriever"] = retriever
+        config.setdefault("configurable", {})["retriever"] = retriever
+        config["configurable"]["router"] = router
+        if self.speculation != "off":
+            config["configurable"]["speculation"] = Speculation(self.speculation, instrument=self.instrument)
+        if trace is not None:
+            config["configurable"]["trace"] = trace
+            callbacks = config.get("callbacks") or []
+            if isinstance(callbacks, list) and instrumentation_callback not in callbacks:
+                config["callbacks"] = [*callbacks, instrumentation_callback]
         initial_state = {
             "question": question,
             "query_rewrite_count": 0,
@@ -117,10 +325,184 @@ class AdaptiveRAGSystem:
             "documents": [],
             "generation": "",
             "file_paths": [],
-            "web_search": False,
+            "web_search_needed": False,
             "route": "",
         }
-        return self.app.stream(initial_state, config=config)
+        return initial_state, config
+
+    @staticmethod
+    def _token_event(mode: str, payload: Any) -> Optional[Dict[str, Any]]:
+        """
+        Convertit un événement du stream multi-mode ("updates" + "messages") :
+        les tokens du nœud GENERATE deviennent {GENERATION_TOKEN: texte}, les mises à jour
+        de nœuds restent {nœud: sortie}, le reste (tokens des graders, etc.) est ignoré.
+        """
+        if mode == "updates":
+            return payload
+        message, metadata = payload
+        if metadata.get("langgraph_node") != GENERATE:
+            return None
+        content = getattr(message, "content", "")
+        return {GENERATION_TOKEN: content} if isinstance(content, str) and content else None
+
+    @staticmethod
+    def _corpus_fingerprint(corpus_fingerprint: Optional[str]) -> Optional[str]:
+        """
+        Empreinte du corpus pour le cache sémantique : uniquement une empreinte explicite
+        (clé du registre de retrievers). id(retriever) peut être réattribué après le
+        ramasse-miettes et un run sans corpus ne répond que par le web : pas de cache.
+        """
+        return corpus_fingerprint or None
+
+    def run(self, question: str, retriever: Optional[Any] = None, config: Optional[Dict] = None,
+            stream_tokens: bool = False, corpus_fingerprint: Optional[str] = None,
+            router: Optional[Any] = None, trace: Optional[RequestTrace] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Exécute le graphe et renvoie les mises à jour de chaque nœud ({nœud: sortie}).
+        Avec `stream_tokens=True`, les tokens de la génération sont aussi émis au fil de l'eau
+        sous la forme {GENERATION_TOKEN: texte}, avant la mise à jour finale du nœud GENERATE.
+        Si une question quasi identique a déjà été répondue sur le même corpus, un unique
+        événement {SEMANTIC_CACHE: {"generation", "documents"}} est renvoyé sans lancer le graphe.
+        Le cache n'est consulté qu'avec une empreinte `corpus_fingerprint`, et les réponses
+        passées par la recherche web n'y sont pas enregistrées.
+        `router` est le routeur local du corpus (voir chains/local_router.py).
+        `trace` (instrumentation.RequestTrace) est rempli au fil du run : durée, tokens,
+        relances, hits de cache et documents de chaque nœud. Sans lui, une trace interne
+        alimente quand même les métriques et les logs structurés.
+        """
+        if not self.app:
+            return iter([])
+        if trace is None and self.instrument:
+            trace = RequestTrace(question=question)
+        initial_state, config = self._prepare(question, retriever, config, router, trace)
+        if not stream_tokens:
+            stream = lambda: self.app.stream(initial_state, config=config)
+        else:
+            stream = lambda: self._iter_tokens(initial_state, config)
+        fingerprint = self._corpus_fingerprint(corpus_fingerprint)
+        if self.semantic_cache is None or fingerprint is None:
+            events = stream()
+        else:
+            events = self._run_cached(question, fingerprint, stream, config, trace)
+        speculation = config["configurable"].get("speculation")
+        if speculation is not None:
+            events = self._cancel_after(events, speculation)
+        return events if trace is None else self._traced(events, trace)
+
+    @staticmethod
+    def _cancel_after(events: Iterator[Dict[str, Any]], speculation: Speculation) -> Iterator[Dict[str, Any]]:
+        """Abandonne le travail spéculatif resté en suspens à la fin du run (ou s'il est interrompu)."""
+        try:
+            yield from events
+        finally:
+            speculation.cancel()
+
+    @staticmethod
+    def _traced(events: Iterator[Dict[str, Any]], trace: RequestTrace) -> Iterator[Dict[str, Any]]:
+        source = "graph"
+        try:
+            for event in events:
+                if SEMANTIC_CACHE in event:
+                    source = SEMANTIC_CACHE
+                yield event
+        finally:
+            trace.finish(source)
+
+    def _run_cached(self, question: str, fingerprint: str, stream, config: Dict,
+                    trace: Optional[RequestTrace] = None) -> Iterator[Dict[str, Any]]:
+        try:
+            vector = self.semantic_cache.embed(question)
+            # Réutilisé par le routeur local : la question n'est embeddée qu'une fois
+            config["configurable"]["question_embedding"] = vector
+            hit = self.semantic_cache.lookup(question, fingerprint, vector)
+        except Exception as e:
+            print(f"⚠️ Cache sémantique indisponible: {e}")
+            yield from stream()
+            return
+        record_cache(SEMANTIC_CACHE, hits=int(hit is not None), misses=int(hit is None), trace=trace)
+        if hit is not None:
+            yield {SEMANTIC_CACHE: {"generation": hit.generation, "documents": hit.documents()}}
+            return
+        recorder = _AnswerRecorder()
+        for event in stream():
+            recorder.observe(event)
+            yield event
+        if recorder.cacheable():
+            self.semantic_cache.store(question, fingerprint, recorder.generation, recorder.documents, vector)
+
+    def _iter_tokens(self, initial_state: Dict[str, Any], config: Dict) -> Iterator[Dict[str, Any]]:
+        for mode, payload in self.app.stream(initial_state, config=config, stream_mode=["updates", "messages"]):
+            event = self._token_event(mode, payload)
+            if event:
+                yield event
+
+    async def arun(self, question: str, retriever: Optional[Any] = None, config: Optional[Dict] = None,
+                   stream_tokens: bool = False, corpus_fingerprint: Optional[str] = None,
+                   router: Optional[Any] = None, trace: Optional[RequestTrace] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Équivalent async de `run` : mêmes événements, via `astream`. Les appels LLM et Tavily
+        sont non bloquants ; la recherche locale passe par le pool borné de concurrency.py.
+        """
+        if not self.app:
+            return
+        if trace is None and self.instrument:
+            trace = RequestTrace(question=question)
+        initial_state, config = self._prepare(question, retriever, config, router, trace)
+        source = "graph"
+        try:
+            fingerprint = self._corpus_fingerprint(corpus_fingerprint)
+            cache = self.semantic_cache if fingerprint is not None else None
+            vector = None
+            if cache is not None:
+                try:
+                    vector = await run_blocking(cache.embed, question)
+                    config["configurable"]["question_embedding"] = vector
+                    # Backend SQLite : lecture disque, hors de la boucle d'événements
+                    hit = await run_blocking(cache.lookup, question, fingerprint, vector)
+                    record_cache(SEMANTIC_CACHE, hits=int(hit is not None), misses=int(hit is None), trace=trace)
+                except Exception as e:
+                    print(f"⚠️ Cache sémantique indisponible: {e}")
+                    cache, hit = None, None
+                if hit is not None:
+                    source = SEMANTIC_CACHE
+                    yield {SEMANTIC_CACHE: {"generation": hit.generation, "documents": hit.documents()}}
+                    return
+            recorder = _AnswerRecorder()
+            async for event in self._aiter_events(initial_state, config, stream_tokens):
+                recorder.observe(event)
+                yield event
+            if cache is not None and recorder.cacheable():
+                await run_blocking(cache.store, question, fingerprint, recorder.generation, recorder.documents, vector)
+        finally:
+            speculation = config["configurable"].get("speculation")
+            if speculation is not None:
+                speculation.cancel()
+            if trace is not None:
+                trace.finish(source)
+
+    async def _aiter_events(self, initial_state: Dict[str, Any], config: Dict, stream_tokens: bool) -> AsyncIterator[Dict[str, Any]]:
+        if not stream_tokens:
+            async for event in self.app.astream(initial_state, config=config):
+                yield event
+            return
+        async for mode, payload in self.app.astream(initial_state, config=config, stream_mode=["updates", "messages"]):
+            event = self._token_event(mode, payload)
+            if event:
+                yield event
+
+# --- Singleton (construit au premier accès, pas à l'import) ---
+_rag_system: Optional[AdaptiveRAGSystem] = None
+_rag_system_lock = threading.Lock()
+
+def get_rag_system() -> AdaptiveRAGSystem:
+    global _rag_system
+    with _rag_system_lock:
+        if _rag_system is None:
+            _rag_system = AdaptiveRAGSystem()
+        return _rag_system
 
-# --- Singleton ---
-rag_system = AdaptiveRAGSystem()
+def __getattr__(name: str) -> Any:
+    # Compatibilité : `from graph import rag_system` crée le système à la demande
+    if name == "rag_system":
+        return get_rag_system()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,346 @@
+# ingestion/bm25_index.py
+"""
+Index BM25 compact en tableaux NumPy, remplaçant BM25Retriever.from_documents.
+
+Les postings sont stockés en triplets (terme, document, tf) puis compactés en CSR
+(un segment contigu de documents par terme) : une requête ne touche que les postings
+de ses termes et le score est calculé par opérations vectorisées, au lieu de parcourir
+tout le corpus en Python comme rank_bm25. L'index supporte l'ajout et le retrait
+incrémental de chunks (retrait par tombstone, compactage quand les tombstones
+dominent) et se sérialise à côté du store Chroma.
+
+Persistance incrémentale : une fois l'index sauvegardé, save() n'écrit que les ajouts
+et retraits depuis le save précédent, en fin d'un journal JSON lines. L'instantané
+complet (postings.npz + index.json) n'est réécrit que lorsque le journal dépasse
+BM25_COMPACT_RATIO de sa taille ; le journal est alors remplacé par un neuf, nommé
+dans index.json (un journal resté d'un ancien instantané n'est jamais rejoué). Une
+dernière ligne tronquée (save interrompu) est ignorée et coupée au chargement.
+
+Les IDF et la longueur moyenne sont calculés sur le sous-ensemble recherché (filtre
+de métadonnées), ce qui donne les mêmes scores qu'un index construit sur ce seul
+sous-ensemble. IDF non négative (variante Lucene) : log(1 + (N - df + 0.5) / (df + 0.5)).
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+BM25_DIRNAME = "bm25"
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Part de documents supprimés (ou d'opérations journalisées) au-delà de laquelle l'index est compacté
+BM25_COMPACT_RATIO = float(os.getenv("BM25_COMPACT_RATIO", "0.25"))
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+def matches_filter(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Sous-ensemble des filtres Chroma : {clé: valeur}, {clé: {"$in": [...]}}, {"$and": [...]}."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            if set(condition) != {"$in"}:
+                raise ValueError(f"Filtre non supporté: {condition}")
+            if metadata.get(key) not in condition["$in"]:
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+class BM25Index:
+    """Index BM25 incrémental ; toutes les méthodes publiques sont thread-safe."""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self._vocab: Dict[str, int] = {}
+        self._documents: List[Document] = []
+        self._slots: Dict[str, int] = {}  # chunk_id -> position dans _documents
+        # Triplets de postings (stockage de référence, en ordre d'ajout)
+        self._terms = np.empty(0, dtype=np.int32)
+        self._docs = np.empty(0, dtype=np.int32)
+        self._tfs = np.empty(0, dtype=np.float32)
+        self._lengths = np.empty(0, dtype=np.float32)
+        self._alive = np.empty(0, dtype=bool)
+        # Vue CSR dérivée, reconstruite paresseusement après une modification
+        self._indptr: Optional[np.ndarray] = None
+        self._post_docs: Optional[np.ndarray] = None
+        self._post_tfs: Optional[np.ndarray] = None
+        self._masks: Dict[str, np.ndarray] = {}
+        self._lock = threading.RLock()
+        # Persistance : répertoire de l'instantané, son journal et les opérations pas encore écrites
+        self._directory: Optional[str] = None
+        self._generation = 0
+        self._base_docs = 0
+        self._journal_ops = 0
+        self._pending_ops: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document], **kwargs: Any) -> "BM25Index":
+        index = cls(**kwargs)
+        index.add_documents(documents)
+        return index
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    # --- Mise à jour ---
+    @staticmethod
+    def _doc_id(document: Document, fallback: int) -> str:
+        return str(document.metadata.get("chunk_id", f"doc-{fallback}"))
+
+    def add_documents(self, documents: Iterable[Document]) -> None:
+        """Ajoute (ou remplace, à chunk_id égal) des chunks."""
+        with self._lock:
+            terms: List[int] = []
+            docs: List[int] = []
+            tfs: List[int] = []
+            lengths: List[int] = []
+            dead: List[int] = []  # anciennes versions des chunk_ids ré-ajoutés
+            added: List[Document] = []
+            for document in documents:
+                slot = len(self._documents)
+                doc_id = self._doc_id(document, slot)
+                if doc_id in self._slots:
+                    dead.append(self._slots[doc_id])
+                counts = Counter(tokenize(document.page_content))
+                for term, tf in counts.items():
+                    terms.append(self._vocab.setdefault(term, len(self._vocab)))
+                    docs.append(slot)
+                    tfs.append(tf)
+                lengths.append(sum(counts.values()))
+                self._documents.append(document)
+                self._slots[doc_id] = slot
+                added.append(document)
+            if not lengths:
+                return
+            if self._directory is not None:
+                self._pending_ops.append({"add": [_serialize(d) for d in added]})
+            self._terms = np.concatenate([self._terms, np.asarray(terms, dtype=np.int32)])
+            self._docs = np.concatenate([self._docs, np.asarray(docs, dtype=np.int32)])
+            self._tfs = np.concatenate([self._tfs, np.asarray(tfs, dtype=np.float32)])
+            self._lengths = np.concatenate([self._lengths, np.asarray(lengths, dtype=np.float32)])
+            self._alive = np.concatenate([self._alive, np.ones(len(lengths), dtype=bool)])
+            self._alive[dead] = False
+            self._invalidate()
+
+    def remove(self, chunk_ids: Iterable[str]) -> int:
+        """Retire des chunks (tombstone) ; renvoie le nombre de chunks retirés."""
+        with self._lock:
+            removed: List[str] = []
+            for chunk_id in chunk_ids:
+                slot = self._slots.pop(chunk_id, None)
+                if slot is not None and self._alive[slot]:
+                    self._alive[slot] = False
+                    removed.append(chunk_id)
+            if removed:
+                self._invalidate()
+                if self._directory is not None:
+                    self._pending_ops.append({"remove": removed})
+            return len(removed)
+
+    def _invalidate(self) -> None:
+        self._indptr = self._post_docs = self._post_tfs = None
+        self._masks.clear()
+
+    def _compact(self) -> None:
+        """Supprime physiquement les documents morts et renumérote les slots."""
+        new_slot = np.cumsum(self._alive) - 1
+        keep = self._alive[self._docs]
+        self._terms = self._terms[keep]
+        self._docs = new_slot[self._docs[keep]].astype(np.int32)
+        self._tfs = self._tfs[keep]
+        self._lengths = self._lengths[self._alive]
+        self._documents = [d for d, alive in zip(self._documents, self._alive) if alive]
+        self._alive = np.ones(len(self._documents), dtype=bool)
+        self._slots = {self._doc_id(d, i): i for i, d in enumerate(self._documents)}
+
+    def _ensure_built(self) -> None:
+        if self._indptr is not None:
+            return
+        if len(self._alive) and (~self._alive).mean() > BM25_COMPACT_RATIO:
+            self._compact()
+        live = self._alive[self._docs]
+        terms, docs, tfs = self._terms[live], self._docs[live], self._tfs[live]
+        order = np.argsort(terms, kind="stable")
+        self._post_docs = docs[order]
+        self._post_tfs = tfs[order]
+        self._indptr = np.zeros(len(self._vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self._vocab)), out=self._indptr[1:])
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        if not where:
+            return self._alive.copy()
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._alive & np.fromiter(
+                (matches_filter(d.metadata, where) for d in self._documents), dtype=bool, count=len(self._documents)
+            )
+            self._masks[key] = mask
+        return mask
+
+    # --- Recherche ---
+    def search(self, query: str, k: int = 4, where: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """Top-k (document, score) pour la requête, restreint aux chunks satisfaisant `where`."""
+        with self._lock:
+            self._ensure_built()
+            mask = self._mask(where)
+            indptr, post_docs, post_tfs = self._indptr, self._post_docs, self._post_tfs
+            lengths, documents = self._lengths, self._documents
+            # Sous le verrou : un terme ajouté ensuite aurait un id hors de `indptr`
+            query_terms = Counter(self._vocab[t] for t in tokenize(query) if t in self._vocab)
+        n_docs = int(mask.sum())
+        if not n_docs or not query_terms or k <= 0:
+            return []
+
+        subset = where is not None
+        avgdl = float(lengths[mask].mean()) or 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / avgdl)
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        for term_id, query_tf in query_terms.items():
+            start, end = indptr[term_id], indptr[term_id + 1]
+            docs, tfs = post_docs[start:end], post_tfs[start:end]
+            if subset:
+                keep = mask[docs]
+                docs, tfs = docs[keep], tfs[keep]
+            if not len(docs):
+                continue
+            idf = np.log1p((n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += query_tf * idf * tfs * (self.k1 + 1.0) / (tfs + norm[docs])
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(documents[i], float(scores[i])) for i in candidates]
+
+    # --- Persistance ---
+    @staticmethod
+    def _journal_path(directory: str, generation: int) -> str:
+        return os.path.join(directory, f"journal.{generation}.jsonl")
+
+    def save(self, directory: str) -> None:
+        """
+        Ajoute au journal les opérations depuis le dernier save, ou réécrit l'instantané
+        complet (autre répertoire, premier save, journal trop long).
+        """
+        with self._lock:
+            pending = sum(len(op.get("add") or op.get("remove")) for op in self._pending_ops)
+            if directory == self._directory and self._journal_ops + pending <= BM25_COMPACT_RATIO * self._base_docs:
+                if self._pending_ops:
+                    with open(self._journal_path(directory, self._generation), "a", encoding="utf-8") as f:
+                        f.write("".join(json.dumps(op, default=str) + "\n" for op in self._pending_ops))
+                    self._journal_ops += pending
+                    self._pending_ops = []
+                return
+            self._write_snapshot(directory)
+
+    def _write_snapshot(self, directory: str) -> None:
+        """Écrit l'index complet (tableaux .npz + métadonnées JSON) de manière atomique, avec un journal neuf."""
+        self._ensure_built()
+        self._compact()
+        self._invalidate()
+        os.makedirs(directory, exist_ok=True)
+        previous_journal = self._journal_path(directory, self._generation) if directory == self._directory else None
+        generation = self._generation + 1
+        tmp_arrays = os.path.join(directory, "postings.tmp.npz")
+        np.savez(tmp_arrays, terms=self._terms, docs=self._docs, tfs=self._tfs, lengths=self._lengths)
+        tmp_meta = os.path.join(directory, "index.json.tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "generation": generation,
+                "vocab": list(self._vocab),
+                "documents": [_serialize(d) for d in self._documents],
+            }, f, default=str)
+        os.replace(tmp_arrays, os.path.join(directory, "postings.npz"))
+        os.replace(tmp_meta, os.path.join(directory, "index.json"))
+        if previous_journal is not None and os.path.exists(previous_journal):
+            os.remove(previous_journal)
+        self._directory, self._generation = directory, generation
+        self._base_docs, self._journal_ops, self._pending_ops = len(self._documents), 0, []
+
+    def _replay(self, path: str) -> int:
+        """Rejoue le journal ; coupe une dernière ligne tronquée. Renvoie le nombre d'opérations."""
+        if not os.path.exists(path):
+            return 0
+        replayed = valid_end = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("ligne incomplète")
+                    op = json.loads(line)
+                except ValueError:
+                    break
+                if "add" in op:
+                    self.add_documents(Document(page_content=d["page_content"], metadata=d["metadata"]) for d in op["add"])
+                else:
+                    self.remove(op["remove"])
+                replayed += len(op.get("add") or op.get("remove"))
+                valid_end += len(line)
+        if os.path.getsize(path) > valid_end:
+            os.truncate(path, valid_end)
+        return replayed
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["BM25Index"]:
+        """Recharge un index sauvegardé, journal compris (None s'il est absent ou illisible)."""
+        try:
+            with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = np.load(os.path.join(directory, "postings.npz"))
+        except (OSError, ValueError) as e:
+            if os.path.exists(directory):
+                print(f"⚠️ Index BM25 illisible ({e}), il sera reconstruit.")
+            return None
+        index = cls(k1=meta["k1"], b=meta["b"])
+        index._vocab = {term: i for i, term in enumerate(meta["vocab"])}
+        index._documents = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in meta["documents"]]
+        index._slots = {index._doc_id(d, i): i for i, d in enumerate(index._documents)}
+        index._terms, index._docs, index._tfs = arrays["terms"], arrays["docs"], arrays["tfs"]
+        index._lengths = arrays["lengths"]
+        index._alive = np.ones(len(index._documents), dtype=bool)
+        index._generation = meta.get("generation", 0)
+        index._base_docs = len(index._documents)
+        try:
+            index._journal_ops = index._replay(cls._journal_path(directory, index._generation))
+        except (OSError, KeyError, TypeError) as e:
+            print(f"⚠️ Journal BM25 illisible ({e}), l'index sera reconstruit.")
+            return None
+        index._directory = directory
+        return index
+
+    def chunk_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._slots)
+
+def _serialize(document: Document) -> Dict[str, Any]:
+    return {"page_content": document.page_content, "metadata": document.metadata}
+
+class BM25IndexRetriever(BaseRetriever):
+    """Retriever LangChain au-dessus d'un BM25Index (remplaçant direct de BM25Retriever)."""
+
+    index: Any
+    k: int = 4
+    search_filter: Optional[Dict[str, Any]] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        # Copies : les étapes suivantes (fusion, reranking) peuvent annoter les métadonnées
+        return [
+            Document(page_content=doc.page_content, metadata=dict(doc.metadata))
+            for doc, _ in self.index.search(query, k=self.k, where=self.search_filter)
+        ]
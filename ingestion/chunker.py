@@ -0,0 +1,115 @@
+# ingestion/chunker.py
+"""
+Découpage sémantique vectorisé (NumPy), remplaçant de SemanticChunker.
+
+Même principe que SemanticChunker (phrases + voisines embeddées, coupure quand la
+distance cosinus entre deux phrases consécutives dépasse un percentile), mais :
+- toutes les phrases de tous les documents sont embeddées en un seul appel par lots ;
+- distances et points de coupure sont calculés par opérations sur tableaux ;
+- l'embedding de chaque chunk est dérivé des vecteurs de phrases déjà calculés
+  (moyenne normalisée), ce qui évite de ré-embedder les chunks à l'indexation ;
+- aucun chunk ne dépasse `max_chunk_chars`. Une phrase plus longue est coupée en
+  morceaux, embeddés chacun (un second appel par lots) : le vecteur de la phrase
+  entière ne décrit pas un morceau qui n'en contient qu'une partie.
+"""
+import re
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.?!])\s+")
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_SPLIT.split(text) if s.strip()]
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    return matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+
+class FastSemanticChunker:
+    def __init__(
+        self,
+        embeddings: Any,
+        breakpoint_threshold_amount: float = 95,
+        buffer_size: int = 1,
+        max_chunk_chars: int = 2000,
+    ):
+        self.embeddings = embeddings
+        self.breakpoint_threshold_amount = breakpoint_threshold_amount
+        self.buffer_size = buffer_size
+        self.max_chunk_chars = max_chunk_chars
+
+    def _combined(self, sentences: List[str]) -> List[str]:
+        """Chaque phrase avec ses `buffer_size` voisines, comme SemanticChunker."""
+        b = self.buffer_size
+        return [" ".join(sentences[max(0, i - b): i + b + 1]) for i in range(len(sentences))]
+
+    def _breakpoints(self, vectors: np.ndarray) -> np.ndarray:
+        """Indices i tels qu'un chunk se termine après la phrase i."""
+        if len(vectors) < 2:
+            return np.empty(0, dtype=int)
+        distances = 1.0 - np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+        threshold = np.percentile(distances, self.breakpoint_threshold_amount)
+        return np.flatnonzero(distances > threshold)
+
+    def _bounded_groups(self, sentences: List[str], start: int, end: int) -> List[Tuple[int, int]]:
+        """Découpe [start, end) en groupes contigus de phrases d'au plus max_chunk_chars."""
+        groups, group_start, length = [], start, 0
+        for i in range(start, end):
+            added = len(sentences[i]) + (1 if i > group_start else 0)
+            if i > group_start and length + added > self.max_chunk_chars:
+                groups.append((group_start, i))
+                group_start, length = i, len(sentences[i])
+            else:
+                length += added
+        groups.append((group_start, end))
+        return groups
+
+    def _chunk_text(self, sentences: List[str], vectors: np.ndarray) -> List[Tuple[str, Optional[np.ndarray]]]:
+        """(texte, vecteur) des chunks ; vecteur None pour les morceaux d'une phrase trop longue."""
+        ends = np.append(self._breakpoints(vectors) + 1, len(sentences))
+        chunks = []
+        start = 0
+        for end in ends:
+            for group_start, group_end in self._bounded_groups(sentences, start, int(end)):
+                text = " ".join(sentences[group_start:group_end])
+                if len(text) > self.max_chunk_chars:
+                    # Une phrase isolée plus longue que la limite est coupée brutalement
+                    chunks.extend((text[offset: offset + self.max_chunk_chars], None)
+                                  for offset in range(0, len(text), self.max_chunk_chars))
+                    continue
+                vector = vectors[group_start:group_end].mean(axis=0)
+                chunks.append((text, vector / (np.linalg.norm(vector) + 1e-12)))
+            start = int(end)
+        return chunks
+
+    def split_documents_with_embeddings(self, documents: List[Document]) -> Tuple[List[Document], np.ndarray]:
+        """Renvoie les chunks et, aligné, la matrice de leurs embeddings (dérivés des phrases, sauf morceaux)."""
+        per_doc = [split_sentences(doc.page_content) for doc in documents]
+        combined = [c for sentences in per_doc for c in self._combined(sentences)]
+        if not combined:
+            return [], np.empty((0, 0), dtype=np.float32)
+        all_vectors = _normalize_rows(np.asarray(self.embeddings.embed_documents(combined), dtype=np.float32))
+
+        chunks: List[Document] = []
+        chunk_vectors: List[Optional[np.ndarray]] = []
+        offset = 0
+        for doc, sentences in zip(documents, per_doc):
+            vectors = all_vectors[offset: offset + len(sentences)]
+            offset += len(sentences)
+            if not sentences:
+                continue
+            for text, vector in self._chunk_text(sentences, vectors):
+                chunks.append(Document(page_content=text, metadata=dict(doc.metadata)))
+                chunk_vectors.append(vector)
+        pieces = [i for i, vector in enumerate(chunk_vectors) if vector is None]
+        if pieces:
+            piece_vectors = _normalize_rows(np.asarray(
+                self.embeddings.embed_documents([chunks[i].page_content for i in pieces]), dtype=np.float32))
+            for i, vector in zip(pieces, piece_vectors):
+                chunk_vectors[i] = vector
+        return chunks, np.stack(chunk_vectors)
+
+    def split_documents(self, documents: List[Document]) -> List[Document]:
+        chunks, _ = self.split_documents_with_embeddings(documents)
+        return chunks
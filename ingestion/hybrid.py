@@ -0,0 +1,174 @@
+# ingestion/hybrid.py
+"""
+Recherche hybride (vectorielle + BM25) à branches concurrentes, remplaçant EnsembleRetriever.
+
+EnsembleRetriever interroge ses retrievers l'un après l'autre puis fusionne par RRF en
+comparant les page_content. Ici la branche vectorielle (embedding de la requête + HNSW)
+part dans un pool dédié pendant que la branche BM25 tourne dans le thread appelant :
+la latence est celle de la branche la plus lente, pas leur somme. Les résultats sont
+dédupliqués par chunk_id et fusionnés par RRF pondéré ou par somme pondérée des scores
+normalisés ; les scores sont exposés dans les métadonnées (`fusion_score`,
+`vector_score`, `bm25_score`) et la latence de chaque branche dans `latency_stats()`.
+Avec un `vector_index` quantifié (ingestion/vector_index.py), la branche vectorielle
+l'interroge à la place du HNSW et ne lit dans Chroma que le texte des chunks retenus.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import PrivateAttr
+
+HYBRID_FUSION = os.getenv("HYBRID_FUSION", "rrf")  # rrf | score
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_MAX_WORKERS = int(os.getenv("HYBRID_MAX_WORKERS", "8"))
+
+# Pool réservé à la branche vectorielle : jamais partagé avec les appelants (qui peuvent
+# eux-mêmes tourner dans le pool bloquant de concurrency.py), donc pas d'interblocage.
+_leg_executor = ThreadPoolExecutor(max_workers=HYBRID_MAX_WORKERS, thread_name_prefix="hybrid-leg")
+
+VECTOR, BM25 = "vector", "bm25"
+
+def chunk_key(document: Document) -> str:
+    """Identité d'un chunk : son chunk_id, ou à défaut un hash de sa source et de son texte."""
+    chunk_id = document.metadata.get("chunk_id")
+    if chunk_id is not None:
+        return str(chunk_id)
+    raw = f"{document.metadata.get('source', '')}\x00{document.page_content}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _normalize(scores: List[float]) -> List[float]:
+    """Min-max sur [0, 1] ; une branche à score constant vaut 1 partout."""
+    if not scores:
+        return []
+    low, high = min(scores), max(scores)
+    if high - low < 1e-12:
+        return [1.0] * len(scores)
+    return [(s - low) / (high - low) for s in scores]
+
+def fuse(
+    legs: Dict[str, List[Tuple[Document, float]]],
+    weights: Dict[str, float],
+    method: str = HYBRID_FUSION,
+    rrf_k: int = HYBRID_RRF_K,
+) -> List[Document]:
+    """Fusionne des listes classées (document, score brut) ; renvoie des copies annotées, triées."""
+    fused: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    raw_scores: Dict[str, Dict[str, float]] = {}
+    for leg, results in legs.items():
+        weight = weights.get(leg, 0.0)
+        normalized = _normalize([score for _, score in results]) if method == "score" else None
+        for rank, (document, score) in enumerate(results):
+            key = chunk_key(document)
+            if key in raw_scores.get(leg, {}):
+                continue  # doublon au sein d'une même branche
+            documents.setdefault(key, document)
+            raw_scores.setdefault(leg, {})[key] = score
+            contribution = weight * normalized[rank] if normalized is not None else weight / (rrf_k + rank + 1)
+            fused[key] = fused.get(key, 0.0) + contribution
+
+    ordered = sorted(fused, key=fused.get, reverse=True)
+    output = []
+    for key in ordered:
+        source = documents[key]
+        metadata = dict(source.metadata)
+        metadata["fusion_score"] = fused[key]
+        for leg in legs:
+            if key in raw_scores.get(leg, {}):
+                metadata[f"{leg}_score"] = raw_scores[leg][key]
+        output.append(Document(page_content=source.page_content, metadata=metadata))
+    return output
+
+class HybridRetriever(BaseRetriever):
+    """Retriever hybride Chroma + BM25Index avec branches concurrentes et fusion native."""
+
+    vectorstore: Any
+    bm25_index: Any
+    vector_k: int = 10
+    bm25_k: int = 10
+    weights: List[float] = [0.6, 0.4]  # [vecteur, BM25], comme l'EnsembleRetriever d'origine
+    fusion: str = HYBRID_FUSION
+    rrf_k: int = HYBRID_RRF_K
+    search_filter: Optional[Dict[str, Any]] = None
+    vector_index: Optional[Any] = None  # QuantizedVectorIndex du store (VECTOR_INDEX=int8|binary)
+
+    _latency_lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _latency: Dict[str, Dict[str, float]] = PrivateAttr(default_factory=dict)
+
+    def _vector_leg(self, query: str) -> List[Tuple[Document, float]]:
+        if self.vector_index is not None:
+            results = self._quantized_search(query)
+        else:
+            results = self.vectorstore.similarity_search_with_score(query, k=self.vector_k, filter=self.search_filter)
+        # Distance Chroma -> score croissant dans (0, 1]
+        return [(document, 1.0 / (1.0 + distance)) for document, distance in results]
+
+    def _quantized_search(self, query: str) -> List[Tuple[Document, float]]:
+        vector = self.vectorstore.embeddings.embed_query(query)
+        hits = self.vector_index.search(vector, k=self.vector_k, where=self.search_filter)
+        if not hits:
+            return []
+        stored = self.vectorstore.get(ids=[chunk_id for chunk_id, _ in hits], include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: Document(page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        # Un chunk retiré de Chroma entre-temps est simplement ignoré
+        return [(by_id[chunk_id], distance) for chunk_id, distance in hits if chunk_id in by_id]
+
+    def _bm25_leg(self, query: str) -> List[Tuple[Document, float]]:
+        return self.bm25_index.search(query, k=self.bm25_k, where=self.search_filter)
+
+    def _timed(self, leg: str, func: Any, query: str) -> List[Tuple[Document, float]]:
+        start = time.perf_counter()
+        try:
+            return func(query)
+        finally:
+            self._record(leg, time.perf_counter() - start)
+
+    def _record(self, leg: str, seconds: float) -> None:
+        with self._latency_lock:
+            stats = self._latency.setdefault(leg, {"calls": 0, "total_seconds": 0.0, "last_seconds": 0.0, "max_seconds": 0.0})
+            stats["calls"] += 1
+            stats["total_seconds"] += seconds
+            stats["last_seconds"] = seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Latence par branche (et de la recherche hybride complète, clé "hybrid")."""
+        with self._latency_lock:
+            return {
+                leg: {**stats, "mean_seconds": stats["total_seconds"] / stats["calls"] if stats["calls"] else 0.0}
+                for leg, stats in self._latency.items()
+            }
+
+    def search_legs(self, query: str) -> Dict[str, List[Tuple[Document, float]]]:
+        """Interroge les deux branches en parallèle ; une branche en échec est ignorée si l'autre répond."""
+        start = time.perf_counter()
+        vector_future = _leg_executor.submit(self._timed, VECTOR, self._vector_leg, query)
+        legs: Dict[str, List[Tuple[Document, float]]] = {}
+        errors: Dict[str, Exception] = {}
+        try:
+            legs[BM25] = self._timed(BM25, self._bm25_leg, query)
+        except Exception as e:
+            errors[BM25] = e
+        try:
+            legs[VECTOR] = vector_future.result()
+        except Exception as e:
+            errors[VECTOR] = e
+        self._record("hybrid", time.perf_counter() - start)
+        if not legs:
+            raise errors[VECTOR]
+        for leg, error in errors.items():
+            print(f"⚠️ Recherche {leg} en échec, résultats de l'autre branche seulement: {error}")
+        return legs
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        legs = self.search_legs(query)
+        return fuse(legs, weights={VECTOR: self.weights[0], BM25: self.weights[1]}, method=self.fusion, rrf_k=self.rrf_k)
@@ -1,142 +1,246 @@
 # ingestion.py (Version Corrigée)
 import os
+import hashlib
 os.environ["USER_AGENT"] = "FinalRagBootcamp/1.0"
 os.environ["CHROMA_TELEMETRY"] = "FALSE"
 
-import chromadb
-# Patch telemetry to avoid argument errors
-chromadb.telemetry.capture = lambda *args, **kwargs: None
-
-from pathlib import Path
-from typing import List, Any
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, Docx2txtLoader, CSVLoader, UnstructuredExcelLoader, WebBaseLoader
-from langchain_community.vectorstores import Chroma
-from langchain_groq import ChatGroq
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_community.retrievers import BM25Retriever
-from langchain.retrievers import EnsembleRetriever
-from langchain.retrievers.document_compressors import DocumentCompressorPipeline, CrossEncoderReranker
-from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import TYPE_CHECKING, List, Any, NamedTuple, Optional
+from ingestion.bm25_index import BM25Index
+from ingestion.hybrid import HYBRID_FUSION, HYBRID_RRF_K, HybridRetriever
+from ingestion.reranker import RERANKER_CASCADE_MARGIN, CachedCrossEncoderReranker
+from ingestion.models import EMBEDDING_MODEL_NAME, RERANKER_MODEL_NAME, get_cross_encoder, get_embeddings
+
+# chromadb, langchain_experimental et les compresseurs langchain coûtent plusieurs
+# secondes à l'import : ils ne sont chargés qu'au moment de construire un index.
+if TYPE_CHECKING:
+    from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
+    from langchain_community.vectorstores import Chroma
 
 # --- Configuration partagée ---
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+SEMANTIC_CHUNKER_CONFIG = {
+    "breakpoint_threshold_type": "percentile",
+    "breakpoint_threshold_amount": 95,
+    "buffer_size": 1,
+    "max_chunk_chars": int(os.getenv("MAX_CHUNK_CHARS", "2000")),
+    # "numpy" : ingestion/chunker.py (embeddings de phrases réutilisés) ; "langchain" : SemanticChunker
+    "implementation": os.getenv("CHUNKER_IMPLEMENTATION", "numpy"),
+}
+RETRIEVER_CONFIG = {
+    "vector_k": 10,
+    "bm25_k": 10,
+    "weights": [0.6, 0.4],  # [vecteur, BM25]
+    "fusion": HYBRID_FUSION,  # "rrf" ou "score" (somme pondérée des scores normalisés)
+    "rrf_k": HYBRID_RRF_K,
+    "top_n": 5,
+    "rerank_cascade_margin": RERANKER_CASCADE_MARGIN,
+}
+
+DEFAULT_STORE_DIR = os.getenv("DEFAULT_STORE_DIR", "./default_chroma_db")
+# Clé (et empreinte de cache sémantique) du corpus par défaut, pour le serveur comme pour les lots
+DEFAULT_CORPUS_KEY = "default"
+UPLOADS_STORE_DIR = os.getenv("UPLOADS_STORE_DIR", "./uploads_chroma_db")
+DEFAULT_URLS = [
+    "https://lilianweng.github.io/posts/2023-06-23-agent/",
+    "https://lilianweng.github.io/posts/2023-03-15-prompt-engineering/",
+    "https://lilianweng.github.io/posts/2023-10-25-adv-attack-llm/",
+]
+
+def __getattr__(name: str) -> Any:
+    # Compatibilité : `from ingestion.ingestion import embeddings` charge le modèle partagé à la demande
+    if name == "embeddings":
+        return get_embeddings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def ingestion_config() -> dict:
+    """Configuration qui détermine le contenu d'un index (sert à l'empreinte des caches)."""
+    return {
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "reranker_model": RERANKER_MODEL_NAME,
+        "chunker": SEMANTIC_CHUNKER_CONFIG,
+        "retriever": RETRIEVER_CONFIG,
+    }
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hash SHA-256 du contenu d'un fichier (lu par blocs)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 def load_documents(file_paths: List[str] = None, urls: List[str] = None):
+    """
+    Charge fichiers et URLs en parallèle (voir ingestion/loaders.py) et renvoie la liste
+    des documents dans l'ordre des sources fournies. Une source en échec est signalée
+    sans empêcher le chargement des autres.
+    """
+    from ingestion.loaders import iter_load_documents
+
+    results = {}
+    for result in iter_load_documents(file_paths=file_paths, urls=urls):
+        if result.ok:
+            print(f"Chargé {len(result.documents)} documents depuis {result.source} ({result.seconds:.1f}s)")
+        else:
+            print(f"Erreur lors du chargement de {result.source}: {result.error}")
+        results[result.source] = result.documents
+
     docs_list = []
-    if file_paths:
-        for file_path in file_paths:
-            if not os.path.exists(file_path):
-                print(f"Fichier non trouvé: {file_path}")
-                continue
-            
-            file_extension = Path(file_path).suffix.lower()
-            try:
-                if file_extension == '.pdf': loader = PyPDFLoader(file_path)
-                elif file_extension == '.txt': loader = TextLoader(file_path, encoding='utf-8')
-                elif file_extension in ['.docx', '.doc']: loader = Docx2txtLoader(file_path)
-                elif file_extension == '.csv': loader = CSVLoader(file_path)
-                elif file_extension in ['.xlsx', '.xls']: loader = UnstructuredExcelLoader(file_path)
-                else:
-                    print(f"Type de fichier non supporté: {file_extension}")
-                    continue
-                docs = loader.load()
-                docs_list.extend(docs)
-                print(f"Chargé {len(docs)} documents depuis {file_path}")
-            except Exception as e:
-                print(f"Erreur lors du chargement de {file_path}: {e}")
-    
-    if urls:
-        try:
-            web_docs = [WebBaseLoader(url).load() for url in urls]
-            for doc_list in web_docs:
-                docs_list.extend(doc_list)
-            print(f"Chargé {len(web_docs)} documents web")
-        except Exception as e:
-            print(f"Erreur lors du chargement web: {e}")
+    for source in list(file_paths or []) + list(urls or []):
+        docs_list.extend(results.get(source, []))
     return docs_list
 
-def split_documents_semantic(docs):
-    semantic_chunker = SemanticChunker(
-        embeddings=embeddings,
-        breakpoint_threshold_type="percentile",
-        breakpoint_threshold_amount=95,
-    )
-    doc_splits = semantic_chunker.split_documents(docs)
+def split_documents_with_embeddings(docs):
+    """
+    Découpe les documents et renvoie (chunks, embeddings) ; les embeddings sont None
+    lorsque le découpeur ne les fournit pas (ils seront alors calculés à l'indexation).
+    """
+    config = SEMANTIC_CHUNKER_CONFIG
+    if config["implementation"] == "langchain":
+        from langchain_experimental.text_splitter import SemanticChunker
+
+        semantic_chunker = SemanticChunker(
+            embeddings=get_embeddings(),
+            breakpoint_threshold_type=config["breakpoint_threshold_type"],
+            breakpoint_threshold_amount=config["breakpoint_threshold_amount"],
+            buffer_size=config["buffer_size"],
+        )
+        doc_splits, vectors = semantic_chunker.split_documents(docs), None
+    else:
+        from ingestion.chunker import FastSemanticChunker
+
+        semantic_chunker = FastSemanticChunker(
+            embeddings=get_embeddings(),
+            breakpoint_threshold_amount=config["breakpoint_threshold_amount"],
+            buffer_size=config["buffer_size"],
+            max_chunk_chars=config["max_chunk_chars"],
+        )
+        doc_splits, vectors = semantic_chunker.split_documents_with_embeddings(docs)
     print(f"Documents découpés en {len(doc_splits)} chunks sémantiques")
+    return doc_splits, vectors
+
+def split_documents_semantic(docs):
+    doc_splits, _ = split_documents_with_embeddings(docs)
     return doc_splits
 
-def create_advanced_retriever(doc_splits: List[Any], vectorstore: Chroma) -> ContextualCompressionRetriever:
-    """Crée un retriever avancé avec recherche hybride et reranking."""
-    vector_retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 10})
-    bm25_retriever = BM25Retriever.from_documents(doc_splits)
-    bm25_retriever.k = 10
-    
-    ensemble_retriever = EnsembleRetriever(
-        retrievers=[vector_retriever, bm25_retriever],
-        weights=[0.6, 0.4]
+def create_advanced_retriever(doc_splits: List[Any], vectorstore: "Chroma", search_filter: Optional[dict] = None,
+                              bm25_index: Optional[Any] = None,
+                              vector_index: Optional[Any] = None) -> "ContextualCompressionRetriever":
+    """
+    Crée un retriever avancé avec recherche hybride et reranking.
+    `search_filter` restreint la recherche (ex: aux sources d'un store partagé) ;
+    `doc_splits` doit contenir les mêmes chunks pour que BM25 soit cohérent.
+    `bm25_index` (index persistant du store) évite de reconstruire BM25 depuis `doc_splits`.
+    `vector_index` (index quantifié du store, s'il existe) remplace le HNSW de Chroma.
+    """
+    from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
+    from langchain.retrievers.document_compressors import DocumentCompressorPipeline
+
+    if bm25_index is None:
+        bm25_index = BM25Index.from_documents(doc_splits)
+    hybrid_retriever = HybridRetriever(
+        vectorstore=vectorstore,
+        bm25_index=bm25_index,
+        vector_k=RETRIEVER_CONFIG["vector_k"],
+        bm25_k=RETRIEVER_CONFIG["bm25_k"],
+        weights=RETRIEVER_CONFIG["weights"],
+        fusion=RETRIEVER_CONFIG["fusion"],
+        rrf_k=RETRIEVER_CONFIG["rrf_k"],
+        search_filter=search_filter,
+        vector_index=vector_index,
     )
     
-    reranker_model = HuggingFaceCrossEncoder(model_name="cross-encoder/ms-marco-MiniLM-L-6-v2")
-    compressor = CrossEncoderReranker(model=reranker_model, top_n=5) # <--- Re-ranke et garde le top 5
+    reranker_model = get_cross_encoder()  # partagé par tous les retrievers du processus
+    compressor = CachedCrossEncoderReranker(
+        model=reranker_model,
+        top_n=RETRIEVER_CONFIG["top_n"],  # <--- Re-ranke et garde le top 5
+        cascade_margin=RETRIEVER_CONFIG["rerank_cascade_margin"],
+    )
     
     pipeline_compressor = DocumentCompressorPipeline(transformers=[compressor])
     
     compression_retriever = ContextualCompressionRetriever(
         base_compressor=pipeline_compressor,
-        base_retriever=ensemble_retriever
+        base_retriever=hybrid_retriever
     )
     print("✅ Retriever avancé (hybride + reranker) créé.")
     return compression_retriever
 
-def create_retriever_from_files(uploaded_files: List[str]) -> Any:
+class CorpusIndex(NamedTuple):
+    """Ce que produit l'ingestion d'un corpus : le retriever, ses chunks et son routeur local."""
+    retriever: Any
+    doc_splits: List[Any]
+    router: Optional[Any] = None
+
+def build_local_router(vectorstore: "Chroma", where: Optional[dict] = None,
+                       vector_index: Optional[Any] = None) -> Optional[Any]:
+    """Construit le routeur local à partir des embeddings déjà stockés (None en cas d'échec)."""
+    from chains.local_router import LocalRouter
+
+    try:
+        return LocalRouter.from_vectorstore(vectorstore, where=where, vector_index=vector_index)
+    except Exception as e:
+        print(f"⚠️ Routeur local indisponible: {e}")
+        return None
+
+def build_retriever_from_files(uploaded_files: List[str]) -> CorpusIndex:
     """
-    Crée un retriever complet à partir d'une liste de chemins de fichiers.
-    C'est la fonction à appeler depuis l'interface Streamlit.
+    Comme create_retriever_from_files, mais renvoie aussi les chunks indexés et le routeur local.
+    Les fichiers sont ingérés dans le store persistant des uploads : un fichier déjà
+    vu (même contenu) n'est ni rechargé ni ré-embeddé.
     """
+    from ingestion.store import content_hash_filter, get_uploads_corpus
+
     if not uploaded_files:
         raise ValueError("Aucun fichier fourni pour créer le retriever.")
-        
-    documents = load_documents(file_paths=uploaded_files)
-    if not documents:
+
+    corpus = get_uploads_corpus()
+    content_hashes = corpus.sync_files(uploaded_files)
+    if not content_hashes:
         raise ValueError("Aucun document n'a pu être chargé à partir des fichiers fournis.")
-        
-    doc_splits = split_documents_semantic(documents)
-    
-    # Utiliser un vectorstore en mémoire pour les documents uploadés par session
-    vectorstore = Chroma.from_documents(documents=doc_splits, embedding=embeddings)
-    
-    print(f"Vector store de session créé avec {len(doc_splits)} chunks")
-    
-    return create_advanced_retriever(doc_splits, vectorstore)
 
-def initialize_default_retriever() -> Any:
+    search_filter = content_hash_filter(content_hashes)
+    doc_splits = corpus.documents(where=search_filter)
+    if not doc_splits:
+        raise ValueError("Aucun document n'a pu être chargé à partir des fichiers fournis.")
+
+    print(f"Vector store de session prêt avec {len(doc_splits)} chunks")
+
+    return CorpusIndex(
+        retriever=create_advanced_retriever(
+            doc_splits, corpus.vectorstore, search_filter=search_filter, bm25_index=corpus.bm25_index,
+            vector_index=corpus.vector_index,
+        ),
+        doc_splits=doc_splits,
+        router=build_local_router(corpus.vectorstore, where=search_filter, vector_index=corpus.vector_index),
+    )
+
+def create_retriever_from_files(uploaded_files: List[str]) -> Any:
+    """
+    Crée un retriever complet à partir d'une liste de chemins de fichiers.
+    Préférer ingestion.retriever_cache.retriever_registry depuis l'interface Streamlit,
+    qui ne reconstruit l'index que si le contenu ou la configuration change.
+    """
+    return build_retriever_from_files(uploaded_files).retriever
+
+def initialize_default_retriever(refresh: bool = False) -> Any:
     """
     Crée et renvoie le retriever par défaut basé sur des URLs prédéfinies.
-    Cette fonction est appelée une seule fois au démarrage du système.
+    Le store est persisté dans DEFAULT_STORE_DIR : au redémarrage, les pages déjà
+    indexées ne sont pas re-téléchargées (sauf `refresh=True`, et alors seules les
+    pages modifiées sont ré-embeddées).
     """
+    from ingestion.store import PersistentCorpus
+
     print("🚀 Initialisation du retriever par défaut...")
-    default_urls = [
-        "https://lilianweng.github.io/posts/2023-06-23-agent/",
-        "https://lilianweng.github.io/posts/2023-03-15-prompt-engineering/",
-        "https://lilianweng.github.io/posts/2023-10-25-adv-attack-llm/",
-    ]
-    documents = load_documents(urls=default_urls)
-    if not documents:
+    corpus = PersistentCorpus(DEFAULT_STORE_DIR)
+    corpus.sync_urls(DEFAULT_URLS, refresh=refresh, prune=True)
+    doc_splits = corpus.documents()
+    if not doc_splits:
         raise ConnectionError("Impossible de charger les documents par défaut. Vérifiez la connexion internet.")
-        
-    doc_splits = split_documents_semantic(documents)
-    
-    # Persister le vectorstore par défaut pour ne pas le reconstruire à chaque fois
-    vectorstore = Chroma.from_documents(
-        documents=doc_splits,
-        embedding=embeddings,
-        persist_directory="./default_chroma_db"
-    )
-    print(f"Vector store par défaut créé et persisté avec {len(doc_splits)} chunks")
-    
-    retriever = create_advanced_retriever(doc_splits, vectorstore)
+
+    print(f"Vector store par défaut prêt avec {len(doc_splits)} chunks")
+
+    retriever = create_advanced_retriever(doc_splits, corpus.vectorstore, bm25_index=corpus.bm25_index,
+                                          vector_index=corpus.vector_index)
     print("✅ Retriever par défaut initialisé avec succès !")
     return retriever
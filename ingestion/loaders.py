@@ -0,0 +1,201 @@
+# ingestion/loaders.py
+"""
+Chargement parallèle des sources (fichiers et URLs).
+
+Le parsing PDF/DOCX/XLSX est CPU-bound : il part dans un pool de processus. Les URLs
+(I/O réseau) et les formats texte légers partent dans un pool de threads. Chaque source
+a son propre timeout ; une source en échec (erreur, format non supporté, timeout) est
+signalée dans son LoadResult sans interrompre ni sérialiser les autres. Le timeout d'une
+source court à partir de son démarrage réel. Un pool de processus dont tous les workers
+sont bloqués sur des sources abandonnées est arrêté (shutdown) et remplacé par un pool
+neuf ; ses workers sont tués quand l'API publique le permet (Python 3.14+), sinon ils
+se terminent d'eux-mêmes. Les workers démarrent en forkserver (spawn à défaut) : un fork
+du processus serveur hériterait de ses threads et verrous (modèles, pools, Chroma).
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from langchain_community.document_loaders import (
+    CSVLoader,
+    Docx2txtLoader,
+    PyPDFLoader,
+    TextLoader,
+    UnstructuredExcelLoader,
+    WebBaseLoader,
+)
+
+LOAD_TIMEOUT = float(os.getenv("LOAD_TIMEOUT", "120"))
+LOAD_MAX_PROCESSES = int(os.getenv("LOAD_MAX_PROCESSES", str(max(1, min(4, (os.cpu_count() or 1))))))
+LOAD_MAX_THREADS = int(os.getenv("LOAD_MAX_THREADS", "8"))
+LOAD_START_METHOD = os.getenv(
+    "LOAD_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+_POLL_SECONDS = 0.05
+
+# Formats dont le parsing est coûteux en CPU (envoyés au pool de processus)
+CPU_BOUND_EXTENSIONS = {".pdf", ".docx", ".doc", ".xlsx", ".xls"}
+SUPPORTED_EXTENSIONS = CPU_BOUND_EXTENSIONS | {".txt", ".csv"}
+
+@dataclass
+class LoadResult:
+    source: str
+    documents: List[Any] = field(default_factory=list)
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+def load_file(file_path: str) -> List[Any]:
+    """Charge un fichier selon son extension (fonction de module : exécutable dans un sous-processus)."""
+    file_extension = Path(file_path).suffix.lower()
+    if file_extension == '.pdf': loader = PyPDFLoader(file_path)
+    elif file_extension == '.txt': loader = TextLoader(file_path, encoding='utf-8')
+    elif file_extension in ['.docx', '.doc']: loader = Docx2txtLoader(file_path)
+    elif file_extension == '.csv': loader = CSVLoader(file_path)
+    elif file_extension in ['.xlsx', '.xls']: loader = UnstructuredExcelLoader(file_path)
+    else:
+        raise ValueError(f"Type de fichier non supporté: {file_extension}")
+    return loader.load()
+
+def load_url(url: str, timeout: float = LOAD_TIMEOUT) -> List[Any]:
+    # Sans timeout de requête, une connexion muette bloque un thread du pool indéfiniment
+    return WebBaseLoader(url, requests_kwargs={"timeout": timeout}).load()
+
+def _timed(func: Callable[[str], List[Any]], source: str) -> Tuple[List[Any], float]:
+    start = time.perf_counter()
+    documents = func(source)
+    return documents, time.perf_counter() - start
+
+class _Pool:
+    """
+    Un pool de workers et sa file de sources. Une source en timeout continue d'occuper
+    son worker (un thread ne s'interrompt pas) jusqu'à ce qu'elle se termine vraiment :
+    sa place reste prise, pour que la source suivante ne patiente pas dans la file
+    interne de l'executor pendant que son propre timeout court.
+    """
+
+    def __init__(self, factory: Callable[[], Executor], jobs: List[Tuple[str, Callable]], workers: int,
+                 processes: bool):
+        self.factory = factory
+        self.executor = factory()
+        self.jobs = list(jobs)
+        self.workers = workers
+        self.processes = processes
+        self.running: Dict[Future, str] = {}
+        self.abandoned: Set[Future] = set()
+
+    def free_slots(self) -> int:
+        self.abandoned = {f for f in self.abandoned if not f.done()}
+        return self.workers - len(self.running) - len(self.abandoned)
+
+    def recycle_if_stuck(self) -> None:
+        """Pool de processus dont tous les workers sont bloqués : on l'arrête et on repart d'un pool neuf."""
+        if self.processes and self.jobs and not self.running and self.abandoned and self.free_slots() <= 0:
+            self.shutdown()
+            self.executor = self.factory()
+            self.abandoned.clear()
+
+    def shutdown(self) -> None:
+        """Arrête l'executor sans attendre les sources abandonnées."""
+        terminate_workers = getattr(self.executor, "terminate_workers", None)  # Python 3.14+
+        if self.processes and self.abandoned and terminate_workers is not None:
+            terminate_workers()
+        else:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_load_documents(
+    file_paths: Optional[List[str]] = None,
+    urls: Optional[List[str]] = None,
+    timeout: float = LOAD_TIMEOUT,
+    max_processes: int = LOAD_MAX_PROCESSES,
+    max_threads: int = LOAD_MAX_THREADS,
+) -> Iterator[LoadResult]:
+    """
+    Charge toutes les sources en parallèle et produit un LoadResult par source,
+    dans l'ordre où elles se terminent (les premières sources prêtes peuvent être
+    découpées / indexées pendant que les autres se chargent encore).
+    """
+    cpu_jobs: List[Tuple[str, Callable]] = []
+    io_jobs: List[Tuple[str, Callable]] = []
+    for file_path in file_paths or []:
+        if not os.path.exists(file_path):
+            yield LoadResult(file_path, error="Fichier non trouvé")
+            continue
+        extension = Path(file_path).suffix.lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            yield LoadResult(file_path, error=f"Type de fichier non supporté: {extension}")
+        elif extension in CPU_BOUND_EXTENSIONS:
+            cpu_jobs.append((file_path, load_file))
+        else:
+            io_jobs.append((file_path, load_file))
+    io_jobs.extend((url, partial(load_url, timeout=timeout)) for url in urls or [])
+
+    # Un seul fichier lourd ne justifie pas le coût de démarrage d'un pool de processus
+    if len(cpu_jobs) <= 1:
+        io_jobs = cpu_jobs + io_jobs
+        cpu_jobs = []
+
+    pools: List[_Pool] = []
+    if cpu_jobs:
+        pools.append(_Pool(partial(ProcessPoolExecutor, max_workers=max_processes,
+                                   mp_context=multiprocessing.get_context(LOAD_START_METHOD)),
+                           cpu_jobs, max_processes, processes=True))
+    if io_jobs:
+        pools.append(_Pool(partial(ThreadPoolExecutor, max_workers=max_threads, thread_name_prefix="loader"),
+                           io_jobs, max_threads, processes=False))
+
+    # On ne soumet pas plus de tâches que de workers libres, et le timeout d'une source
+    # court à partir du moment où un worker la prend (Future.running()), pas de sa soumission.
+    started: Dict[Future, float] = {}
+
+    def _submit_ready() -> None:
+        for pool in pools:
+            pool.recycle_if_stuck()
+            while pool.jobs and pool.free_slots() > 0:
+                source, func = pool.jobs.pop(0)
+                pool.running[pool.executor.submit(_timed, func, source)] = source
+
+    try:
+        _submit_ready()
+        while any(pool.running or pool.jobs for pool in pools):
+            now = time.monotonic()
+            running = [f for pool in pools for f in pool.running]
+            for future in running:
+                if future not in started and (future.running() or future.done()):
+                    started[future] = now
+            deadlines = [started[f] + timeout for f in running if f in started]
+            wait_for = min(deadlines) - now if deadlines else timeout
+            if len(deadlines) < len(running):
+                wait_for = min(wait_for, _POLL_SECONDS)  # démarrages à surveiller
+            abandoned = [f for pool in pools for f in pool.abandoned]
+            wait(running + abandoned, timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+            now = time.monotonic()
+            for pool in pools:
+                for future, source in list(pool.running.items()):
+                    if future.done():
+                        del pool.running[future]
+                        started.pop(future, None)
+                        try:
+                            documents, seconds = future.result()
+                            yield LoadResult(source, documents=documents, seconds=seconds)
+                        except Exception as e:
+                            yield LoadResult(source, error=str(e) or type(e).__name__)
+                    elif future in started and now - started[future] >= timeout:
+                        del pool.running[future]
+                        del started[future]
+                        pool.abandoned.add(future)
+                        yield LoadResult(source, error=f"Timeout après {timeout:.0f}s", seconds=timeout)
+            _submit_ready()
+    finally:
+        for pool in pools:
+            # Les tâches abandonnées ne bloquent pas l'appelant
+            pool.free_slots()
+            pool.shutdown()
@@ -0,0 +1,211 @@
+# ingestion/models.py
+"""
+Registre des modèles locaux (embeddings, cross-encoder) partagé par tout le processus.
+
+Chaque modèle est chargé paresseusement, une seule fois, au premier usage (ou par
+`warmup()` au démarrage), puis partagé entre sessions et retrievers. Le chargement
+est protégé par un verrou par modèle : deux threads qui demandent le même modèle
+en même temps n'en chargent qu'un exemplaire.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from concurrency import MicroBatcher
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+MODEL_DEVICE = os.getenv("MODEL_DEVICE", "cpu")
+MODEL_NUM_THREADS = int(os.getenv("MODEL_NUM_THREADS", "0"))  # 0 = valeur par défaut de torch
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "32"))
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "512"))  # tokens (requête + chunk), au-delà : troncature
+
+# Regroupement des appels concurrents (mode batch, cf. ModelRegistry.enable_micro_batching)
+MICRO_BATCH_WAIT_MS = float(os.getenv("MICRO_BATCH_WAIT_MS", "5"))
+
+EMBEDDINGS = "embeddings"
+CROSS_ENCODER = "cross_encoder"
+
+def _module_bytes(module: Any) -> int:
+    """Taille des paramètres d'un module torch (0 si non applicable)."""
+    try:
+        return sum(p.numel() * p.element_size() for p in module.parameters())
+    except Exception:
+        return 0
+
+class BatchedEmbeddings(Embeddings):
+    """
+    Enveloppe d'un modèle d'embeddings : les `embed_query` lancés en même temps par
+    plusieurs threads (une question chacun) sont regroupés en un seul `embed_documents`.
+    """
+
+    def __init__(self, base: Any, max_batch: int = EMBEDDING_BATCH_SIZE, max_wait: float = MICRO_BATCH_WAIT_MS / 1000):
+        self.base = base
+        self.batcher = MicroBatcher(base.embed_documents, max_batch=max_batch, max_wait=max_wait)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.batcher.submit([text])[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+class BatchedCrossEncoder:
+    """
+    Enveloppe d'un cross-encoder : les paires (question, chunk) de plusieurs reranks
+    concurrents sont notées en un seul passage du modèle.
+    """
+
+    def __init__(self, base: Any, max_batch: int = 4 * RERANKER_BATCH_SIZE,
+                 max_wait: float = MICRO_BATCH_WAIT_MS / 1000, batch_size: int = RERANKER_BATCH_SIZE):
+        self.base = base
+        self.model_name = getattr(base, "model_name", type(base).__name__)  # clé du cache de scores inchangée
+        self.batch_size = batch_size
+        self.batcher = MicroBatcher(self._score, max_batch=max_batch, max_wait=max_wait)
+
+    def _score(self, pairs: List[Tuple[str, str]]) -> List[Any]:
+        client = getattr(self.base, "client", None)
+        if client is not None and hasattr(client, "predict"):
+            return list(client.predict(pairs, batch_size=self.batch_size, show_progress_bar=False))
+        return list(self.base.score(pairs))
+
+    def score(self, pairs: Sequence[Tuple[str, str]]) -> List[Any]:
+        return self.batcher.submit(pairs)
+
+class ModelRegistry:
+    def __init__(self, device: str = MODEL_DEVICE, num_threads: int = MODEL_NUM_THREADS,
+                 embedding_batch_size: int = EMBEDDING_BATCH_SIZE, reranker_batch_size: int = RERANKER_BATCH_SIZE):
+        self.device = device
+        self.num_threads = num_threads
+        self.embedding_batch_size = embedding_batch_size
+        self.reranker_batch_size = reranker_batch_size
+        self._models: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._threads_configured = False
+        self._loaders: Dict[str, Callable[[], Any]] = {
+            EMBEDDINGS: self._load_embeddings,
+            CROSS_ENCODER: self._load_cross_encoder,
+        }
+
+    # --- Chargeurs ---
+    def _configure_threads(self) -> None:
+        if self._threads_configured or self.num_threads <= 0:
+            return
+        import torch
+        torch.set_num_threads(self.num_threads)
+        self._threads_configured = True
+
+    def _load_embeddings(self) -> Any:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL_NAME,
+            model_kwargs={"device": self.device},
+            encode_kwargs={"batch_size": self.embedding_batch_size},
+        )
+
+    def _load_cross_encoder(self) -> Any:
+        from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+        return HuggingFaceCrossEncoder(
+            model_name=RERANKER_MODEL_NAME,
+            model_kwargs={"device": self.device, "max_length": RERANKER_MAX_LENGTH},
+        )
+
+    # --- Accès ---
+    def get(self, name: str) -> Any:
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            model = self._models.get(name)
+            if model is None:
+                model = self._load(name)
+        return model
+
+    def _load(self, name: str) -> Any:
+        self._configure_threads()
+        print(f"⏳ Chargement du modèle {name} ({self.device})...")
+        start = time.perf_counter()
+        model = self._loaders[name]()
+        elapsed = time.perf_counter() - start
+        self._models[name] = model
+        self._stats[name] = {
+            "load_seconds": round(elapsed, 3),
+            "memory_bytes": _module_bytes(getattr(model, "client", None)),
+            "device": self.device,
+        }
+        print(f"✅ Modèle {name} chargé en {elapsed:.2f}s")
+        return model
+
+    def embeddings(self) -> Any:
+        return self.get(EMBEDDINGS)
+
+    def cross_encoder(self) -> Any:
+        return self.get(CROSS_ENCODER)
+
+    def register(self, name: str, model: Any) -> None:
+        """Installe un modèle déjà construit (ex: un modèle factice pour les tests et benchmarks)."""
+        with self._lock:
+            self._models[name] = model
+            self._stats[name] = {"load_seconds": 0.0, "memory_bytes": 0, "device": "registered"}
+
+    def enable_micro_batching(self, max_wait_ms: float = MICRO_BATCH_WAIT_MS) -> Dict[str, Any]:
+        """
+        Charge les modèles et les remplace par leurs enveloppes à regroupement d'appels
+        (utile quand beaucoup de questions tournent en parallèle, cf. batch_qa.py).
+        À appeler avant de construire les retrievers : ils capturent le modèle à leur création.
+        Renvoie les enveloppes par nom, pour lire leurs statistiques.
+        """
+        wrappers = {
+            EMBEDDINGS: lambda model: BatchedEmbeddings(model, max_wait=max_wait_ms / 1000),
+            CROSS_ENCODER: lambda model: BatchedCrossEncoder(model, max_wait=max_wait_ms / 1000),
+        }
+        batched: Dict[str, Any] = {}
+        for name, wrap in wrappers.items():
+            model = self.get(name)
+            if not isinstance(model, (BatchedEmbeddings, BatchedCrossEncoder)):
+                model = wrap(model)
+                with self._lock:
+                    self._models[name] = model
+            batched[name] = model
+        return batched
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def warmup(self, names: Optional[Iterable[str]] = None, background: bool = False) -> Optional[threading.Thread]:
+        """Charge les modèles à l'avance (dans un thread si `background=True`)."""
+        names = list(names or self._loaders)
+
+        def _warm():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"⚠️ Préchargement de {name} impossible: {e}")
+
+        if not background:
+            _warm()
+            return None
+        thread = threading.Thread(target=_warm, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(stats) for name, stats in self._stats.items()}
+
+# --- Singleton partagé par tout le processus ---
+model_registry = ModelRegistry()
+
+def get_embeddings() -> Any:
+    return model_registry.embeddings()
+
+def get_cross_encoder() -> Any:
+    return model_registry.cross_encoder()
@@ -0,0 +1,235 @@
+# ingestion/pipeline.py
+"""
+Pipeline d'ingestion en flux : chargement → découpage → embedding → indexation.
+
+Les étapes (chargement, découpage, embedding + écriture) tournent dans des threads
+distincts reliés par des files bornées : les chunks des premières sources sont
+embeddés (par lots de taille fixe) et écrits dans Chroma pendant que les sources suivantes sont encore en cours de parsing. Un document
+n'est gardé en mémoire que le temps de traverser le pipeline, si bien que l'empreinte
+mémoire reste plate quelle que soit la taille de l'upload.
+"""
+import hashlib
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.documents import Document
+
+from ingestion.loaders import iter_load_documents
+from ingestion.models import get_embeddings
+from ingestion.vector_index import PLACEHOLDER_EMBEDDING
+
+PIPELINE_EMBED_BATCH_SIZE = int(os.getenv("PIPELINE_EMBED_BATCH_SIZE", "64"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_END = object()
+
+@dataclass
+class _SourceDone:
+    """Marqueur placé dans la file des chunks après le dernier chunk d'une source."""
+    source: str
+    chunk_ids: List[str]
+
+@dataclass
+class PipelineStats:
+    sources: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    documents: int = 0
+    chunks: int = 0
+    embedded: int = 0  # chunks passés par le modèle à l'indexation (hors vecteurs réutilisés)
+    batches: int = 0
+    seconds: float = 0.0
+
+class _Stopped(Exception):
+    pass
+
+class IngestionPipeline:
+    """
+    `chunk_fn(documents)` renvoie les chunks, ou un tuple (chunks, embeddings) quand le
+    découpeur a déjà les vecteurs : ces chunks ne repassent pas par le modèle.
+    `should_index(source, documents)` est appelé avant le découpage (qui embedde chaque
+    phrase) : s'il renvoie False, la source est ignorée sans être découpée.
+    `prepare_chunks(source, documents, chunks)` renvoie les chunks à indexer (avec
+    `metadata["chunk_id"]`, utilisé comme id Chroma) ou une liste vide pour ignorer la
+    source ; `on_source_indexed(source, chunk_ids)` est appelé quand tous les chunks
+    d'une source sont écrits. Avec un `vector_index` (QuantizedVectorIndex), les vecteurs
+    vont dans cet index et Chroma ne reçoit que le texte, les métadonnées et un embedding factice.
+    """
+
+    def __init__(
+        self,
+        vectorstore: Any,
+        chunk_fn: Optional[Callable[[List[Document]], List[Document]]] = None,
+        should_index: Optional[Callable[[str, List[Document]], bool]] = None,
+        prepare_chunks: Optional[Callable[[str, List[Document], List[Document]], List[Document]]] = None,
+        on_source_indexed: Optional[Callable[[str, List[str]], None]] = None,
+        embeddings: Optional[Any] = None,
+        vector_index: Optional[Any] = None,
+        batch_size: int = PIPELINE_EMBED_BATCH_SIZE,
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+    ):
+        if chunk_fn is None:
+            from ingestion.ingestion import split_documents_with_embeddings
+            chunk_fn = split_documents_with_embeddings
+        self.vectorstore = vectorstore
+        self.chunk_fn = chunk_fn
+        self.should_index = should_index
+        self.prepare_chunks = prepare_chunks or self._default_prepare
+        self.on_source_indexed = on_source_indexed
+        self.embeddings = embeddings
+        self.vector_index = vector_index
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    @staticmethod
+    def _default_prepare(source: str, documents: List[Document], chunks: List[Document]) -> List[Document]:
+        for i, chunk in enumerate(chunks):
+            # hash() est salé par processus : les ids doivent rester stables d'un run à l'autre
+            chunk.metadata.setdefault("chunk_id", f"{hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]}-{i}")
+        return chunks
+
+    def run(self, file_paths: Optional[List[str]] = None, urls: Optional[List[str]] = None) -> PipelineStats:
+        stats = PipelineStats()
+        start = time.perf_counter()
+        loaded: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        chunked: "queue.Queue" = queue.Queue(maxsize=self.queue_size * self.batch_size)
+        stop = threading.Event()
+        errors: List[BaseException] = []
+
+        def put(q: "queue.Queue", item: Any) -> None:
+            while True:
+                if stop.is_set():
+                    raise _Stopped()
+                try:
+                    q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def take(q: "queue.Queue") -> Any:
+            while True:
+                if stop.is_set():
+                    raise _Stopped()
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+        def guarded(stage: Callable[[], None], downstream: Optional["queue.Queue"]) -> Callable[[], None]:
+            def _run() -> None:
+                try:
+                    stage()
+                except _Stopped:
+                    return
+                except BaseException as e:  # une erreur d'étape arrête tout le pipeline
+                    errors.append(e)
+                    stop.set()
+                    return
+                if downstream is not None:
+                    try:
+                        put(downstream, _END)
+                    except _Stopped:
+                        pass
+            return _run
+
+        def load_stage() -> None:
+            for result in iter_load_documents(file_paths=file_paths, urls=urls):
+                stats.sources += 1
+                if not result.ok:
+                    stats.failed[result.source] = result.error
+                    print(f"Erreur lors du chargement de {result.source}: {result.error}")
+                    continue
+                stats.documents += len(result.documents)
+                put(loaded, result)
+
+        def chunk_stage() -> None:
+            while True:
+                result = take(loaded)
+                if result is _END:
+                    return
+                try:
+                    if self.should_index is not None and not self.should_index(result.source, result.documents):
+                        continue
+                    output = self.chunk_fn(result.documents)
+                    chunks, vectors = output if isinstance(output, tuple) else (output, None)
+                    chunks = self.prepare_chunks(result.source, result.documents, chunks)
+                except Exception as e:
+                    stats.failed[result.source] = str(e)
+                    print(f"Erreur lors du découpage de {result.source}: {e}")
+                    continue
+                stats.chunks += len(chunks)
+                for i, chunk in enumerate(chunks):
+                    put(chunked, (chunk, vectors[i] if vectors is not None else None))
+                put(chunked, _SourceDone(result.source, [c.metadata["chunk_id"] for c in chunks]))
+
+        def index_stage() -> None:
+            embeddings = self.embeddings or get_embeddings()
+            batch: List[Any] = []  # (chunk, embedding précalculé ou None)
+            waiting: List[_SourceDone] = []
+
+            def flush() -> None:
+                if batch:
+                    missing = [i for i, (_, vector) in enumerate(batch) if vector is None]
+                    vectors = [vector for _, vector in batch]
+                    if missing:
+                        computed = embeddings.embed_documents([batch[i][0].page_content for i in missing])
+                        for i, vector in zip(missing, computed):
+                            vectors[i] = vector
+                        stats.embedded += len(missing)
+                        stats.batches += 1
+                    self._write([chunk for chunk, _ in batch], vectors)
+                    batch.clear()
+                for done in waiting:
+                    if self.on_source_indexed:
+                        self.on_source_indexed(done.source, done.chunk_ids)
+                waiting.clear()
+
+            while True:
+                item = take(chunked)
+                if item is _END:
+                    flush()
+                    return
+                if isinstance(item, _SourceDone):
+                    waiting.append(item)
+                    if not batch:
+                        flush()
+                    continue
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    flush()
+
+        threads = [
+            threading.Thread(target=guarded(load_stage, loaded), name="ingest-load", daemon=True),
+            threading.Thread(target=guarded(chunk_stage, chunked), name="ingest-chunk", daemon=True),
+            threading.Thread(target=guarded(index_stage, None), name="ingest-index", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats.seconds = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        print(
+            f"📥 Pipeline: {stats.sources} source(s), {stats.chunks} chunks, "
+            f"{stats.batches} lot(s) d'embeddings en {stats.seconds:.1f}s"
+        )
+        return stats
+
+    def _write(self, chunks: List[Document], vectors: List[List[float]]) -> None:
+        """Écrit un lot avec ses embeddings déjà calculés (pas de second passage du modèle)."""
+        ids = [c.metadata["chunk_id"] for c in chunks]
+        if self.vector_index is not None:
+            self.vector_index.add(ids, vectors, [c.metadata for c in chunks])
+            stored = [PLACEHOLDER_EMBEDDING] * len(chunks)
+        else:
+            stored = [list(map(float, v)) for v in vectors]
+        self.vectorstore._collection.upsert(
+            ids=ids,
+            embeddings=stored,
+            documents=[c.page_content for c in chunks],
+            metadatas=[c.metadata for c in chunks],
+        )
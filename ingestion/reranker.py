@@ -0,0 +1,157 @@
+# ingestion/reranker.py
+"""
+Reranking cross-encoder par lots, avec cache et coupure anticipée.
+
+Remplace CrossEncoderReranker, qui re-score à chaque appel tous les candidats de la
+recherche hybride (y compris après une reformulation qui ramène presque les mêmes
+chunks). Ici :
+- les scores sont mis en cache (LRU partagé par le processus) par (modèle, requête,
+  chunk_id) : seuls les couples jamais vus passent par le modèle ;
+- les couples restants sont scorés en un seul appel, par lots de `batch_size`, avec
+  des chunks tronqués à `max_chars` (la longueur en tokens est bornée par
+  RERANKER_MAX_LENGTH au chargement du modèle, cf. ingestion/models.py) ;
+- cascade optionnelle : si les scores de fusion de la première étape séparent déjà
+  nettement le top_n du reste (marge relative >= `cascade_margin`), le cross-encoder
+  n'est pas appelé.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from pydantic import ConfigDict
+
+from ingestion.hybrid import chunk_key
+from instrumentation import record_cache
+from ingestion.models import RERANKER_BATCH_SIZE
+
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+RERANKER_MAX_CHARS = int(os.getenv("RERANKER_MAX_CHARS", "2000"))
+# 0 = cascade désactivée (le cross-encoder départage toujours)
+RERANKER_CASCADE_MARGIN = float(os.getenv("RERANKER_CASCADE_MARGIN", "0"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+class RerankScoreCache:
+    """LRU thread-safe {(modèle, requête, chunk) -> score}."""
+
+    def __init__(self, max_entries: int = RERANK_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: List[Tuple[str, str, str]]) -> List[Optional[float]]:
+        with self._lock:
+            found = []
+            for key in keys:
+                score = self._scores.get(key)
+                if score is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self._scores.move_to_end(key)
+                found.append(score)
+            return found
+
+    def put_many(self, items: List[Tuple[Tuple[str, str, str], float]]) -> None:
+        with self._lock:
+            for key, score in items:
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"entries": len(self._scores), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+# --- Singleton partagé par tous les retrievers du processus ---
+rerank_cache = RerankScoreCache()
+
+class CachedCrossEncoderReranker(BaseDocumentCompressor):
+    """Reranker cross-encoder avec cache de scores, lots configurables et cascade."""
+
+    model: Any
+    top_n: int = 5
+    batch_size: int = RERANKER_BATCH_SIZE
+    max_chars: int = RERANKER_MAX_CHARS
+    cascade_margin: float = RERANKER_CASCADE_MARGIN
+    cache: Optional[Any] = rerank_cache
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    def _model_id(self) -> str:
+        return str(getattr(self.model, "model_name", type(self.model).__name__))
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        client = getattr(self.model, "client", None)
+        if client is not None and hasattr(client, "predict"):
+            scores = np.asarray(client.predict(pairs, batch_size=self.batch_size, show_progress_bar=False))
+        else:
+            scores = np.asarray(list(self.model.score(pairs)))
+        # Certains modèles renvoient (non pertinent, pertinent) : on garde la seconde colonne
+        if scores.ndim > 1:
+            scores = scores[:, 1] if scores.shape[1] > 1 else scores[:, 0]
+        return [float(s) for s in scores]
+
+    def _cascade(self, documents: Sequence[Document]) -> Optional[List[Document]]:
+        """Le top_n par score de fusion, s'il se détache nettement du candidat suivant."""
+        if self.cascade_margin <= 0:
+            return None
+        if any("fusion_score" not in d.metadata for d in documents):
+            return None
+        ranked = sorted(documents, key=lambda d: d.metadata["fusion_score"], reverse=True)
+        if len(ranked) > self.top_n:
+            last_kept = ranked[self.top_n - 1].metadata["fusion_score"]
+            first_dropped = ranked[self.top_n].metadata["fusion_score"]
+            if last_kept <= 0 or (last_kept - first_dropped) / last_kept < self.cascade_margin:
+                return None
+        return ranked[: self.top_n]
+
+    def score(self, query: str, documents: Sequence[Document]) -> List[float]:
+        """Scores cross-encoder des documents pour la requête (cache d'abord, modèle pour le reste)."""
+        normalized_query = _WHITESPACE.sub(" ", query).strip()
+        model_id = self._model_id()
+        keys = [(model_id, normalized_query, chunk_key(d)) for d in documents]
+        scores = self.cache.get_many(keys) if self.cache is not None else [None] * len(keys)
+        missing = [i for i, s in enumerate(scores) if s is None]
+        if self.cache is not None:
+            record_cache("rerank", hits=len(keys) - len(missing), misses=len(missing))
+        if missing:
+            pairs = [(query, documents[i].page_content[: self.max_chars]) for i in missing]
+            computed = self._predict(pairs)
+            for i, score in zip(missing, computed):
+                scores[i] = score
+            if self.cache is not None:
+                self.cache.put_many([(keys[i], scores[i]) for i in missing])
+        return scores
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+        shortcut = self._cascade(documents)
+        if shortcut is not None:
+            print(f"⏭️ Reranking évité : le top {self.top_n} de la fusion est déjà net")
+            return shortcut
+        scores = self.score(query, documents)
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[: self.top_n]
+        return [
+            Document(page_content=documents[i].page_content, metadata={**documents[i].metadata, "rerank_score": scores[i]})
+            for i in order
+        ]
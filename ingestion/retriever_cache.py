@@ -0,0 +1,169 @@
+# ingestion/retriever_cache.py
+"""
+Registre de retrievers adressé par contenu.
+
+La clé d'un retriever est un hash du contenu des fichiers + de la configuration
+de découpage / d'embedding : deux uploads identiques réutilisent le même index,
+et un changement de configuration invalide automatiquement les anciennes entrées.
+
+Les entrées sont des vues filtrées du store partagé des uploads (ingestion.store) :
+chunks, vecteurs et BM25 y sont stockés une seule fois, quel que soit le nombre
+d'entrées. Une entrée ne possède que son retriever et son routeur local ; le cache
+est donc borné en nombre d'entrées et en durée (TTL), pas en octets.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ingestion.ingestion import CorpusIndex, build_retriever_from_files, hash_file, ingestion_config
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("RETRIEVER_CACHE_MAX_ENTRIES", "8"))
+DEFAULT_TTL_SECONDS = float(os.getenv("RETRIEVER_CACHE_TTL", "3600"))
+
+def corpus_fingerprint(file_paths: List[str], config: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Empreinte d'un corpus : hash des contenus (indépendant des noms et de l'ordre)
+    combiné avec la configuration d'ingestion.
+    """
+    config = ingestion_config() if config is None else config
+    digest = hashlib.sha256()
+    for content_hash in sorted(hash_file(p) for p in file_paths if os.path.exists(p)):
+        digest.update(content_hash.encode())
+    digest.update(json.dumps(config, sort_keys=True).encode())
+    return digest.hexdigest()
+
+@dataclass
+class _Entry:
+    retriever: Any
+    router: Optional[Any] = None
+    created_at: float = field(default_factory=time.monotonic)
+    last_access: float = field(default_factory=time.monotonic)
+
+class RetrieverRegistry:
+    """
+    Cache LRU de retrievers avec expiration (TTL).
+
+    Thread-safe : deux sessions qui demandent le même corpus en même temps
+    ne déclenchent qu'une seule construction.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        builder: Callable[[List[str]], CorpusIndex] = build_retriever_from_files,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._builder = builder
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Renvoie le retriever associé à `key`, ou None s'il a été évincé / a expiré."""
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end(key)
+            return entry.retriever
+
+    def get_or_create(self, file_paths: List[str]) -> Tuple[str, Any]:
+        """
+        Renvoie (clé, retriever) pour ces fichiers, en ne construisant l'index
+        que si aucun corpus identique n'est déjà en cache.
+        """
+        key = corpus_fingerprint(file_paths)
+        retriever = self.get(key)
+        if retriever is not None:
+            self._count(hit=True)
+            return key, retriever
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        try:
+            with build_lock:
+                # Une autre session a pu construire l'index pendant qu'on attendait.
+                retriever = self.get(key)
+                if retriever is not None:
+                    self._count(hit=True)
+                    return key, retriever
+                self._count(hit=False)
+                index = self._builder(file_paths)
+                retriever = index.retriever
+                self.put(key, retriever, router=index.router)
+        finally:
+            # Aussi en cas d'échec de construction : pas de verrou orphelin pour cette clé
+            with self._lock:
+                self._build_locks.pop(key, None)
+        return key, retriever
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def router(self, key: str) -> Optional[Any]:
+        """Routeur local construit avec le corpus `key` (None si absent)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.router if entry is not None else None
+
+    def put(self, key: str, retriever: Any, router: Optional[Any] = None) -> None:
+        with self._lock:
+            self._entries[key] = _Entry(retriever=retriever, router=router)
+            self._entries.move_to_end(key)
+            self._evict_expired()
+            self._evict_over_capacity(keep=key)
+
+    def evict(self, key: str) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    # --- Éviction (appelée sous self._lock) ---
+    def _evict_expired(self) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        now = time.monotonic()
+        expired = [k for k, e in self._entries.items() if now - e.last_access > self.ttl_seconds]
+        for k in expired:
+            del self._entries[k]
+            self.evictions += 1
+
+    def _evict_over_capacity(self, keep: str) -> None:
+        # L'entrée qui vient d'être insérée n'est jamais évincée par sa propre insertion.
+        while len(self._entries) > self.max_entries and len(self._entries) > 1:
+            oldest = next(k for k in self._entries if k != keep)
+            del self._entries[oldest]
+            self.evictions += 1
+            print(f"♻️ Retriever évincé du cache: {oldest[:12]}")
+
+# --- Singleton partagé par toutes les sessions du processus ---
+retriever_registry = RetrieverRegistry()
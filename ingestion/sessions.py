@@ -0,0 +1,168 @@
+# ingestion/sessions.py
+"""
+Corpus de session multi-tenant dans le store partagé des uploads.
+
+Toutes les sessions écrivent dans la même collection Chroma persistante
+(ingestion/store.py) : un fichier uploadé par plusieurs utilisateurs n'est embeddé
+et stocké qu'une fois (dédupliqué par hash de contenu). Ce module tient la table
+session -> hashes de contenu (SQLite, à côté du store), qui protège les sources
+encore utilisées, et un ramasse-miettes en arrière-plan : les sessions
+inactives depuis `ttl_seconds` sont oubliées, et les sources qu'aucune session
+vivante ne référence plus (et ingérées depuis plus longtemps que le TTL) sont
+retirées de la collection et de l'index BM25. Le filtre de recherche, lui, est
+dérivé des fichiers du corpus (ingestion.build_retriever_from_files) : les
+retrievers sont partagés entre les sessions qui uploadent le même contenu.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from ingestion.ingestion import hash_file
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+SESSION_GC_INTERVAL = float(os.getenv("SESSION_GC_INTERVAL", "600"))
+SESSIONS_FILENAME = "sessions.sqlite3"
+
+class SessionRegistry:
+    """Table {session_id: hashes de contenu} + GC des sessions et sources expirées."""
+
+    def __init__(self, corpus: Any, ttl_seconds: float = SESSION_TTL, path: Optional[str] = None,
+                 on_sources_removed: Optional[Callable[[List[str]], None]] = None):
+        self.corpus = corpus
+        self.ttl_seconds = ttl_seconds
+        self.on_sources_removed = on_sources_removed
+        self.path = path or os.path.join(corpus.persist_directory, SESSIONS_FILENAME)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, tenant_id TEXT, last_seen REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_sources ("
+            "session_id TEXT NOT NULL, content_hash TEXT NOT NULL, PRIMARY KEY (session_id, content_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_session_sources_hash ON session_sources (content_hash)")
+        self._conn.commit()
+        self._stop = threading.Event()
+        self._gc_thread: Optional[threading.Thread] = None
+
+    # --- Sessions ---
+    def attach(self, session_id: str, file_paths: Iterable[str], tenant_id: Optional[str] = None,
+               replace: bool = True) -> List[str]:
+        """
+        Associe les fichiers (par hash de contenu) à la session et renvoie ces hashes.
+        Avec `replace=True`, les fichiers précédemment associés à la session sont détachés.
+        À appeler avant l'ingestion : une source référencée n'est jamais collectée.
+        """
+        content_hashes = sorted({hash_file(p) for p in file_paths if os.path.exists(p)})
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, tenant_id, last_seen) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen, "
+                "tenant_id = COALESCE(excluded.tenant_id, sessions.tenant_id)",
+                (session_id, tenant_id, time.time()),
+            )
+            if replace:
+                self._conn.execute("DELETE FROM session_sources WHERE session_id = ?", (session_id,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO session_sources (session_id, content_hash) VALUES (?, ?)",
+                [(session_id, h) for h in content_hashes],
+            )
+            self._conn.commit()
+        return content_hashes
+
+    def touch(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET last_seen = ? WHERE session_id = ?", (time.time(), session_id))
+            self._conn.commit()
+
+    def content_hashes(self, session_id: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT content_hash FROM session_sources WHERE session_id = ? ORDER BY content_hash", (session_id,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def end(self, session_id: str) -> None:
+        """Oublie la session tout de suite ; ses sources seront collectées si plus personne ne les référence."""
+        with self._lock:
+            self._conn.execute("DELETE FROM session_sources WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    # --- Ramasse-miettes ---
+    def collect_garbage(self) -> Dict[str, int]:
+        """Supprime les sessions expirées puis les sources orphelines du store partagé."""
+        now = time.time()
+        cutoff = now - self.ttl_seconds
+        # Tout se fait sous le verrou : un attach() concurrent voit soit la source encore
+        # présente et référencée, soit déjà retirée (et alors ré-ingérée par sync_files).
+        with self._lock:
+            expired = [r[0] for r in self._conn.execute("SELECT session_id FROM sessions WHERE last_seen < ?", (cutoff,))]
+            self._conn.executemany("DELETE FROM session_sources WHERE session_id = ?", [(s,) for s in expired])
+            self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(s,) for s in expired])
+            self._conn.commit()
+            referenced = {r[0] for r in self._conn.execute("SELECT DISTINCT content_hash FROM session_sources")}
+            # Délai de grâce : une source ingérée récemment (sans session, ex. via l'API) est gardée
+            orphans = [
+                source_id for source_id, entry in self.corpus.active_sources().items()
+                if entry["content_hash"] not in referenced and entry.get("ingested_at", now) < cutoff
+            ]
+            if orphans:
+                self.corpus.remove_sources(orphans)
+        if orphans and self.on_sources_removed is not None:
+            self.on_sources_removed(orphans)
+        stats = {"expired_sessions": len(expired), "removed_sources": len(orphans)}
+        if expired or orphans:
+            print(f"🧹 GC des sessions: {stats}")
+        return stats
+
+    def start_gc(self, interval_seconds: float = SESSION_GC_INTERVAL) -> threading.Thread:
+        """Lance le GC périodique dans un thread démon (idempotent)."""
+        if self._gc_thread is not None and self._gc_thread.is_alive():
+            return self._gc_thread
+
+        def _loop() -> None:
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.collect_garbage()
+                except Exception as e:
+                    print(f"⚠️ GC des sessions en échec: {e}")
+
+        self._stop.clear()
+        self._gc_thread = threading.Thread(target=_loop, name="session-gc", daemon=True)
+        self._gc_thread.start()
+        return self._gc_thread
+
+    def stop_gc(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            sources = self._conn.execute("SELECT COUNT(DISTINCT content_hash) FROM session_sources").fetchone()[0]
+        return {"sessions": sessions, "referenced_sources": sources,
+                "stored_sources": len(self.corpus.active_sources())}
+
+_session_registry: Optional[SessionRegistry] = None
+_session_lock = threading.Lock()
+
+def get_session_registry(start_gc: bool = True) -> SessionRegistry:
+    """Registre des sessions du store des uploads (un par processus, GC démarré au premier appel)."""
+    global _session_registry
+    from ingestion.store import get_uploads_corpus
+
+    with _session_lock:
+        if _session_registry is None:
+            from ingestion.retriever_cache import retriever_registry
+
+            # Les retrievers en cache peuvent pointer vers des sources collectées
+            _session_registry = SessionRegistry(
+                get_uploads_corpus(), on_sources_removed=lambda _: retriever_registry.clear()
+            )
+            if start_gc:
+                _session_registry.start_gc()
+        return _session_registry
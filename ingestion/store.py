@@ -0,0 +1,323 @@
+# ingestion/store.py
+"""
+Store persistant de chunks / embeddings avec ré-ingestion incrémentale.
+
+Chaque store est un répertoire contenant la collection Chroma (chunks + embeddings),
+l'index BM25 des mêmes chunks (ingestion/bm25_index.py), éventuellement un index vectoriel
+quantifié (ingestion/vector_index.py, qui garde alors seul les vecteurs) et un manifeste
+JSON qui, pour chaque source (fichier ou URL), enregistre le hash de son contenu et les
+ids des chunks qui en sont issus. Au redémarrage ou lors d'un nouvel upload, seules les
+sources nouvelles ou modifiées sont chargées, découpées et embeddées ; les sources
+disparues sont retirées de la collection et marquées "tombstoned" dans le manifeste.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import chromadb
+# Patch telemetry to avoid argument errors
+chromadb.telemetry.capture = lambda *args, **kwargs: None
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+
+from ingestion.bm25_index import BM25_DIRNAME, BM25Index
+from ingestion.models import get_embeddings
+from ingestion.vector_index import (
+    QUANTIZATIONS,
+    VECTOR_INDEX,
+    VECTOR_INDEX_DIRNAME,
+    QuantizedVectorIndex,
+    apply_hnsw_search_ef,
+    hnsw_metadata,
+)
+
+from ingestion.ingestion import (
+    UPLOADS_STORE_DIR,
+    hash_file,
+    ingestion_config,
+)
+from ingestion.pipeline import IngestionPipeline
+
+MANIFEST_FILENAME = "manifest.json"
+ACTIVE = "active"
+TOMBSTONED = "tombstoned"
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def file_source_id(content_hash: str) -> str:
+    """Les fichiers uploadés sont identifiés par leur contenu (deux uploads identiques = une source)."""
+    return f"sha256:{content_hash}"
+
+class IngestionManifest:
+    """Manifeste JSON {source_id: {content_hash, chunk_ids, status, ...}} écrit de manière atomique."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sources: Dict[str, Dict[str, Any]] = {}
+        self.config: Dict[str, Any] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.sources = data.get("sources", {})
+            self.config = data.get("config", {})
+
+    def active_sources(self) -> Dict[str, Dict[str, Any]]:
+        return {sid: s for sid, s in self.sources.items() if s.get("status") == ACTIVE}
+
+    def record(self, source_id: str, content_hash: str, chunk_ids: List[str], **extra: Any) -> None:
+        self.sources[source_id] = {
+            "content_hash": content_hash,
+            "chunk_ids": chunk_ids,
+            "status": ACTIVE,
+            "ingested_at": time.time(),
+            **extra,
+        }
+
+    def tombstone(self, source_id: str) -> None:
+        entry = self.sources.get(source_id)
+        if entry is not None:
+            entry.update(status=TOMBSTONED, chunk_ids=[], deleted_at=time.time())
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"config": self.config, "sources": self.sources}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+class PersistentCorpus:
+    """Collection Chroma persistante + manifeste d'ingestion."""
+
+    def __init__(self, persist_directory: str, collection_name: str = "langchain",
+                 vector_index: str = VECTOR_INDEX):
+        self.persist_directory = persist_directory
+        self.collection_name = collection_name
+        os.makedirs(persist_directory, exist_ok=True)
+        self.vectorstore = self._open_vectorstore()
+        if vector_index not in QUANTIZATIONS:
+            apply_hnsw_search_ef(self.vectorstore._collection)
+        self.manifest = IngestionManifest(os.path.join(persist_directory, MANIFEST_FILENAME))
+        self._lock = threading.Lock()
+        self.bm25_index = self._load_bm25_index()
+        self.vector_index: Optional[QuantizedVectorIndex] = None
+        self._check_config(vector_index)
+        if vector_index in QUANTIZATIONS:
+            self.vector_index = self._load_vector_index(vector_index)
+
+    def _open_vectorstore(self) -> Chroma:
+        return Chroma(
+            collection_name=self.collection_name,
+            embedding_function=get_embeddings(),
+            persist_directory=self.persist_directory,
+            collection_metadata=hnsw_metadata(),  # lu à la création de la collection seulement
+        )
+
+    def _active_chunk_ids(self) -> set:
+        return {cid for s in self.manifest.active_sources().values() for cid in s.get("chunk_ids", [])}
+
+    def _load_bm25_index(self) -> BM25Index:
+        """Recharge l'index BM25 sauvegardé, ou le reconstruit depuis Chroma s'il est absent ou désynchronisé."""
+        index = BM25Index.load(os.path.join(self.persist_directory, BM25_DIRNAME))
+        if index is not None and set(index.chunk_ids()) == self._active_chunk_ids():
+            return index
+        index = BM25Index.from_documents(self.documents())
+        if len(index):
+            print(f"🔤 Index BM25 reconstruit ({len(index)} chunks)")
+        return index
+
+    def _load_vector_index(self, quantization: str) -> QuantizedVectorIndex:
+        """
+        Rouvre l'index quantifié (memmap). Il est le seul à détenir les vecteurs (Chroma n'a
+        que des embeddings factices) : une source dont des chunks y manquent est retirée du
+        manifeste, pour être ré-ingérée à la prochaine synchronisation.
+        """
+        directory = os.path.join(self.persist_directory, VECTOR_INDEX_DIRNAME)
+        index = QuantizedVectorIndex.load(directory, quantization) or QuantizedVectorIndex(quantization, directory=directory)
+        self.vector_index = index
+        indexed = set(index.chunk_ids())
+        # Chunks de sources retirées, ou d'une ingestion interrompue avant le manifeste
+        index.remove(indexed - self._active_chunk_ids())
+        missing = [source_id for source_id, entry in self.manifest.active_sources().items()
+                   if not set(entry.get("chunk_ids", [])) <= indexed]
+        if missing:
+            print(f"⚠️ Index vectoriel {quantization} incomplet : {len(missing)} source(s) à ré-ingérer")
+            for source_id in missing:
+                self._remove_source(source_id)
+            self._save()
+        return index
+
+    def _save(self) -> None:
+        self.manifest.save()
+        self.bm25_index.save(os.path.join(self.persist_directory, BM25_DIRNAME))
+        if self.vector_index is not None:
+            self.vector_index.save(os.path.join(self.persist_directory, VECTOR_INDEX_DIRNAME))
+
+    def _check_config(self, vector_index: str) -> None:
+        """Un changement de modèle d'embedding, de découpage ou de stockage des vecteurs invalide tout le store."""
+        config = {k: v for k, v in ingestion_config().items() if k in ("embedding_model", "chunker")}
+        if vector_index in QUANTIZATIONS:
+            # Clé absente en mode hnsw : la configuration des stores existants ne change pas
+            config["vector_index"] = vector_index
+        if self.manifest.config and self.manifest.config != config:
+            print("⚠️ Configuration d'ingestion modifiée : ré-indexation complète du store.")
+            for source_id in list(self.manifest.active_sources()):
+                self._remove_source(source_id)
+            # La dimension des embeddings stockés change (autre modèle, ou vecteurs factices)
+            self.vectorstore.delete_collection()
+            self.vectorstore = self._open_vectorstore()
+        self.manifest.config = config
+
+    # --- Synchronisation ---
+    def sync_files(self, file_paths: List[str], prune: bool = False) -> List[str]:
+        """
+        Ingère les fichiers dont le contenu n'est pas encore dans le store.
+        Renvoie les hashes de contenu des fichiers (pour filtrer la recherche).
+        """
+        hashes: Dict[str, str] = {}
+        for path in file_paths:
+            if not os.path.exists(path):
+                print(f"Fichier non trouvé: {path}")
+                continue
+            hashes[file_source_id(hash_file(path))] = path
+
+        with self._lock:
+            active = self.manifest.active_sources()
+            new_sources = {path: source_id for source_id, path in hashes.items() if source_id not in active}
+            if new_sources:
+                self._ingest(file_paths=list(new_sources), source_ids=new_sources)
+            if prune:
+                for source_id in set(active) - set(hashes):
+                    self._remove_source(source_id)
+            self._save()
+        return [sid.split(":", 1)[1] for sid in hashes]
+
+    def sync_urls(self, urls: List[str], refresh: bool = False, prune: bool = True) -> Dict[str, int]:
+        """
+        Ingère les URLs absentes du manifeste. Avec `refresh=True`, les pages déjà connues
+        sont re-téléchargées mais ne sont ré-embeddées que si leur contenu a changé.
+        """
+        stats = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        with self._lock:
+            active = self.manifest.active_sources()
+            to_fetch = [url for url in urls if refresh or url not in active]
+            stats["unchanged"] += len(urls) - len(to_fetch)
+            if to_fetch:
+                self._ingest(urls=to_fetch, source_ids={url: url for url in to_fetch}, stats=stats)
+            if prune:
+                for source_id in set(active) - set(urls):
+                    self._remove_source(source_id)
+                    stats["deleted"] += 1
+            self._save()
+        print(f"📦 Store {self.persist_directory} synchronisé: {stats}")
+        return stats
+
+    def _ingest(self, source_ids: Dict[str, str], file_paths: Optional[List[str]] = None,
+                urls: Optional[List[str]] = None, stats: Optional[Dict[str, int]] = None) -> None:
+        """
+        Fait passer les sources dans le pipeline en flux (chargement, découpage, embedding
+        par lots et écriture Chroma se recouvrent). Le manifeste d'une source n'est mis à
+        jour qu'une fois tous ses chunks écrits ; l'ancienne version d'une URL modifiée
+        n'est retirée qu'à ce moment-là.
+        """
+        pending: Dict[str, Dict[str, Any]] = {}
+        # Instantané pris avant le pipeline : `indexed` (thread d'indexation) modifie le
+        # manifeste pendant que `should_index` (thread de découpage) le consulte
+        active = dict(self.manifest.active_sources())
+
+        def should_index(source: str, documents: List[Document]) -> bool:
+            """Compare le hash du contenu au manifeste avant le découpage (qui embedde chaque phrase)."""
+            source_id = source_ids[source]
+            if source_id.startswith("sha256:"):
+                content_hash = source_id.split(":", 1)[1]
+                extra = {"path": source}
+            else:
+                content_hash = hash_text("\n".join(d.page_content for d in documents))
+                extra = {}
+            previous = active.get(source_id)
+            if previous is not None and previous["content_hash"] == content_hash:
+                if stats is not None:
+                    stats["unchanged"] += 1
+                return False
+            if stats is not None:
+                stats["updated" if previous is not None else "added"] += 1
+            pending[source] = {
+                "source_id": source_id, "content_hash": content_hash, "replaces": previous is not None, **extra,
+            }
+            return True
+
+        def prepare(source: str, documents: List[Document], chunks: List[Document]) -> List[Document]:
+            entry = pending[source]
+            for i, chunk in enumerate(chunks):
+                chunk.metadata.update(chunk_id=f"{entry['content_hash'][:16]}-{i}",
+                                      content_hash=entry["content_hash"], source_id=entry["source_id"])
+            entry["chunks"] = chunks
+            return chunks
+
+        def indexed(source: str, chunk_ids: List[str]) -> None:
+            entry = pending.pop(source, None)
+            if entry is None:
+                return
+            source_id, content_hash = entry.pop("source_id"), entry.pop("content_hash")
+            chunks = entry.pop("chunks")
+            if entry.pop("replaces"):
+                self._remove_source(source_id)
+            self.bm25_index.add_documents(chunks)
+            self.manifest.record(source_id, content_hash, chunk_ids, **entry)
+            print(f"➕ {source_id}: {len(chunk_ids)} chunks indexés")
+
+        IngestionPipeline(self.vectorstore, should_index=should_index, prepare_chunks=prepare,
+                          on_source_indexed=indexed, vector_index=self.vector_index).run(
+            file_paths=file_paths, urls=urls
+        )
+
+    def remove_sources(self, source_ids: List[str]) -> None:
+        """Retire des sources du store (chunks Chroma, index BM25, manifeste)."""
+        with self._lock:
+            for source_id in source_ids:
+                self._remove_source(source_id)
+            self._save()
+
+    def _remove_source(self, source_id: str) -> None:
+        chunk_ids = self.manifest.sources.get(source_id, {}).get("chunk_ids", [])
+        if chunk_ids:
+            self.vectorstore.delete(ids=chunk_ids)
+            self.bm25_index.remove(chunk_ids)
+            if self.vector_index is not None:
+                self.vector_index.remove(chunk_ids)
+        self.manifest.tombstone(source_id)
+        print(f"🪦 {source_id}: source retirée du store")
+
+    # --- Lecture ---
+    def active_sources(self) -> Dict[str, Dict[str, Any]]:
+        """Copie des sources actives du manifeste, prise sous le verrou (une ingestion peut le modifier)."""
+        with self._lock:
+            return {source_id: dict(entry) for source_id, entry in self.manifest.active_sources().items()}
+
+    def documents(self, where: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Renvoie les chunks stockés (sans ré-embedding), éventuellement filtrés."""
+        result = self.vectorstore.get(where=where, include=["documents", "metadatas"])
+        return [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(result["documents"], result["metadatas"])
+        ]
+
+def content_hash_filter(content_hashes: List[str]) -> Dict[str, Any]:
+    """Filtre de métadonnées Chroma restreignant la recherche à un ensemble de sources."""
+    if len(content_hashes) == 1:
+        return {"content_hash": content_hashes[0]}
+    return {"content_hash": {"$in": list(content_hashes)}}
+
+_uploads_corpus: Optional[PersistentCorpus] = None
+_uploads_lock = threading.Lock()
+
+def get_uploads_corpus() -> PersistentCorpus:
+    """Store partagé des fichiers uploadés (ouvert une seule fois par processus)."""
+    global _uploads_corpus
+    with _uploads_lock:
+        if _uploads_corpus is None:
+            _uploads_corpus = PersistentCorpus(UPLOADS_STORE_DIR)
+        return _uploads_corpus
@@ -0,0 +1,415 @@
+# ingestion/vector_index.py
+"""
+Couche vectorielle des stores : réglages HNSW de Chroma et index quantifié mappé en mémoire.
+
+- VECTOR_INDEX=hnsw (défaut) : la branche vectorielle interroge le HNSW de Chroma.
+  HNSW_M et HNSW_EF_CONSTRUCTION ne s'appliquent qu'à la création d'une collection (un
+  store existant garde les siens, il faut le reconstruire pour en changer) ;
+  HNSW_EF_SEARCH est appliqué à chaque ouverture du store.
+- VECTOR_INDEX=int8 | binary : les vecteurs ne sont rangés que dans un QuantizedVectorIndex
+  à côté du store. La collection Chroma ne garde que le texte et les métadonnées des
+  chunks, avec un embedding factice d'une dimension (PLACEHOLDER_EMBEDDING) : son HNSW
+  ne contient plus de vecteurs float32, seulement ~M × 2 liens de 4 octets par chunk.
+  Changer de mode ré-indexe tout le store (cf. store.PersistentCorpus._check_config).
+  Une requête parcourt les codes quantifiés par blocs (int8 : un octet par dimension,
+  pas fixe de 1/127 pour des embeddings normés ; binary : un bit de signe par dimension,
+  distance de Hamming), puis re-note les k × VECTOR_RESCORE_FACTOR meilleurs candidats
+  avec les vecteurs float32 exacts (distance L2², comme Chroma).
+
+Codes et vecteurs sont des fichiers bruts ouverts en np.memmap : seules les pages lues
+sont chargées, et le système peut les libérer. Pour 384 dimensions, une requête lit
+384 octets (int8) ou 48 octets (binary) par chunk au lieu de 1 536, plus les vecteurs
+float32 des seuls candidats : la mémoire résidente suit les codes, pas les vecteurs. Le
+parcours reste exhaustif (O(N) par requête, sans graphe) ; il se fait hors du verrou,
+sur un instantané, si bien que les requêtes concurrentes ne s'attendent pas. Les ajouts
+sont écrits en fin de fichier ; les retraits sont des tombstones, compactés quand ils
+dominent (comme l'index BM25). index.json, écrit en dernier, fait foi : les lignes d'un
+save interrompu au-delà de son compte sont tronquées.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ingestion.bm25_index import matches_filter
+
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "hnsw").lower()  # hnsw | int8 | binary
+QUANTIZATIONS = ("int8", "binary")
+# Candidats re-notés en float32 = k × facteur (0 : valeur par défaut de la quantification)
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "0"))
+DEFAULT_RESCORE_FACTORS = {"int8": 4, "binary": 16}
+VECTOR_COMPACT_RATIO = float(os.getenv("VECTOR_COMPACT_RATIO", "0.25"))
+VECTOR_INDEX_DIRNAME = "vectors"
+
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "100"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "100"))
+
+# Métadonnées conservées par ligne pour les filtres (cf. store.content_hash_filter)
+FILTER_KEYS = ("content_hash", "source_id")
+# Lignes parcourues par bloc lors du tri grossier (borne la mémoire temporaire)
+SCAN_BLOCK_ROWS = 65536
+# Pas int8 : les composantes d'un embedding normé sont dans [-1, 1]. Un pas fixe garde
+# tous les lots comparables (les rares valeurs hors plage sont écrêtées, puis re-notées en float32).
+INT8_SCALE = 1.0 / 127.0
+# Embedding écrit dans Chroma en mode quantifié (les vrais vecteurs sont dans l'index)
+PLACEHOLDER_EMBEDDING = [0.0]
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+class _View(NamedTuple):
+    """Instantané des lignes cherchables, pris sous le verrou puis parcouru hors verrou."""
+    codes: np.ndarray         # lignes persistées (memmap)
+    vectors: np.ndarray
+    new_codes: np.ndarray     # ajouts depuis le dernier save (vues sur les tampons en mémoire)
+    new_vectors: np.ndarray
+    mask: np.ndarray
+    ids: List[str]
+
+def hnsw_metadata(m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION,
+                  ef_search: int = HNSW_EF_SEARCH) -> Dict[str, Any]:
+    """Métadonnées de collection Chroma fixant les paramètres du HNSW (lues à la création)."""
+    return {"hnsw:space": "l2", "hnsw:M": m, "hnsw:construction_ef": ef_construction, "hnsw:search_ef": ef_search}
+
+def apply_hnsw_search_ef(collection: Any, ef_search: int = HNSW_EF_SEARCH,
+                         m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION) -> None:
+    """
+    Applique ef_search à une collection existante ; signale un M / ef_construction différent.
+    Chroma ne relit ce réglage qu'au chargement de l'index en mémoire : appeler à l'ouverture du store.
+    """
+    hnsw = (getattr(collection, "configuration", None) or {}).get("hnsw") or {}
+    if hnsw and (hnsw.get("max_neighbors"), hnsw.get("ef_construction")) != (m, ef_construction):
+        print(f"ℹ️ Collection {collection.name} construite avec M={hnsw.get('max_neighbors')}, "
+              f"ef_construction={hnsw.get('ef_construction')} (reconstruire le store pour appliquer "
+              f"M={m}, ef_construction={ef_construction})")
+    if hnsw and hnsw.get("ef_search") != ef_search:
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+
+class QuantizedVectorIndex:
+    """Index vectoriel quantifié incrémental ; toutes les méthodes publiques sont thread-safe."""
+
+    def __init__(self, quantization: str = "int8", rescore_factor: int = VECTOR_RESCORE_FACTOR,
+                 directory: Optional[str] = None):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Quantification inconnue {quantization!r} (attendu : {QUANTIZATIONS})")
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor or DEFAULT_RESCORE_FACTORS[quantization]
+        self.directory = directory
+        self.dim: Optional[int] = None
+        self._ids: List[str] = []
+        self._slots: Dict[str, int] = {}
+        self._filters: List[Dict[str, Any]] = []
+        self._alive = np.empty(0, dtype=bool)
+        # Lignes persistées (np.memmap) puis lignes ajoutées depuis le dernier save (en mémoire)
+        self._codes: Optional[np.ndarray] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._persisted = 0
+        # Tampons à capacité doublée : les ajouts sont copiés une fois, pas re-concaténés à chaque requête
+        self._new_codes: Optional[np.ndarray] = None
+        self._new_vectors: Optional[np.ndarray] = None
+        self._pending = 0
+        self._masks: Dict[str, np.ndarray] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    # --- Quantification ---
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        if self.quantization == "binary":
+            return np.packbits(vectors > 0, axis=1)
+        return np.clip(np.rint(vectors / INT8_SCALE), -127, 127).astype(np.int8)
+
+    def _coarse_scores(self, codes: np.ndarray, query: np.ndarray, packed_query: Optional[np.ndarray]) -> np.ndarray:
+        """Score approché (plus grand = plus proche) d'un bloc de codes."""
+        if self.quantization == "binary":
+            return -_POPCOUNT[np.bitwise_xor(codes, packed_query)].sum(axis=1, dtype=np.int32).astype(np.float32)
+        return codes.astype(np.float32) @ (query * INT8_SCALE)
+
+    # --- Mise à jour ---
+    def add(self, chunk_ids: Sequence[str], vectors: Any, metadatas: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        """Ajoute (ou remplace, à chunk_id égal) des vecteurs."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(chunk_ids):
+            return
+        if vectors.ndim != 2 or vectors.shape[0] != len(chunk_ids):
+            raise ValueError(f"{len(chunk_ids)} ids pour des vecteurs de forme {vectors.shape}")
+        metadatas = metadatas or [{}] * len(chunk_ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Dimension {vectors.shape[1]} au lieu de {self.dim}")
+            dead = [self._slots[cid] for cid in chunk_ids if cid in self._slots]
+            start = len(self._ids)
+            for offset, (chunk_id, metadata) in enumerate(zip(chunk_ids, metadatas)):
+                self._ids.append(chunk_id)
+                self._slots[chunk_id] = start + offset
+                self._filters.append({k: (metadata or {}).get(k) for k in FILTER_KEYS})
+            self._append_pending(self._quantize(vectors), vectors)
+            self._alive = np.concatenate([self._alive, np.ones(len(chunk_ids), dtype=bool)])
+            self._alive[dead] = False
+            self._masks.clear()
+
+    def _append_pending(self, codes: np.ndarray, vectors: np.ndarray) -> None:
+        needed = self._pending + len(codes)
+        if self._new_codes is None or needed > len(self._new_codes):
+            # Nouveaux tampons : les instantanés en cours gardent les anciens, intacts
+            capacity = max(needed, 2 * (len(self._new_codes) if self._new_codes is not None else 0), 1024)
+            new_codes = np.empty((capacity, codes.shape[1]), dtype=codes.dtype)
+            new_vectors = np.empty((capacity, self.dim), dtype=np.float32)
+            if self._pending:
+                new_codes[:self._pending] = self._new_codes[:self._pending]
+                new_vectors[:self._pending] = self._new_vectors[:self._pending]
+            self._new_codes, self._new_vectors = new_codes, new_vectors
+        # Écrit après les lignes visibles des instantanés existants, qui ne les voient pas
+        self._new_codes[self._pending:needed] = codes
+        self._new_vectors[self._pending:needed] = vectors
+        self._pending = needed
+
+    def _pending_rows(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._new_codes is None:
+            code_bytes, _ = self._row_bytes()
+            code_dtype = np.uint8 if self.quantization == "binary" else np.int8
+            return np.empty((0, code_bytes), dtype=code_dtype), np.empty((0, self.dim), dtype=np.float32)
+        return self._new_codes[:self._pending], self._new_vectors[:self._pending]
+
+    def remove(self, chunk_ids: Iterable[str]) -> int:
+        """Retire des vecteurs (tombstone) ; renvoie le nombre de vecteurs retirés."""
+        with self._lock:
+            removed = 0
+            for chunk_id in chunk_ids:
+                slot = self._slots.pop(chunk_id, None)
+                if slot is not None and self._alive[slot]:
+                    self._alive[slot] = False
+                    removed += 1
+            if removed:
+                self._masks.clear()
+            return removed
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        if not where:
+            return self._alive
+        unsupported = _filter_keys(where) - set(FILTER_KEYS)
+        if unsupported:
+            raise ValueError(f"Filtre non supporté par l'index quantifié: {sorted(unsupported)}")
+        key = json.dumps(where, sort_keys=True)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._alive & np.fromiter(
+                (matches_filter(f, where) for f in self._filters), dtype=bool, count=len(self._filters)
+            )
+            self._masks[key] = mask
+        return mask
+
+    # --- Recherche ---
+    def _view(self, where: Optional[Dict[str, Any]]) -> _View:
+        """À appeler sous le verrou. Les lignes existantes ne sont jamais modifiées en place :
+        ajouts, save et compactage créent de nouveaux tableaux, l'instantané reste cohérent."""
+        mask = self._mask(where)
+        new_codes, new_vectors = self._pending_rows()
+        return _View(self._codes if self._codes is not None else new_codes[:0],
+                     self._vectors if self._vectors is not None else new_vectors[:0],
+                     new_codes, new_vectors, mask.copy() if mask is self._alive else mask, self._ids)
+
+    @staticmethod
+    def _blocks(view: _View) -> Iterable[Tuple[int, np.ndarray]]:
+        """(première ligne, codes) des lignes persistées par blocs, puis des ajouts récents."""
+        persisted = len(view.codes)
+        for start in range(0, persisted, SCAN_BLOCK_ROWS):
+            yield start, view.codes[start:start + SCAN_BLOCK_ROWS]
+        for start in range(0, len(view.new_codes), SCAN_BLOCK_ROWS):
+            yield persisted + start, view.new_codes[start:start + SCAN_BLOCK_ROWS]
+
+    def _rows(self, rows: np.ndarray, view: _View) -> np.ndarray:
+        """Vecteurs float32 des lignes `rows` (triées : lecture séquentielle du memmap)."""
+        out = np.empty((len(rows), view.vectors.shape[1]), dtype=np.float32)
+        persisted = rows < len(view.vectors)
+        if persisted.any():
+            out[persisted] = view.vectors[rows[persisted]]
+        if not persisted.all():
+            out[~persisted] = view.new_vectors[rows[~persisted] - len(view.vectors)]
+        return out
+
+    def search(self, vector: Any, k: int = 4, where: Optional[Dict[str, Any]] = None,
+               rescore_factor: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k (chunk_id, distance L2²) : tri grossier sur les codes, puis re-notation exacte.
+        Seul l'instantané est pris sous le verrou : les requêtes concurrentes parcourent les
+        codes en parallèle (NumPy relâche le GIL) et n'attendent pas les ajouts.
+        """
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        with self._lock:
+            if self.dim is None or k <= 0:
+                return []
+            view = self._view(where)
+        n_alive = int(view.mask.sum())
+        if not n_alive:
+            return []
+        packed_query = np.packbits(query > 0) if self.quantization == "binary" else None
+        scores = np.empty(len(view.mask), dtype=np.float32)
+        for start, codes in self._blocks(view):
+            scores[start:start + len(codes)] = self._coarse_scores(codes, query, packed_query)
+        scores[~view.mask] = -np.inf
+        n_candidates = min(n_alive, k * (rescore_factor or self.rescore_factor))
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        candidates.sort()
+        exact = self._rows(candidates, view)
+        distances = ((exact - query) ** 2).sum(axis=1)
+        order = np.argsort(distances, kind="stable")[:k]
+        return [(view.ids[candidates[i]], float(distances[i])) for i in order]
+
+    def vectors(self, where: Optional[Dict[str, Any]] = None, limit: Optional[int] = None) -> np.ndarray:
+        """Vecteurs float32 des lignes vivantes satisfaisant `where` (échantillon régulier si `limit`)."""
+        with self._lock:
+            if self.dim is None:
+                return np.empty((0, 0), dtype=np.float32)
+            view = self._view(where)
+        rows = np.flatnonzero(view.mask)
+        if limit is not None and len(rows) > limit:
+            rows = rows[np.linspace(0, len(rows) - 1, limit).astype(np.int64)]
+        return self._rows(rows, view)
+
+    # --- Persistance ---
+    def _paths(self, directory: str) -> Tuple[str, str, str]:
+        return (os.path.join(directory, f"codes.{self.quantization}"), os.path.join(directory, "vectors.f32"),
+                os.path.join(directory, "index.json"))
+
+    def _row_bytes(self) -> Tuple[int, int]:
+        code_bytes = (self.dim + 7) // 8 if self.quantization == "binary" else self.dim
+        return code_bytes, self.dim * 4
+
+    def _open(self, directory: str, n_rows: int) -> None:
+        codes_path, vectors_path, _ = self._paths(directory)
+        code_bytes, _ = self._row_bytes()
+        code_dtype = np.uint8 if self.quantization == "binary" else np.int8
+        if n_rows:
+            self._codes = np.memmap(codes_path, dtype=code_dtype, mode="r", shape=(n_rows, code_bytes))
+            self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(n_rows, self.dim))
+        else:
+            self._codes = np.empty((0, code_bytes), dtype=code_dtype)
+            self._vectors = np.empty((0, self.dim), dtype=np.float32)
+        self._persisted = n_rows
+        self._new_codes = self._new_vectors = None
+        self._pending = 0
+
+    def save(self, directory: Optional[str] = None) -> None:
+        """
+        Écrit les ajouts en fin de fichier (ou réécrit tout si les tombstones dominent),
+        puis les métadonnées JSON de manière atomique, et rouvre les fichiers en memmap.
+        """
+        directory = directory or self.directory
+        with self._lock:
+            if self.dim is None:
+                return
+            os.makedirs(directory, exist_ok=True)
+            codes_path, vectors_path, meta_path = self._paths(directory)
+            rewrite = directory != self.directory or (len(self._alive) and (~self._alive).mean() > VECTOR_COMPACT_RATIO)
+            if rewrite:
+                self._compact(codes_path, vectors_path)
+                for other in QUANTIZATIONS:  # codes d'une quantification précédente
+                    if other != self.quantization and os.path.exists(os.path.join(directory, f"codes.{other}")):
+                        os.remove(os.path.join(directory, f"codes.{other}"))
+            else:
+                # Repartir de la fin des lignes persistées (pas de celle d'un save interrompu)
+                code_bytes, vector_bytes = self._row_bytes()
+                _truncate(codes_path, self._persisted * code_bytes)
+                _truncate(vectors_path, self._persisted * vector_bytes)
+                codes, vectors = self._pending_rows()
+                with open(codes_path, "ab") as codes_file, open(vectors_path, "ab") as vectors_file:
+                    codes_file.write(np.ascontiguousarray(codes).tobytes())
+                    vectors_file.write(np.ascontiguousarray(vectors).tobytes())
+            tmp_meta = f"{meta_path}.tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({
+                    "quantization": self.quantization,
+                    "dim": self.dim,
+                    "rows": len(self._ids),
+                    "ids": self._ids,
+                    "filters": self._filters,
+                    "dead": np.flatnonzero(~self._alive).tolist(),
+                }, f)
+            os.replace(tmp_meta, meta_path)
+            self.directory = directory
+            self._open(directory, len(self._ids))
+
+    def _compact(self, codes_path: str, vectors_path: str) -> None:
+        """Réécrit les seules lignes vivantes."""
+        live = np.flatnonzero(self._alive)
+        vectors = self._rows(live, self._view(None)) if len(live) else np.empty((0, self.dim), dtype=np.float32)
+        self._ids = [self._ids[i] for i in live]
+        self._filters = [self._filters[i] for i in live]
+        self._slots = {cid: i for i, cid in enumerate(self._ids)}
+        self._alive = np.ones(len(live), dtype=bool)
+        codes = self._quantize(vectors) if len(live) else np.empty((0, self._row_bytes()[0]), dtype=np.int8)
+        for path, array in ((codes_path, codes), (vectors_path, vectors)):
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(np.ascontiguousarray(array).tobytes())
+        # Fermer les memmaps avant de remplacer les fichiers
+        self._codes = self._vectors = None
+        os.replace(f"{codes_path}.tmp", codes_path)
+        os.replace(f"{vectors_path}.tmp", vectors_path)
+        self._masks.clear()
+
+    @classmethod
+    def load(cls, directory: str, quantization: str, rescore_factor: int = VECTOR_RESCORE_FACTOR) -> Optional["QuantizedVectorIndex"]:
+        """Rouvre un index sauvegardé en memmap (None s'il est absent, illisible ou d'une autre quantification)."""
+        index = cls(quantization, rescore_factor=rescore_factor, directory=directory)
+        codes_path, vectors_path, meta_path = index._paths(directory)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["quantization"] != quantization:
+                return None
+            index.dim, rows = meta["dim"], meta["rows"]
+            code_bytes, vector_bytes = index._row_bytes()
+            if os.path.getsize(codes_path) < rows * code_bytes or os.path.getsize(vectors_path) < rows * vector_bytes:
+                raise ValueError("fichiers tronqués")
+            # Lignes d'un save interrompu avant l'écriture de index.json
+            _truncate(codes_path, rows * code_bytes)
+            _truncate(vectors_path, rows * vector_bytes)
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(directory):
+                print(f"⚠️ Index vectoriel illisible ({e}), il sera reconstruit.")
+            return None
+        index._ids = meta["ids"]
+        index._filters = meta["filters"]
+        index._alive = np.ones(rows, dtype=bool)
+        index._alive[meta["dead"]] = False
+        index._slots = {cid: i for i, cid in enumerate(index._ids) if index._alive[i]}
+        index._open(directory, rows)
+        return index
+
+    def chunk_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._slots)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            code_bytes, vector_bytes = self._row_bytes() if self.dim else (0, 0)
+            rows = len(self._ids)
+            return {
+                "quantization": self.quantization,
+                "vectors": len(self),
+                "rows": rows,
+                "rescore_factor": self.rescore_factor,
+                "code_bytes": rows * code_bytes,      # parcourus à chaque requête
+                "vector_bytes": rows * vector_bytes,  # lus pour les seuls candidats
+            }
+
+def _truncate(path: str, size: int) -> None:
+    """Ramène un fichier de lignes à `size` octets s'il est plus long."""
+    if os.path.exists(path) and os.path.getsize(path) > size:
+        os.truncate(path, size)
+
+def _filter_keys(where: Dict[str, Any]) -> set:
+    keys = set()
+    for key, condition in where.items():
+        if key == "$and":
+            for clause in condition:
+                keys |= _filter_keys(clause)
+        else:
+            keys.add(key)
+    return keys
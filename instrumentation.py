@@ -0,0 +1,443 @@
+# instrumentation.py
+"""
+Per-node latency, token and cache instrumentation for the LangGraph workflow.
+
+- `instrument_node` wraps every node registered in `_setup_workflow` (sync and async
+  versions): wall time, documents in / out and errors are recorded on a `StepRecord`,
+  which is the "current step" (context variable) while the node runs.
+- `InstrumentationCallback` is attached to each run's callbacks, so it sees every chain
+  and LLM call made inside the nodes: call time and token usage are added to the
+  current step. LangChain `on_retry` events and the Groq client's HTTP retries (hooked
+  on its `_sleep_for_retry`) are counted as retries.
+- `record_cache` is called by the caches (semantic answers, web search, rerank scores).
+- A `RequestTrace` gathers the steps of one question; pass one to `run`/`arun` to get
+  it back. Each finished step is also logged as one JSON line ("rag.trace" logger) and
+  fed to the process-wide Prometheus-style `metrics` (`metrics.render_prometheus()`).
+"""
+import contextvars
+import importlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+INSTRUMENTATION = os.getenv("INSTRUMENTATION", "true").lower() == "true"
+INSTRUMENTATION_LOG = os.getenv("INSTRUMENTATION_LOG", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2000, 4000, 8000)
+DOCUMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50)
+
+logger = logging.getLogger("rag.trace")
+
+
+# --- Prometheus-style metrics ---
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, safe across threads."""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                ",".join(key) or "all": {"count": s["count"], "sum": round(s["sum"], 6),
+                                         "mean": round(s["sum"] / s["count"], 6) if s["count"] else 0.0}
+                for key, s in self._series.items()
+            }
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {",".join(key) or "all": value for key, value in self._values.items()}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.request_seconds = Histogram("rag_request_duration_seconds", "Wall time per question.",
+                                         LATENCY_BUCKETS, ("source",))
+        self.node_seconds = Histogram("rag_node_duration_seconds", "Wall time per graph node.",
+                                      LATENCY_BUCKETS, ("node",))
+        self.node_documents = Histogram("rag_node_documents", "Documents in the state after each node.",
+                                        DOCUMENT_BUCKETS, ("node",))
+        self.llm_seconds = Histogram("rag_llm_call_duration_seconds", "Wall time per LLM call.",
+                                     LATENCY_BUCKETS, ("node",))
+        self.llm_tokens = Histogram("rag_llm_tokens", "Tokens per LLM call.", TOKEN_BUCKETS, ("node", "kind"))
+        self.retries = Counter("rag_retries_total", "LLM / HTTP retries.", ("node",))
+        self.errors = Counter("rag_errors_total", "Node and LLM call errors.", ("node", "kind"))
+        self.cache_lookups = Counter("rag_cache_lookups_total", "Cache lookups by result.", ("cache", "result"))
+        self.speculation = Counter("rag_speculation_total", "Speculative fallback work by outcome.", ("task", "outcome"))
+
+    def _all(self) -> List[Any]:
+        return [self.request_seconds, self.node_seconds, self.node_documents, self.llm_seconds,
+                self.llm_tokens, self.retries, self.errors, self.cache_lookups, self.speculation]
+
+    def render_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        return "\n".join(line for metric in self._all() for line in metric.render()) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {metric.name: metric.snapshot() for metric in self._all()}
+
+
+# --- Singleton shared by the whole process ---
+metrics = MetricsRegistry()
+
+
+# --- Per-request trace ---
+@dataclass
+class StepRecord:
+    node: str
+    started_at: float
+    seconds: float = 0.0
+    documents_in: int = 0
+    documents_out: Optional[int] = None
+    llm_calls: int = 0
+    llm_seconds: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = 0
+    errors: int = 0
+    cache_hits: Dict[str, int] = field(default_factory=dict)
+    cache_misses: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+@dataclass
+class RequestTrace:
+    question: str = ""
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started_at: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    source: str = ""
+    steps: List[StepRecord] = field(default_factory=list)
+    cache_hits: Dict[str, int] = field(default_factory=dict)
+    cache_misses: Dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        self._clock = time.perf_counter()
+
+    def start_step(self, node: str, documents_in: int = 0) -> StepRecord:
+        step = StepRecord(node=node, started_at=time.time(), documents_in=documents_in)
+        with self._lock:
+            self.steps.append(step)
+        return step
+
+    def finish(self, source: str = "graph") -> None:
+        self.seconds = time.perf_counter() - self._clock
+        self.source = source
+        metrics.request_seconds.observe(self.seconds, source=source)
+
+    def totals(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = list(self.steps)
+        seconds_by_node: Dict[str, float] = {}
+        for step in steps:
+            seconds_by_node[step.node] = round(seconds_by_node.get(step.node, 0.0) + step.seconds, 6)
+        return {
+            "seconds_by_node": seconds_by_node,
+            "llm_calls": sum(s.llm_calls for s in steps),
+            "prompt_tokens": sum(s.prompt_tokens for s in steps),
+            "completion_tokens": sum(s.completion_tokens for s in steps),
+            "retries": sum(s.retries for s in steps),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = [asdict(s) for s in self.steps]
+        return {"trace_id": self.trace_id, "question": self.question, "source": self.source,
+                "seconds": round(self.seconds, 6), "steps": steps, "cache_hits": dict(self.cache_hits),
+                "cache_misses": dict(self.cache_misses), "totals": self.totals()}
+
+
+# The step being executed (set by the node wrapper, inherited by threads started through
+# run_blocking / LangChain executors, which copy the context)
+_current_step: contextvars.ContextVar[Optional[StepRecord]] = contextvars.ContextVar("rag_current_step", default=None)
+_step_lock = threading.Lock()
+
+
+def current_step() -> Optional[StepRecord]:
+    return _current_step.get()
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0, trace: Optional[RequestTrace] = None) -> None:
+    """Counts cache lookups, on the current step (or on `trace` outside the graph nodes)."""
+    if hits:
+        metrics.cache_lookups.inc(hits, cache=cache, result="hit")
+    if misses:
+        metrics.cache_lookups.inc(misses, cache=cache, result="miss")
+    target = _current_step.get() or trace
+    if target is None:
+        return
+    with _step_lock:
+        if hits:
+            target.cache_hits[cache] = target.cache_hits.get(cache, 0) + hits
+        if misses:
+            target.cache_misses[cache] = target.cache_misses.get(cache, 0) + misses
+
+
+def _count_documents(value: Any) -> Optional[int]:
+    if isinstance(value, dict) and isinstance(value.get("documents"), list):
+        return len(value["documents"])
+    return None
+
+
+def _finish_step(step: StepRecord, start: float, output: Any, error: Optional[BaseException], trace: Any) -> None:
+    step.seconds = time.perf_counter() - start
+    step.documents_out = _count_documents(output)
+    metrics.node_seconds.observe(step.seconds, node=step.node)
+    if step.documents_out is not None:
+        metrics.node_documents.observe(step.documents_out, node=step.node)
+    if error is not None:
+        step.error = f"{type(error).__name__}: {error}"
+        metrics.errors.inc(node=step.node, kind="node")
+    if INSTRUMENTATION_LOG:
+        payload = {"event": "node", "trace_id": getattr(trace, "trace_id", None), **asdict(step)}
+        logger.info(json.dumps(payload, default=str, ensure_ascii=False))
+
+
+def instrument_node(name: str, func: Callable[..., Any], afunc: Callable[..., Any]) -> Tuple[Callable[..., Any], Callable[..., Any]]:
+    """
+    Wraps a node (sync and async versions). The wrappers always take the RunnableConfig
+    and only forward it to nodes that declare a `config` parameter.
+    """
+    wants_config = "config" in inspect.signature(func).parameters
+    awants_config = "config" in inspect.signature(afunc).parameters
+
+    def _begin(state: Any, config: Any) -> Tuple[Any, StepRecord]:
+        trace = (config or {}).get("configurable", {}).get("trace")
+        documents_in = _count_documents(state) or 0
+        step = trace.start_step(name, documents_in) if trace is not None else StepRecord(name, time.time(), documents_in=documents_in)
+        return trace, step
+
+    # No functools.wraps: RunnableLambda would follow __wrapped__ and stop passing the config
+    def wrapped(state: Any, config: Any) -> Any:
+        trace, step = _begin(state, config)
+        token = _current_step.set(step)
+        start = time.perf_counter()
+        output, error = None, None
+        try:
+            output = func(state, config) if wants_config else func(state)
+            return output
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current_step.reset(token)
+            _finish_step(step, start, output, error, trace)
+
+    async def awrapped(state: Any, config: Any) -> Any:
+        trace, step = _begin(state, config)
+        token = _current_step.set(step)
+        start = time.perf_counter()
+        output, error = None, None
+        try:
+            output = await (afunc(state, config) if awants_config else afunc(state))
+            return output
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            _current_step.reset(token)
+            _finish_step(step, start, output, error, trace)
+
+    return wrapped, awrapped
+
+
+# --- LLM calls (callbacks) ---
+def _token_usage(response: Any) -> Tuple[int, int]:
+    for generations in getattr(response, "generations", None) or []:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return int(usage.get("input_tokens", 0)), int(usage.get("output_tokens", 0))
+    usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    return int(usage.get("prompt_tokens", 0) or 0), int(usage.get("completion_tokens", 0) or 0)
+
+
+class InstrumentationCallback(BaseCallbackHandler):
+    """Times LLM calls and collects their token usage and retries for the running node."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._calls: Dict[UUID, Tuple[float, Optional[StepRecord], str]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, metadata: Optional[Dict[str, Any]]) -> None:
+        step = _current_step.get()
+        node = step.node if step is not None else str((metadata or {}).get("langgraph_node", "unknown"))
+        with self._lock:
+            self._calls[run_id] = (time.perf_counter(), step, node)
+
+    def _pop(self, run_id: UUID) -> Optional[Tuple[float, Optional[StepRecord], str]]:
+        with self._lock:
+            return self._calls.pop(run_id, None)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID,
+                            metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self._start(run_id, metadata)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID,
+                     metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self._start(run_id, metadata)
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._pop(run_id)
+        if call is None:
+            return
+        start, step, node = call
+        seconds = time.perf_counter() - start
+        prompt_tokens, completion_tokens = _token_usage(response)
+        metrics.llm_seconds.observe(seconds, node=node)
+        metrics.llm_tokens.observe(prompt_tokens, node=node, kind="prompt")
+        metrics.llm_tokens.observe(completion_tokens, node=node, kind="completion")
+        if step is not None:
+            with _step_lock:
+                step.llm_calls += 1
+                step.llm_seconds += seconds
+                step.prompt_tokens += prompt_tokens
+                step.completion_tokens += completion_tokens
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._pop(run_id)
+        if call is None:
+            return
+        _, step, node = call
+        metrics.errors.inc(node=node, kind="llm")
+        if step is not None:
+            with _step_lock:
+                step.llm_calls += 1
+                step.errors += 1
+
+    def on_retry(self, retry_state: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        _count_retry()
+
+
+def _count_retry() -> None:
+    step = _current_step.get()
+    metrics.retries.inc(node=step.node if step is not None else "unknown")
+    if step is not None:
+        with _step_lock:
+            step.retries += 1
+
+
+class _ClientRetryHandler(logging.Handler):
+    """Fallback for clients without a retry hook: reads their "Retrying request" records."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if str(record.msg).startswith("Retrying request"):
+            _count_retry()
+
+
+def _counting_retries(sleep_for_retry: Callable) -> Callable:
+    if inspect.iscoroutinefunction(sleep_for_retry):
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            _count_retry()
+            return await sleep_for_retry(*args, **kwargs)
+        return async_wrapper
+
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        _count_retry()
+        return sleep_for_retry(*args, **kwargs)
+    return wrapper
+
+
+_retry_handler_installed = False
+
+
+def install_client_retry_counter(module_names: Sequence[str] = ("groq._base_client",)) -> None:
+    """
+    Counts the HTTP client's retries (idempotent). The Groq/OpenAI-style clients retry
+    internally and call `_sleep_for_retry` before each new attempt: that method is
+    wrapped. The client's logger level is left alone (it belongs to the application);
+    without the hook, retries are read from its log records when INFO is enabled.
+    """
+    global _retry_handler_installed
+    if _retry_handler_installed:
+        return
+    for name in module_names:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        hooked = False
+        for client_class in (getattr(module, "SyncAPIClient", None), getattr(module, "AsyncAPIClient", None)):
+            sleep_for_retry = getattr(client_class, "_sleep_for_retry", None)
+            if sleep_for_retry is not None:
+                client_class._sleep_for_retry = _counting_retries(sleep_for_retry)
+                hooked = True
+        if not hooked:
+            logging.getLogger(name).addHandler(_ClientRetryHandler(level=logging.INFO))
+    _retry_handler_installed = True
+
+
+# --- Singleton shared by every run ---
+instrumentation_callback = InstrumentationCallback()
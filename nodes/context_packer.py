@@ -0,0 +1,143 @@
+# nodes/context_packer.py
+"""
+Token-budget-aware context packing for the generate node.
+
+Instead of joining every document and cutting the string at a character limit, the
+packer:
+- counts real tokens with a local tokenizer (tiktoken; ~4 chars/token if unavailable),
+- orders chunks by their best available score (cross-encoder `rerank_score`, hybrid
+  `fusion_score`, Tavily `score`), each family min-max normalised so that vector and
+  web evidence can be compared,
+- drops near-duplicates (word-shingle Jaccard), e.g. the same passage found by the
+  vector store and by web search,
+- fills the token budget with whole chunks, best first.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "cl100k_base")  # close to the Llama 3 vocabulary
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Metadata keys holding a relevance score, most trusted first
+SCORE_KEYS = ("rerank_score", "fusion_score", "score")
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[Any]:
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(CONTEXT_TOKENIZER)
+    except Exception as e:  # not installed, or the encoding cannot be downloaded
+        print(f"⚠️ Tokenizer unavailable ({e}), estimating 4 characters per token.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = _encoding()
+    if encoding is None:
+        return text[: max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _shingles(text: str, size: int = 3) -> Set[tuple]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i: i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: Set[tuple], b: Set[tuple]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _scores(documents: List[Any]) -> List[float]:
+    """One comparable score per document: first available score key, normalised per key."""
+    keys: List[Optional[str]] = []
+    raw: List[float] = []
+    for doc in documents:
+        metadata = getattr(doc, "metadata", {}) or {}
+        key = next((k for k in SCORE_KEYS if isinstance(metadata.get(k), (int, float))), None)
+        keys.append(key)
+        raw.append(float(metadata[key]) if key else 0.0)
+    ranges: Dict[str, tuple] = {}
+    for key, value in zip(keys, raw):
+        if key:
+            low, high = ranges.get(key, (value, value))
+            ranges[key] = (min(low, value), max(high, value))
+    scores = []
+    for key, value in zip(keys, raw):
+        if key is None:
+            scores.append(0.0)  # unscored documents keep their original order, after scored ones
+            continue
+        low, high = ranges[key]
+        scores.append(1.0 if high - low < 1e-12 else (value - low) / (high - low))
+    return scores
+
+
+@dataclass
+class PackedContext:
+    text: str
+    documents: List[Any] = field(default_factory=list)
+    tokens: int = 0
+    duplicates: int = 0
+    skipped: int = 0
+
+
+def pack_context(
+    documents: List[Any],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+    count: Callable[[str], int] = count_tokens,
+) -> PackedContext:
+    """Best-first packing of whole chunks into `token_budget` tokens."""
+    if not documents:
+        return PackedContext(text="")
+    scores = _scores(documents)
+    order = sorted(range(len(documents)), key=lambda i: (-scores[i], i))
+
+    kept: List[Any] = []
+    kept_shingles: List[Set[tuple]] = []
+    texts: List[str] = []
+    used = duplicates = skipped = 0
+    separator_tokens = count(CONTEXT_SEPARATOR)
+    for i in order:
+        text = getattr(documents[i], "page_content", str(documents[i])).strip()
+        if not text:
+            continue
+        shingles = _shingles(text)
+        if any(_jaccard(shingles, other) >= dedup_threshold for other in kept_shingles):
+            duplicates += 1
+            continue
+        cost = count(text) + (separator_tokens if texts else 0)
+        if used + cost > token_budget:
+            skipped += 1  # a smaller, lower-ranked chunk may still fit
+            continue
+        kept.append(documents[i])
+        kept_shingles.append(shingles)
+        texts.append(text)
+        used += cost
+
+    if not texts:
+        # Not a single whole chunk fits: fall back to the best one, cut at the budget
+        best = getattr(documents[order[0]], "page_content", str(documents[order[0]])).strip()
+        text = truncate_to_tokens(best, token_budget)
+        return PackedContext(text=text, documents=[documents[order[0]]], tokens=count(text),
+                             duplicates=duplicates, skipped=skipped)
+    return PackedContext(text=CONTEXT_SEPARATOR.join(texts), documents=kept, tokens=used,
+                         duplicates=duplicates, skipped=skipped)
@@ -1,29 +1,48 @@
-from chains.generation import generation_chain
+from chains.generation import get_generation_chain
+from nodes.context_packer import pack_context
+
+GENERATION_ERROR_MESSAGE = "I'm sorry, I encountered an error while generating a response."
+
+def build_context(documents: list) -> str:
+    """
+    Packs the best whole chunks into the context token budget (see nodes/context_packer.py).
+    """
+    packed = pack_context(documents)
+    print(
+        f"📦 Context: {len(packed.documents)}/{len(documents)} chunk(s), {packed.tokens} tokens "
+        f"({packed.duplicates} duplicate(s), {packed.skipped} over budget)"
+    )
+    return packed.text
+
 def generate(state: dict) -> dict:
     """
     Generates an answer using the retrieved documents and the user's question.
-    It truncates the context to a safe limit to prevent API errors.
+    The context is packed to a token budget to stay under the API limits.
     """
     print("---NODE: GENERATE---")
     question = state["question"]
-    documents = state["documents"]
-    
-    # THIS IS THE FIX 👇
-    # Join documents and truncate to prevent exceeding the model's context limit.
-    # Groq's limit is 6000 TPM. A safe character limit (e.g., 18000 chars)
-    # is a good way to stay well under the token limit.
-    
-    context_text = "\n\n---\n\n".join([doc.page_content for doc in documents])
-    
-    SAFE_CHARACTER_LIMIT = 18000  # Approx. 4500-5000 tokens
-    if len(context_text) > SAFE_CHARACTER_LIMIT:
-        print(f"⚠️  Context length ({len(context_text)}) exceeds safe limit. Truncating.")
-        context_text = context_text[:SAFE_CHARACTER_LIMIT]
+    context_text = build_context(state["documents"])
 
-    # Invoke the chain with the potentially truncated context
+    # Stream the chain so LangGraph's "messages" stream mode can forward tokens as they arrive
     try:
-        generation = generation_chain.invoke({"context": context_text, "question": question})
+        generation = "".join(get_generation_chain().stream({"context": context_text, "question": question}))
         return {"generation": generation}
     except Exception as e:
         print(f"❌ Error during generation: {e}")
-        return {"generation": "I'm sorry, I encountered an error while generating a response."}
+        return {"generation": GENERATION_ERROR_MESSAGE}
+
+
+async def agenerate(state: dict) -> dict:
+    """
+    Async version of generate.
+    """
+    print("---NODE: GENERATE (async)---")
+    question = state["question"]
+    context_text = build_context(state["documents"])
+
+    try:
+        chunks = [chunk async for chunk in get_generation_chain().astream({"context": context_text, "question": question})]
+        return {"generation": "".join(chunks)}
+    except Exception as e:
+        print(f"❌ Error during generation: {e}")
+        return {"generation": GENERATION_ERROR_MESSAGE}
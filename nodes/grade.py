@@ -1,6 +1,6 @@
 from typing import Any, Dict
 
-from chains.retriever_grader import retrieval_grader
+from chains.retriever_grader import get_retrieval_grader
 from state import GraphState
 from langchain_core.messages import SystemMessage
 
@@ -14,7 +14,7 @@ def grade_documents(state: GraphState) -> Dict[str, Any]:
         state (dict): The current graph state
 
     Returns:
-        state (dict): Filtered out irrelevant documents and updated web_search state
+        state (dict): Filtered out irrelevant documents and updated web_search_needed state
     """
 
     print("---CHECK DOCUMENT RELEVANCE TO QUESTION---")
@@ -24,7 +24,7 @@ def grade_documents(state: GraphState) -> Dict[str, Any]:
     filtered_docs = []
     web_search = False
     for d in documents:
-        score = retrieval_grader.invoke(
+        score = get_retrieval_grader().invoke(
             {"question": question, "document": d.page_content}
         )
         grade = score.binary_score
@@ -37,4 +37,4 @@ def grade_documents(state: GraphState) -> Dict[str, Any]:
             continue
     # Ajout d'un message de grading à l'historique
     #chat_history.append(SystemMessage(role="system", content=f"Documents graded for question: {question}"))
-    return {"documents": filtered_docs, "question": question, "web_search": web_search}
\ No newline at end of file
+    return {"documents": filtered_docs, "question": question, "web_search_needed": web_search}
\ No newline at end of file
@@ -1,7 +1,7 @@
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
+from chains.llm import get_llm, lazy_chain
 from state import GraphState
 
 # --- 1. Define the Pydantic Model for Structured Output ---
@@ -23,28 +23,35 @@ Provide your rewritten question in a structured format."""
 
 rewrite_prompt = ChatPromptTemplate.from_template(rewrite_prompt_template)
 
-# --- 3. Initialize the Language Model with Structured Output ---
-llm = ChatGroq(model="llama-3.1-8b-instant", temperature=0.0)
-structured_llm_rewriter = llm.with_structured_output(RewrittenQuestion)
+# --- 3. Define the Complete Query Rewriting Chain ---
+# The language model (with structured output) is initialized on first use
+@lazy_chain
+def get_query_rewrite_chain():
+    structured_llm_rewriter = get_llm().with_structured_output(RewrittenQuestion)
+    return rewrite_prompt | structured_llm_rewriter
 
-# --- 4. Define the Complete Query Rewriting Chain ---
-query_rewrite_chain = rewrite_prompt | structured_llm_rewriter
+def _speculation(config: RunnableConfig):
+    return (config or {}).get("configurable", {}).get("speculation")
 
-def query_rewrite(state: GraphState):
+def query_rewrite(state: GraphState, config: RunnableConfig = None):
     """
     Rewrites the user's question to improve retrieval accuracy.
+    Uses the speculative rewrite when one was started for this question (see nodes/speculation.py).
     """
     print("---REWRITE QUERY---")
     
     question = state["question"]
     rewrite_count = state.get("query_rewrite_count", 0) + 1
 
-    # Invoke the chain to get the structured output
-    rewrite_result = query_rewrite_chain.invoke({"question": question})
+    speculation = _speculation(config)
+    rewritten_question_str = speculation.rewritten(question) if speculation is not None else None
+    if rewritten_question_str is None:
+        # Invoke the chain to get the structured output
+        rewrite_result = get_query_rewrite_chain().invoke({"question": question})
 
-    # --- THIS IS THE FIX ---
-    # We now correctly extract the string from the Pydantic object.
-    rewritten_question_str = rewrite_result.rewritten_question
+        # --- THIS IS THE FIX ---
+        # We now correctly extract the string from the Pydantic object.
+        rewritten_question_str = rewrite_result.rewritten_question
 
     print(f"✅ Original Question: {question}")
     print(f"✅ Rewritten Question: {rewritten_question_str}")
@@ -56,3 +63,28 @@ def query_rewrite(state: GraphState):
         "query_rewrite_count": rewrite_count,
     }
 
+
+
+async def aquery_rewrite(state: GraphState, config: RunnableConfig = None):
+    """
+    Async version of query_rewrite.
+    """
+    print("---REWRITE QUERY (async)---")
+
+    question = state["question"]
+    rewrite_count = state.get("query_rewrite_count", 0) + 1
+
+    speculation = _speculation(config)
+    rewritten_question_str = await speculation.arewritten(question) if speculation is not None else None
+    if rewritten_question_str is None:
+        rewrite_result = await get_query_rewrite_chain().ainvoke({"question": question})
+        rewritten_question_str = rewrite_result.rewritten_question
+
+    print(f"✅ Original Question: {question}")
+    print(f"✅ Rewritten Question: {rewritten_question_str}")
+
+    return {
+        "question": rewritten_question_str,
+        "documents": [],
+        "query_rewrite_count": rewrite_count,
+    }
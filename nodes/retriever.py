@@ -3,11 +3,17 @@
 from typing import Dict, Any
 from langchain_core.runnables import RunnableConfig
 from state import GraphState
+from concurrency import run_blocking
 
 def retrieve_documents(state: GraphState, config: RunnableConfig) -> Dict[str, Any]:
     print("---NŒUD: RÉCUPÉRATION DE DOCUMENTS---")
     question = state["question"]
 
+    # Mode spéculatif : la réécriture (et la recherche web) de repli démarrent dès la 1re recherche
+    speculation = config["configurable"].get("speculation")
+    if speculation is not None and not state.get("query_rewrite_count"):
+        speculation.start(question, config)
+
     retriever = config["configurable"].get("retriever")
     if retriever is None:
         print("⚠️ Aucun retriever fourni. Aucun document ne sera récupéré.")
@@ -21,3 +27,26 @@ def retrieve_documents(state: GraphState, config: RunnableConfig) -> Dict[str, A
     except Exception as e:
         print(f"❌ Erreur lors de la récupération: {e}")
         return {"documents": []}
+
+
+async def aretrieve_documents(state: GraphState, config: RunnableConfig) -> Dict[str, Any]:
+    """Version async : la recherche (Chroma, BM25, cross-encoder) est bloquante, on la pousse dans le pool borné."""
+    print("---NŒUD: RÉCUPÉRATION DE DOCUMENTS (async)---")
+    question = state["question"]
+
+    speculation = config["configurable"].get("speculation")
+    if speculation is not None and not state.get("query_rewrite_count"):
+        speculation.astart(question, config)
+
+    retriever = config["configurable"].get("retriever")
+    if retriever is None:
+        print("⚠️ Aucun retriever fourni. Aucun document ne sera récupéré.")
+        return {"documents": []}
+
+    try:
+        documents = await run_blocking(retriever.invoke, question)
+        print(f"✅ {len(documents)} document(s) récupéré(s).")
+        return {"documents": documents}
+    except Exception as e:
+        print(f"❌ Erreur lors de la récupération: {e}")
+        return {"documents": []}
@@ -0,0 +1,214 @@
+# nodes/speculation.py
+"""
+Speculative fallback work for the retrieval path.
+
+When grading keeps no document, the graph runs query_rewrite -> retrieve -> grade and,
+if that fails again, web_search on the rewritten question: several sequential network
+round trips before generation starts. With speculation on, the rewrite of the original
+question (and, in "full" mode, the web search for that rewritten question) start as
+soon as the first retrieval does, and run while retrieval and grading proceed.
+
+The fallback nodes only use a speculative result when they reach it with the very
+question it was computed for, so answers are the same as without speculation. When
+grading keeps documents, the pending work is cancelled. The price is one LLM call (and
+one web search in "full" mode) on every question routed to the vector store.
+
+SPECULATION=off | rewrite | full
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from concurrency import get_blocking_executor
+from instrumentation import instrument_node, metrics
+
+SPECULATION_MODE = os.getenv("SPECULATION", "off").lower()
+SPECULATION_MODES = ("off", "rewrite", "full")
+
+# Step names in the request traces (not graph nodes)
+SPECULATIVE_REWRITE = "speculative_rewrite"
+SPECULATIVE_WEBSEARCH = "speculative_web_search"
+
+
+def _rewrite(state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> str:
+    from nodes.query_rewrite import get_query_rewrite_chain
+
+    return get_query_rewrite_chain().invoke({"question": state["question"]}).rewritten_question
+
+
+async def _arewrite(state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> str:
+    from nodes.query_rewrite import get_query_rewrite_chain
+
+    return (await get_query_rewrite_chain().ainvoke({"question": state["question"]})).rewritten_question
+
+
+def _search(state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> List[Document]:
+    from nodes.web_search import search
+
+    return search(state["question"])
+
+
+async def _asearch(state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> List[Document]:
+    from nodes.web_search import asearch
+
+    return await asearch(state["question"])
+
+
+class Speculation:
+    """
+    Speculative work of one run, shared through config["configurable"]["speculation"].
+    Started by the first retrieval, consumed by query_rewrite / web_search, cancelled
+    by the grading decision (or at the end of the run).
+    """
+
+    def __init__(self, mode: str = SPECULATION_MODE, instrument: bool = False):
+        if mode not in SPECULATION_MODES:
+            raise ValueError(f"Unknown speculation mode {mode!r} (expected one of {SPECULATION_MODES})")
+        self.mode = mode
+        self.question: Optional[str] = None
+        self._rewrite: Any = None   # asyncio.Task or concurrent.futures.Future -> rewritten question
+        self._web: Any = None       # ... -> (query, documents)
+        self._lock = threading.Lock()
+        self._rewrite_fn, self._arewrite_fn = _rewrite, _arewrite
+        self._search_fn, self._asearch_fn = _search, _asearch
+        if instrument:
+            self._rewrite_fn, self._arewrite_fn = instrument_node(SPECULATIVE_REWRITE, _rewrite, _arewrite)
+            self._search_fn, self._asearch_fn = instrument_node(SPECULATIVE_WEBSEARCH, _search, _asearch)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @staticmethod
+    def _outcome(task: str, outcome: str) -> None:
+        metrics.speculation.inc(task=task, outcome=outcome)
+
+    # --- Start (first retrieval) ---
+    def start(self, question: str, config: Optional[Dict[str, Any]] = None) -> None:
+        """Sync path: the speculative calls run in the shared blocking pool."""
+        with self._lock:
+            if not self.enabled or self.question is not None:
+                return
+            self.question = question
+            executor = get_blocking_executor()
+            ctx = contextvars.copy_context()
+            self._rewrite = executor.submit(ctx.run, self._rewrite_fn, {"question": question}, config)
+            if self.mode == "full":
+                rewrite = self._rewrite
+
+                def search_rewritten() -> Tuple[str, List[Document]]:
+                    query = rewrite.result()
+                    return query, self._search_fn({"question": query}, config)
+
+                self._web = executor.submit(contextvars.copy_context().run, search_rewritten)
+        print(f"🏎️ Speculation started ({self.mode})")
+
+    def astart(self, question: str, config: Optional[Dict[str, Any]] = None) -> None:
+        """Async path: the speculative calls are tasks on the running loop."""
+        with self._lock:
+            if not self.enabled or self.question is not None:
+                return
+            self.question = question
+            self._rewrite = asyncio.ensure_future(self._arewrite_fn({"question": question}, config))
+            if self.mode == "full":
+                rewrite = self._rewrite
+
+                async def search_rewritten() -> Tuple[str, List[Document]]:
+                    # shield: cancelling the search must not cancel a rewrite still needed
+                    query = await asyncio.shield(rewrite)
+                    return query, await self._asearch_fn({"question": query}, config)
+
+                self._web = asyncio.ensure_future(search_rewritten())
+        print(f"🏎️ Speculation started ({self.mode})")
+
+    # --- Consume (fallback nodes) ---
+    def _take(self, attribute: str) -> Any:
+        with self._lock:
+            work = getattr(self, attribute)
+            setattr(self, attribute, None)
+        return work
+
+    def rewritten(self, question: str) -> Optional[str]:
+        """The speculative rewrite of `question`, or None (not speculated, other question, failed)."""
+        if question != self.question:
+            return None
+        work = self._take("_rewrite")
+        if work is None:
+            return None
+        try:
+            result = work.result()
+        except Exception as e:
+            print(f"⚠️ Speculative rewrite failed: {e}")
+            self._outcome("rewrite", "failed")
+            return None
+        self._outcome("rewrite", "used")
+        return result
+
+    async def arewritten(self, question: str) -> Optional[str]:
+        if question != self.question:
+            return None
+        work = self._take("_rewrite")
+        if work is None:
+            return None
+        try:
+            result = await work
+        except Exception as e:
+            print(f"⚠️ Speculative rewrite failed: {e}")
+            self._outcome("rewrite", "failed")
+            return None
+        self._outcome("rewrite", "used")
+        return result
+
+    def web_documents(self, question: str) -> Optional[List[Document]]:
+        """The speculative web results for `question` (the rewritten question), or None."""
+        work = self._take("_web")
+        if work is None:
+            return None
+        try:
+            query, documents = work.result()
+        except Exception as e:
+            print(f"⚠️ Speculative web search failed: {e}")
+            self._outcome("web_search", "failed")
+            return None
+        if query != question:
+            self._outcome("web_search", "wasted")
+            return None
+        self._outcome("web_search", "used")
+        return documents
+
+    async def aweb_documents(self, question: str) -> Optional[List[Document]]:
+        work = self._take("_web")
+        if work is None:
+            return None
+        try:
+            query, documents = await work
+        except Exception as e:
+            print(f"⚠️ Speculative web search failed: {e}")
+            self._outcome("web_search", "failed")
+            return None
+        if query != question:
+            self._outcome("web_search", "wasted")
+            return None
+        self._outcome("web_search", "used")
+        return documents
+
+    # --- Cancel (grading kept documents, or end of run) ---
+    def cancel(self) -> None:
+        """Drops the pending work: cancelled if still running, wasted if already done."""
+        for attribute, task in (("_web", "web_search"), ("_rewrite", "rewrite")):
+            work = self._take(attribute)
+            if work is None:
+                continue
+            if work.done():
+                self._outcome(task, "wasted")
+                continue
+            work.cancel()  # a call already running in a thread cannot be interrupted: its result is ignored
+            self._outcome(task, "cancelled")
+            if not isinstance(work, Future):
+                # Retrieve the task's outcome so asyncio does not log "exception was never retrieved"
+                work.add_done_callback(lambda t: t.cancelled() or t.exception())
@@ -1,65 +1,142 @@
 import os
-import time
+import threading
+from typing import Any, List, Optional
 from dotenv import load_dotenv
-# --- THIS IS THE FIX ---
-# Updated import to use the non-deprecated TavilySearch from the correct package
-from langchain_tavily import TavilySearch
 from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig
+from cache.web_search_cache import create_web_search_cache
+from concurrency import TokenBucket, run_blocking
+from instrumentation import record_cache
 from state import GraphState
 
 # Load environment variables
 load_dotenv()
 
-# Validate Tavily API Key
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-if not TAVILY_API_KEY:
-    raise ValueError("❌ TAVILY_API_KEY environment variable is not set! Add it to your .env file.")
+WEB_SEARCH_MAX_RESULTS = int(os.getenv("WEB_SEARCH_MAX_RESULTS", "5"))
+# Token bucket shared by every thread and task: average calls/second and burst size
+WEB_SEARCH_RATE = float(os.getenv("WEB_SEARCH_RATE", "2"))
+WEB_SEARCH_BURST = float(os.getenv("WEB_SEARCH_BURST", "2"))
 
-# --- THIS IS THE FIX ---
-# Initialize the modern, non-deprecated TavilySearch tool
-tavily_tool = TavilySearch(max_results=5)
+rate_limiter = TokenBucket(rate=WEB_SEARCH_RATE, capacity=WEB_SEARCH_BURST)
 
-def web_search(state: GraphState):
+_NOT_CREATED = object()
+_web_search_cache: Any = _NOT_CREATED
+_web_search_cache_lock = threading.Lock()
+_search_tool: Optional[Any] = None
+
+def get_web_search_cache() -> Optional[Any]:
+    """
+    The web search cache, created on first search (importing this module does not open
+    the SQLite file). None when disabled by WEB_SEARCH_CACHE_BACKEND or set_web_search_cache.
+    """
+    global _web_search_cache
+    with _web_search_cache_lock:
+        if _web_search_cache is _NOT_CREATED:
+            _web_search_cache = create_web_search_cache()
+        return _web_search_cache
+
+def set_web_search_cache(cache: Optional[Any]) -> None:
+    """Replaces the web search cache (None disables caching)."""
+    global _web_search_cache
+    _web_search_cache = cache
+
+def get_search_tool() -> Any:
+    """
+    The search tool, created on first use. Anything exposing invoke/ainvoke(query) and
+    returning Tavily-shaped output can be injected with set_search_tool (e.g. a local stub).
+    """
+    global _search_tool
+    if _search_tool is None:
+        if not TAVILY_API_KEY:
+            raise ValueError("❌ TAVILY_API_KEY environment variable is not set! Add it to your .env file.")
+        # Updated import to use the non-deprecated TavilySearch from the correct package
+        from langchain_tavily import TavilySearch
+
+        _search_tool = TavilySearch(max_results=WEB_SEARCH_MAX_RESULTS)
+    return _search_tool
+
+def set_search_tool(tool: Optional[Any]) -> None:
+    """Replaces the search tool (None goes back to Tavily)."""
+    global _search_tool
+    _search_tool = tool
+
+def results_to_documents(search_output) -> list:
+    """
+    Converts the raw Tavily output (dict with 'results' or a plain list) into Documents.
+    """
+    # The code now correctly handles the dictionary output from Tavily.
+    results_list = []
+    if isinstance(search_output, dict) and 'results' in search_output:
+        # If the output is a dictionary, extract the list from the 'results' key
+        results_list = search_output['results']
+        print(f"🔍 Extracted {len(results_list)} results from the Tavily dictionary.")
+    elif isinstance(search_output, list):
+        # Also handle the case where it might return a list directly
+        results_list = search_output
+        print("🔍 Received a direct list from Tavily.")
+
+    # Process the extracted list of results
+    web_docs = []
+    for result in results_list:
+        if isinstance(result, dict):
+            # Convert each result dictionary into a LangChain Document object
+            web_docs.append(Document(
+                page_content=result.get("content", ""),
+                metadata={
+                    "source": result.get("url", "N/A"),
+                    "score": result.get("score", "N/A")
+                }
+            ))
+
+    print(f"✅ Created {len(web_docs)} Document objects from web search.")
+    return web_docs
+
+def search(query: str) -> List[Document]:
+    """Cached, rate-limited web search returning Documents."""
+    web_search_cache = get_web_search_cache()
+    if web_search_cache is not None:
+        cached = web_search_cache.get(query)
+        record_cache("web_search", hits=int(cached is not None), misses=int(cached is None))
+        if cached is not None:
+            print(f"♻️ Web search cache hit ({len(cached)} documents).")
+            return cached
+    rate_limiter.acquire()
+    web_docs = results_to_documents(get_search_tool().invoke(query))
+    if web_search_cache is not None and web_docs:
+        web_search_cache.put(query, web_docs)
+    return web_docs
+
+async def asearch(query: str) -> List[Document]:
+    """Async version of search (the limiter, HTTP call and SQLite cache never block the event loop)."""
+    web_search_cache = await run_blocking(get_web_search_cache)
+    if web_search_cache is not None:
+        cached = await run_blocking(web_search_cache.get, query)
+        record_cache("web_search", hits=int(cached is not None), misses=int(cached is None))
+        if cached is not None:
+            print(f"♻️ Web search cache hit ({len(cached)} documents).")
+            return cached
+    await rate_limiter.aacquire()
+    web_docs = results_to_documents(await get_search_tool().ainvoke(query))
+    if web_search_cache is not None and web_docs:
+        await run_blocking(web_search_cache.put, query, web_docs)
+    return web_docs
+
+def web_search(state: GraphState, config: RunnableConfig = None):
     """
     Performs a web search using Tavily API and handles different output formats.
+    Uses the speculative results when they were fetched for this question (see nodes/speculation.py).
     """
     print("---WEB SEARCH---")
     question = state["question"]
     documents = state.get("documents", [])
+    speculation = (config or {}).get("configurable", {}).get("speculation")
 
     try:
-        # Small delay to avoid rate limits
-        time.sleep(0.5)
-
-        # Invoke the search tool
-        search_output = tavily_tool.invoke(question)
-
-        # The code now correctly handles the dictionary output from Tavily.
-        results_list = []
-        if isinstance(search_output, dict) and 'results' in search_output:
-            # If the output is a dictionary, extract the list from the 'results' key
-            results_list = search_output['results']
-            print(f"🔍 Extracted {len(results_list)} results from the Tavily dictionary.")
-        elif isinstance(search_output, list):
-            # Also handle the case where it might return a list directly
-            results_list = search_output
-            print("🔍 Received a direct list from Tavily.")
-
-        # Process the extracted list of results
-        web_docs = []
-        for result in results_list:
-            if isinstance(result, dict):
-                # Convert each result dictionary into a LangChain Document object
-                web_docs.append(Document(
-                    page_content=result.get("content", ""),
-                    metadata={
-                        "source": result.get("url", "N/A"),
-                        "score": result.get("score", "N/A")
-                    }
-                ))
-
-        print(f"✅ Created {len(web_docs)} Document objects from web search.")
-        
+        web_docs = speculation.web_documents(question) if speculation is not None else None
+        if web_docs is None:
+            web_docs = search(question)
+
         # Append the new Document objects to the state
         all_documents = documents + web_docs
 
@@ -76,3 +153,27 @@ def web_search(state: GraphState):
             "question": question,
         }
 
+async def aweb_search(state: GraphState, config: RunnableConfig = None):
+    """
+    Async version of web_search (non-blocking rate limiting and HTTP call).
+    """
+    print("---WEB SEARCH (async)---")
+    question = state["question"]
+    documents = state.get("documents", [])
+    speculation = (config or {}).get("configurable", {}).get("speculation")
+
+    try:
+        web_docs = await speculation.aweb_documents(question) if speculation is not None else None
+        if web_docs is None:
+            web_docs = await asearch(question)
+        return {
+            "documents": documents + web_docs,
+            "question": question,
+        }
+
+    except Exception as e:
+        print(f"❌ ERROR in Tavily search: {e}")
+        return {
+            "documents": documents,
+            "question": question,
+        }
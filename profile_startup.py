@@ -0,0 +1,131 @@
+# profile_startup.py
+"""
+Rapport de démarrage : temps d'import par module et temps de chargement des composants.
+
+Chaque module cible est importé dans un interpréteur neuf avec `python -X importtime`
+(les imports ne sont pas déjà en cache) ; le rapport donne le temps total, le coût
+cumulé des modules du projet et les paquets tiers les plus lents (temps propre agrégé
+par paquet racine). Avec --components, le système RAG, les chaînes LLM et les modèles
+locaux sont ensuite construits dans ce processus et chronométrés.
+
+    python profile_startup.py
+    python profile_startup.py --modules graph ingestion.sessions --components --models
+    python profile_startup.py --json startup_profile.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List
+
+DEFAULT_MODULES = ["graph", "ingestion.retriever_cache", "ingestion.sessions", "ingestion.store", "checkpointer"]
+PROJECT_PACKAGES = {"graph", "state", "Node_constant", "concurrency", "checkpointer", "chains", "nodes", "cache", "ingestion"}
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def profile_import(module: str, top: int = 10) -> Dict[str, Any]:
+    """Importe `module` dans un sous-processus et analyse la sortie de -X importtime."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    project: Dict[str, float] = {}
+    packages: Dict[str, float] = defaultdict(float)
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        root = name.split(".")[0]
+        if depth == 0:
+            total_us += int(cumulative_us)
+        if root in PROJECT_PACKAGES:
+            project[name] = int(cumulative_us) / 1e6
+        else:
+            packages[root] += int(self_us) / 1e6
+    slowest = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode else None,
+        "wall_seconds": round(wall, 3),
+        "import_seconds": round(total_us / 1e6, 3),
+        "project_modules": {k: round(v, 3) for k, v in sorted(project.items(), key=lambda kv: kv[1], reverse=True)},
+        "slowest_packages": {k: round(v, 3) for k, v in slowest},
+    }
+
+def _timed(label: str, build: Callable[[], Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        build()
+        return {"component": label, "ok": True, "seconds": round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        return {"component": label, "ok": False, "seconds": round(time.perf_counter() - start, 3), "error": str(e)}
+
+def profile_components(models: bool = False) -> List[Dict[str, Any]]:
+    """Construit les composants paresseux un par un (après leurs imports) et les chronomètre."""
+    sys.path.insert(0, ROOT)
+    import graph
+    from chains import answer_grader, generation, hallucination_grader, question_rewriter, retriever_grader, router_query
+    from nodes import query_rewrite, web_search
+
+    results = [
+        _timed("rag_system (graphe compilé)", graph.get_rag_system),
+        _timed("question_router", router_query.get_question_router),
+        _timed("retrieval_grader", retriever_grader.get_retrieval_grader),
+        _timed("batch_retrieval_grader", retriever_grader.get_batch_retrieval_grader),
+        _timed("generation_chain", generation.get_generation_chain),
+        _timed("query_rewrite_chain", query_rewrite.get_query_rewrite_chain),
+        _timed("question_rewriter", question_rewriter.get_question_rewriter),
+        _timed("answer_grader", answer_grader.get_answer_grader),
+        _timed("hallucination_grader", hallucination_grader.get_hallucination_grader),
+        _timed("web_search tool", web_search.get_search_tool),
+    ]
+    if models:
+        from ingestion.models import CROSS_ENCODER, EMBEDDINGS, model_registry
+
+        results.append(_timed("embeddings (modèle)", lambda: model_registry.get(EMBEDDINGS)))
+        results.append(_timed("cross_encoder (modèle)", lambda: model_registry.get(CROSS_ENCODER)))
+    return results
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\n=== Imports (interpréteur neuf) ===")
+    for entry in report["imports"]:
+        status = "✅" if entry["ok"] else f"❌ {entry['error']}"
+        print(f"{entry['module']:<28} {entry['import_seconds']:>7.3f}s import  {entry['wall_seconds']:>7.3f}s processus  {status}")
+        for name, seconds in list(entry["project_modules"].items())[:5]:
+            print(f"    {name:<36} {seconds:>7.3f}s (cumulé)")
+        slow = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in entry["slowest_packages"].items())
+        print(f"    paquets tiers les plus lents : {slow}")
+    if report.get("components"):
+        print("\n=== Composants (construction à la demande) ===")
+        for entry in report["components"]:
+            status = "✅" if entry["ok"] else f"❌ {entry['error']}"
+            print(f"{entry['component']:<32} {entry['seconds']:>7.3f}s  {status}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profilage du démarrage (imports, composants, modèles).")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Modules à importer")
+    parser.add_argument("--top", type=int, default=8, help="Nombre de paquets tiers affichés par module")
+    parser.add_argument("--components", action="store_true", help="Chronométrer la construction des composants")
+    parser.add_argument("--models", action="store_true", help="Charger aussi les modèles locaux (implique --components)")
+    parser.add_argument("--json", help="Écrire le rapport dans ce fichier JSON")
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {"python": sys.version.split()[0], "imports": [profile_import(m, args.top) for m in args.modules]}
+    if args.components or args.models:
+        report["components"] = profile_components(models=args.models)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Rapport écrit dans {args.json}")
+
+if __name__ == "__main__":
+    main()
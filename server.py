@@ -0,0 +1,433 @@
+# server.py
+"""
+Service HTTP asynchrone autour du système RAG (FastAPI + uvicorn, réponses en SSE).
+
+Un seul processus sert tous les utilisateurs : le graphe compilé, les modèles locaux et
+les retrievers (ingestion.retriever_cache.retriever_registry) sont partagés, et rien
+n'est reconstruit entre deux requêtes.
+
+- Admission : au plus SERVER_MAX_IN_FLIGHT exécutions du graphe en même temps, et une
+  file d'attente de SERVER_MAX_QUEUE exécutions. Au-delà, le serveur répond 503 (Retry-After).
+- Coalescence : les questions identiques (casse, ponctuation et espaces ignorés), posées
+  en même temps sur le même corpus, partagent une seule exécution du graphe. Un abonné
+  arrivé en cours de route reçoit d'abord les événements déjà émis, puis la suite.
+  Seule l'exécution compte dans la file d'attente, pas ses abonnés. Une requête qui
+  fixe son thread_id (conversation avec mémoire) ne partage son exécution qu'avec les
+  requêtes du même thread ; sans thread_id, l'exécution tourne sous un thread neuf.
+- Un client qui se déconnecte n'interrompt pas l'exécution (les autres abonnés et le
+  cache sémantique en profitent).
+
+    uvicorn server:app --host 0.0.0.0 --port 8000
+    python server.py --port 8000
+
+    POST /corpora  {"files": ["docs/a.pdf"]}           → {"corpus_key": ...}
+                   (chemins relatifs à SERVER_UPLOAD_ROOT, qu'ils ne peuvent pas quitter)
+    POST /ask      {"question": "...", "corpus_key": ..., "stream": true}
+    GET  /health, /stats, /metrics
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from Node_constant import GENERATE, GENERATION_TOKEN, SEMANTIC_CACHE
+from cache.web_search_cache import normalize_query
+from concurrency import run_blocking
+from ingestion.ingestion import DEFAULT_CORPUS_KEY
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_MAX_IN_FLIGHT = int(os.getenv("SERVER_MAX_IN_FLIGHT", "8"))
+SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", "64"))
+SERVER_QUEUE_TIMEOUT = float(os.getenv("SERVER_QUEUE_TIMEOUT", "30"))
+# Regroupe les appels concurrents aux modèles locaux (cf. ingestion.models)
+SERVER_MICRO_BATCHING = os.getenv("SERVER_MICRO_BATCHING", "true").lower() == "true"
+# Charge le corpus par défaut (URLs prédéfinies) au démarrage, sous la clé DEFAULT_CORPUS_KEY
+SERVER_DEFAULT_CORPUS = os.getenv("SERVER_DEFAULT_CORPUS", "false").lower() == "true"
+# Seuls les fichiers sous ce répertoire peuvent être indexés via POST /corpora
+SERVER_UPLOAD_ROOT = os.getenv("SERVER_UPLOAD_ROOT", "./uploads")
+
+class QueueFull(Exception):
+    """Plus de place dans la file d'attente des exécutions."""
+
+class AdmissionGate:
+    """Borne les exécutions simultanées du graphe, avec une file d'attente de taille fixe."""
+
+    def __init__(self, max_in_flight: int = SERVER_MAX_IN_FLIGHT, max_queue: int = SERVER_MAX_QUEUE,
+                 queue_timeout: float = SERVER_QUEUE_TIMEOUT):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def reserve(self) -> None:
+        """Réserve une place (exécution ou file) sans attendre ; QueueFull si tout est pris."""
+        if self.running + self.waiting >= self.max_in_flight + self.max_queue:
+            self.rejected += 1
+            raise QueueFull("serveur saturé")
+        self.waiting += 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Attend une exécution libre pour une place réservée par `reserve()`."""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise QueueFull(f"aucune place libérée en {self.queue_timeout:.0f}s")
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": self.running, "waiting": self.waiting, "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue, "rejected": self.rejected}
+
+class Flight:
+    """Une exécution du graphe et le journal de ses événements, rejouable par chaque abonné."""
+
+    def __init__(self, key: Tuple[str, str, str], question: str):
+        self.key = key
+        self.question = question
+        self.events: List[Dict[str, Any]] = []
+        self.answer = ""
+        self.documents: List[Any] = []
+        self.trace: Optional[Any] = None
+        self.error: Optional[str] = None
+        self.overloaded = False
+        self.done = False
+        self.subscribers = 0
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        for node, output in event.items():
+            if not isinstance(output, dict):
+                continue
+            if output.get("documents"):
+                self.documents = output["documents"]
+            if node in (GENERATE, SEMANTIC_CACHE) and output.get("generation"):
+                self.answer = output["generation"]
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def close(self, error: Optional[str] = None) -> None:
+        async with self._changed:
+            self.error = error
+            self.done = True
+            self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Dict[str, Any]]:
+        seen = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: seen < len(self.events) or self.done)
+                batch, done = self.events[seen:], self.done
+            seen += len(batch)
+            for event in batch:
+                yield event
+            if done and seen >= len(self.events):
+                return
+
+    async def wait(self) -> None:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.done)
+
+class RequestCoalescer:
+    """
+    Une seule exécution par (corpus, thread, question normalisée) en cours ; les requêtes
+    identiques s'y abonnent. L'exécution tourne dans sa propre tâche, indépendante des clients.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Tuple[str, str, str], Flight] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.executions = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(question: str, corpus_key: Optional[str], thread_id: Optional[str] = None) -> Tuple[str, str, str]:
+        # Le thread porte l'historique de la conversation : deux threads ne partagent pas de réponse
+        return corpus_key or "no-corpus", thread_id or "", normalize_query(question)
+
+    def pending(self, key: Tuple[str, str, str]) -> Optional[Flight]:
+        flight = self._flights.get(key)
+        return flight if flight is not None and not flight.done else None
+
+    def join(self, question: str, corpus_key: Optional[str], execute: Callable[[Flight], Awaitable[None]],
+             thread_id: Optional[str] = None) -> Tuple[Flight, bool]:
+        """Renvoie (exécution, coalescée ?) : rejoint l'exécution en cours ou en lance une."""
+        key = self.key(question, corpus_key, thread_id)
+        flight = self.pending(key)
+        if flight is not None:
+            self.coalesced += 1
+            flight.subscribers += 1
+            return flight, True
+        flight = Flight(key, question)
+        flight.subscribers = 1
+        self._flights[key] = flight
+        self.executions += 1
+        task = asyncio.create_task(self._execute(flight, execute))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return flight, False
+
+    async def _execute(self, flight: Flight, execute: Callable[[Flight], Awaitable[None]]) -> None:
+        error = None
+        try:
+            await execute(flight)
+        except QueueFull as e:
+            flight.overloaded = True
+            error = f"file d'attente saturée : {e}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+            await flight.close(error)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "executions": self.executions, "coalesced": self.coalesced}
+
+class AskRequest(BaseModel):
+    question: str = Field(min_length=1)
+    corpus_key: Optional[str] = None
+    thread_id: Optional[str] = None
+    stream: bool = True
+
+class CorpusRequest(BaseModel):
+    files: List[str] = Field(min_length=1)
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _node_summary(output: Any) -> Dict[str, Any]:
+    """Sortie d'un nœud sans les objets non sérialisables (documents résumés par leurs sources)."""
+    from graph import document_sources
+
+    if not isinstance(output, dict):
+        return {}
+    summary: Dict[str, Any] = {}
+    for name, value in output.items():
+        if name == "documents":
+            summary["sources"] = document_sources(value)
+        elif isinstance(value, (str, int, float, bool)) or value is None:
+            summary[name] = value
+    return summary
+
+class RAGServer:
+    """État partagé du service : système RAG, corpus enregistrés, admission et coalescence."""
+
+    def __init__(self, rag: Optional[Any] = None, max_in_flight: int = SERVER_MAX_IN_FLIGHT,
+                 max_queue: int = SERVER_MAX_QUEUE, micro_batching: bool = SERVER_MICRO_BATCHING,
+                 default_corpus: bool = SERVER_DEFAULT_CORPUS, upload_root: str = SERVER_UPLOAD_ROOT):
+        self.rag = rag
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.micro_batching = micro_batching
+        self.default_corpus = default_corpus
+        self.upload_root = os.path.realpath(upload_root)
+        self.gate: Optional[AdmissionGate] = None
+        self.coalescer = RequestCoalescer()
+        # Fichiers de chaque corpus, pour le reconstruire s'il a été évincé du registre
+        self.corpus_files: Dict[str, List[str]] = {}
+        self.default_retriever: Optional[Any] = None
+        self.started = time.time()
+
+    async def startup(self) -> None:
+        from graph import get_rag_system
+        from ingestion.models import model_registry
+
+        self.gate = AdmissionGate(self.max_in_flight, self.max_queue)
+        if self.micro_batching:
+            # Avant les retrievers : ils capturent les modèles à leur création
+            await run_blocking(model_registry.enable_micro_batching)
+        if self.rag is None:
+            self.rag = await run_blocking(get_rag_system)
+        if self.default_corpus:
+            from ingestion.ingestion import initialize_default_retriever
+
+            self.default_retriever = await run_blocking(initialize_default_retriever)
+
+    # --- Corpus ---
+    def resolve_upload(self, path: str) -> str:
+        """Chemin réel d'un fichier du répertoire d'upload (relatif à celui-ci) ; 403 s'il en sort."""
+        resolved = os.path.realpath(os.path.join(self.upload_root, path))
+        if os.path.commonpath([resolved, self.upload_root]) != self.upload_root:
+            raise HTTPException(status_code=403, detail=f"Chemin hors du répertoire d'upload : {path}")
+        return resolved
+
+    async def register_corpus(self, files: List[str]) -> str:
+        from ingestion.retriever_cache import retriever_registry
+
+        # realpath : ni « .. » ni lien symbolique ne permettent de sortir de upload_root
+        resolved = [self.resolve_upload(path) for path in files]
+        missing = [path for path, real in zip(files, resolved) if not os.path.exists(real)]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Fichiers introuvables : {', '.join(missing)}")
+        try:
+            corpus_key, _ = await run_blocking(retriever_registry.get_or_create, resolved)
+        except ValueError as e:  # aucun document exploitable dans les fichiers fournis
+            raise HTTPException(status_code=400, detail=str(e))
+        self.corpus_files[corpus_key] = resolved
+        return corpus_key
+
+    async def corpus(self, corpus_key: Optional[str]) -> Tuple[Optional[Any], Optional[Any]]:
+        """(retriever, routeur local) du corpus ; (None, None) sans corpus."""
+        from ingestion.retriever_cache import retriever_registry
+
+        if corpus_key is None:
+            return None, None
+        if corpus_key == DEFAULT_CORPUS_KEY and self.default_retriever is not None:
+            return self.default_retriever, None
+        retriever = retriever_registry.get(corpus_key)
+        if retriever is None:
+            files = self.corpus_files.get(corpus_key)
+            if files is None:
+                raise HTTPException(status_code=404, detail=f"Corpus inconnu : {corpus_key}")
+            try:
+                corpus_key, retriever = await run_blocking(retriever_registry.get_or_create, files)
+            except ValueError as e:  # fichiers supprimés ou vidés depuis l'enregistrement
+                raise HTTPException(status_code=400, detail=str(e))
+        return retriever, retriever_registry.router(corpus_key)
+
+    # --- Questions ---
+    async def ask(self, request: AskRequest) -> Tuple[Flight, bool]:
+        from instrumentation import RequestTrace
+
+        retriever, router = await self.corpus(request.corpus_key)
+        key = self.coalescer.key(request.question, request.corpus_key, request.thread_id)
+        if self.coalescer.pending(key) is None:
+            # Réservation synchrone : aucune autre requête ne s'intercale avant join()
+            try:
+                self.gate.reserve()
+            except QueueFull:
+                raise HTTPException(status_code=503, detail="Serveur saturé, réessayez plus tard.",
+                                    headers={"Retry-After": "1"})
+
+        async def execute(flight: Flight) -> None:
+            async with self.gate.slot():
+                flight.trace = RequestTrace(question=request.question)
+                thread_id = request.thread_id or f"http-{uuid.uuid4().hex}"
+                config = {"configurable": {"thread_id": thread_id}}
+                async for event in self.rag.arun(request.question, retriever=retriever, config=config,
+                                                 stream_tokens=True, corpus_fingerprint=request.corpus_key,
+                                                 router=router, trace=flight.trace):
+                    await flight.publish(event)
+
+        return self.coalescer.join(request.question, request.corpus_key, execute, thread_id=request.thread_id)
+
+    @staticmethod
+    def result(flight: Flight, coalesced: bool) -> Dict[str, Any]:
+        from graph import document_sources
+
+        trace = flight.trace
+        return {
+            "answer": flight.answer,
+            "sources": document_sources(flight.documents),
+            "coalesced": coalesced,
+            "source": trace.source if trace is not None else None,
+            "seconds": round(trace.seconds, 4) if trace is not None else None,
+            "error": flight.error,
+        }
+
+    async def stream(self, flight: Flight, coalesced: bool) -> AsyncIterator[str]:
+        try:
+            async for event in flight.subscribe():
+                for name, output in event.items():
+                    if name == GENERATION_TOKEN:
+                        yield _sse("token", {"text": output})
+                    else:
+                        yield _sse("node", {"node": name, **_node_summary(output)})
+            result = self.result(flight, coalesced)
+            yield _sse("error" if flight.error else "done", result)
+        finally:
+            flight.subscribers -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        from ingestion.retriever_cache import retriever_registry
+
+        rag = self.rag
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "admission": self.gate.stats() if self.gate is not None else None,
+            "coalescing": self.coalescer.stats(),
+            "retrievers": retriever_registry.stats(),
+            "routes": dict(rag.route_stats) if rag is not None else None,
+        }
+
+def create_app(server: Optional[RAGServer] = None) -> FastAPI:
+    server = server or RAGServer()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await server.startup()
+        print(f"✅ Serveur prêt ({server.gate.max_in_flight} exécutions max, file de {server.gate.max_queue})")
+        yield
+
+    app = FastAPI(title="Adaptive RAG", lifespan=lifespan)
+    app.state.rag_server = server
+
+    @app.get("/health")
+    async def health() -> Dict[str, Any]:
+        return {"status": "ok" if server.rag is not None else "starting"}
+
+    @app.get("/stats")
+    async def stats() -> Dict[str, Any]:
+        return server.stats()
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics_endpoint() -> str:
+        from instrumentation import metrics
+
+        return metrics.render_prometheus()
+
+    @app.post("/corpora")
+    async def register_corpus(request: CorpusRequest) -> Dict[str, Any]:
+        return {"corpus_key": await server.register_corpus(request.files)}
+
+    @app.post("/ask")
+    async def ask(request: AskRequest):
+        flight, coalesced = await server.ask(request)
+        if request.stream:
+            return StreamingResponse(server.stream(flight, coalesced), media_type="text/event-stream",
+                                     headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        try:
+            await flight.wait()
+        finally:
+            flight.subscribers -= 1
+        result = server.result(flight, coalesced)
+        status_code = 503 if flight.overloaded else 500 if flight.error else 200
+        return JSONResponse(result, status_code=status_code)
+
+    return app
+
+app = create_app()
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Service HTTP du système RAG (SSE).")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,10 @@ class GraphState(TypedDict):
         generation: The LLM's generated answer.
         documents: A list of retrieved documents.
         file_paths: Paths to any user-uploaded files for the current query.
-        web_search: A flag indicating if a web search is needed.
+        web_search_needed: A flag indicating if a web search is needed (the node itself is
+            named "web_search", and LangGraph forbids a state key with a node's name).
+        next: The branch chosen by the routing node.
+        route: How the question was routed ("local" or "llm").
         query_rewrite_count: A counter for query rewrite attempts.
         generation_count: A counter for generation attempts (for hallucination retries).
     
@@ -21,8 +24,9 @@ class GraphState(TypedDict):
     generation: str
     documents: List[Any]  # Can be Document objects or strings
     file_paths: List[str]
-    web_search: bool
+    web_search_needed: bool
     query_rewrite_count: int
     generation_count: int
     route: str
+    next: str
     #retriever: Optional[Any]
@@ -17,8 +17,12 @@ import logging
 import streamlit as st
 
 # --- Import RAG system & ingestion ---
-from graph import rag_system
-from ingestion.ingestion import create_retriever_from_files
+from graph import get_rag_system
+from Node_constant import GENERATE, GENERATION_TOKEN, SEMANTIC_CACHE
+from ingestion.retriever_cache import retriever_registry
+from ingestion.models import model_registry
+from ingestion.sessions import get_session_registry
+from instrumentation import RequestTrace
 
 # --- Page config ---
 st.set_page_config(page_title="NewsAI - Adaptive RAG System", page_icon="🚀", layout="wide")
@@ -57,7 +61,7 @@ os.makedirs(TEMP_DIR, exist_ok=True)
 
 # --- Initialize RAG System ---
 try:
-    rag_system_instance = rag_system
+    rag_system_instance = get_rag_system()
     system_status = "✅ System Operational"
     system_class = "status-success"
 except Exception as e:
@@ -65,6 +69,19 @@ except Exception as e:
     system_class = "status-warning"
     st.error(f"Failed to initialize RAG system: {e}")
 
+# --- Préchargement des modèles (une fois par processus, en arrière-plan) ---
+@st.cache_resource
+def warm_models():
+    return model_registry.warmup(background=True)
+
+if os.getenv("MODEL_WARMUP", "true").lower() == "true":
+    warm_models()
+
+# --- Session (corpus multi-tenant dans le store partagé des uploads) ---
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+SESSION_DIR = os.path.join(TEMP_DIR, st.session_state.session_id)
+
 # --- Main Header ---
 st.markdown("""
 <div class="main-header">
@@ -95,14 +112,21 @@ with st.sidebar:
                 with st.spinner("🔄 Processing documents..."):
                     try:
                         file_paths = []
+                        os.makedirs(SESSION_DIR, exist_ok=True)
                         for uploaded_file in uploaded_files:
-                            temp_path = os.path.join(TEMP_DIR, uploaded_file.name)
+                            temp_path = os.path.join(SESSION_DIR, uploaded_file.name)
                             with open(temp_path, "wb") as f:
                                 f.write(uploaded_file.getvalue())
                             file_paths.append(temp_path)
-                        
-                        # Stocker uniquement les chemins, ne pas stocker le retriever
+
+                        # Rattacher les fichiers à la session avant l'ingestion (le GC ne
+                        # collecte jamais une source référencée par une session vivante)
+                        get_session_registry().attach(st.session_state.session_id, file_paths)
+                        # Construire l'index une seule fois : le registre le partage entre
+                        # les questions (et les sessions) tant que le contenu ne change pas.
+                        corpus_key, _ = retriever_registry.get_or_create(file_paths)
                         st.session_state["uploaded_files_paths"] = file_paths
+                        st.session_state["corpus_key"] = corpus_key
                         st.session_state.document_names = [f.name for f in uploaded_files]
                         st.success("✅ Documents processed!")
                         st.balloons()
@@ -110,11 +134,12 @@ with st.sidebar:
                         st.error(f"❌ Error: {e}")
         with col2:
             if st.button("🗑️ Clear", use_container_width=True):
-                for key in ['uploaded_files_paths', 'document_names', 'messages']:
+                for key in ['uploaded_files_paths', 'corpus_key', 'document_names', 'messages']:
                     st.session_state.pop(key, None)
-                if os.path.exists(TEMP_DIR):
-                    shutil.rmtree(TEMP_DIR)
-                    os.makedirs(TEMP_DIR)
+                get_session_registry().end(st.session_state.session_id)
+                # Seuls les fichiers de cette session sont supprimés
+                if os.path.exists(SESSION_DIR):
+                    shutil.rmtree(SESSION_DIR)
                 st.success("🗑️ Documents and chat cleared!")
                 st.rerun()
 
@@ -127,6 +152,7 @@ with st.sidebar:
     if st.button("🧹 Clear Cache", use_container_width=True):
         st.cache_data.clear()
         st.cache_resource.clear()
+        retriever_registry.clear()
         st.success("Cache cleared! Restarting...")
         time.sleep(1)
         st.rerun()
@@ -156,33 +182,47 @@ if prompt := st.chat_input("💭 Ask your question..."):
         st.markdown(f'<div class="chat-message">{prompt}</div>', unsafe_allow_html=True)
 
     with st.chat_message("assistant"):
-        # Re-créer le retriever à la volée
+        # Réutiliser le retriever construit au "Process" (reconstruit seulement s'il a été évincé)
         retriever_for_this_query = None
-        if "uploaded_files_paths" in st.session_state:
-            retriever_for_this_query = create_retriever_from_files(st.session_state["uploaded_files_paths"])
+        if "corpus_key" in st.session_state:
+            get_session_registry().touch(st.session_state.session_id)
+            retriever_for_this_query = retriever_registry.get(st.session_state["corpus_key"])
+            if retriever_for_this_query is None:
+                corpus_key, retriever_for_this_query = retriever_registry.get_or_create(st.session_state["uploaded_files_paths"])
+                st.session_state["corpus_key"] = corpus_key
 
         status_text = "📚 Using your documents..." if retriever_for_this_query else "🌐 Using general knowledge..."
         st.markdown(f'<div class="status-indicator status-info">{status_text}</div>', unsafe_allow_html=True)
 
         config = {"configurable": {"thread_id": st.session_state.thread_id}}
+        trace = RequestTrace(question=prompt)
 
         response_stream = rag_system_instance.run(
             prompt,
             retriever=retriever_for_this_query,
-            config=config
+            config=config,
+            stream_tokens=True,
+            corpus_fingerprint=st.session_state.get("corpus_key"),
+            router=retriever_registry.router(st.session_state["corpus_key"]) if "corpus_key" in st.session_state else None,
+            trace=trace,
         )
 
         response_container = st.empty()
         full_response = ""
 
         for event in response_stream:
-            if isinstance(event, dict):
-                for node_output in event.values():
-                    if isinstance(node_output, dict) and "generation" in node_output:
-                        chunk = node_output["generation"]
-                        if chunk:
-                            full_response += chunk
-                            response_container.markdown(f'<div class="chat-message">{full_response}</div>', unsafe_allow_html=True)
+            if not isinstance(event, dict):
+                continue
+            if GENERATION_TOKEN in event:
+                # Affichage token par token pendant la génération
+                full_response += event[GENERATION_TOKEN]
+                response_container.markdown(f'<div class="chat-message">{full_response}</div>', unsafe_allow_html=True)
+                continue
+            node_output = event.get(GENERATE) or event.get(SEMANTIC_CACHE)
+            if isinstance(node_output, dict) and node_output.get("generation"):
+                # La réponse complète fait foi (ex: message d'erreur non streamé)
+                full_response = node_output["generation"]
+                response_container.markdown(f'<div class="chat-message">{full_response}</div>', unsafe_allow_html=True)
 
         if full_response:
             st.session_state.messages.append({"role": "assistant", "content": full_response})
@@ -190,3 +230,7 @@ if prompt := st.chat_input("💭 Ask your question..."):
             fallback_msg = "Sorry, I was unable to generate a response. Please try rephrasing your question."
             response_container.markdown(f'<div class="chat-message">{fallback_msg}</div>', unsafe_allow_html=True)
             st.session_state.messages.append({"role": "assistant", "content": fallback_msg})
+
+        # Temps, tokens et hits de cache de chaque étape (cf. instrumentation.py)
+        with st.expander(f"⏱️ Execution trace ({trace.seconds:.2f}s)"):
+            st.json(trace.to_dict())
@@ -0,0 +1,29 @@
+import asyncio
+import json
+
+from Node_constant import GENERATE
+from batch_qa import answer_questions
+
+
+class StubRAG:
+    async def arun(self, question, **kwargs):
+        await asyncio.sleep(0.01 if question == "slow" else 0)
+        if question == "boom":
+            raise RuntimeError("llm down")
+        yield {GENERATE: {"generation": f"answer to {question}", "documents": []}}
+
+
+def test_failing_callback_does_not_close_the_output_under_other_questions(tmp_path):
+    output = tmp_path / "answers.jsonl"
+    questions = [{"id": str(i), "question": q} for i, q in enumerate(["fast", "boom", "slow"])]
+
+    def on_result(record):
+        if record["question"] == "fast":
+            raise ValueError("callback failed")
+
+    summary = asyncio.run(answer_questions(questions, str(output), rag=StubRAG(), concurrency=3, on_result=on_result))
+    records = {r["question"]: r for r in map(json.loads, output.read_text().splitlines())}
+    assert set(records) == {"fast", "boom", "slow"}
+    assert records["slow"]["answer"] == "answer to slow"
+    assert records["boom"]["error"] == "RuntimeError: llm down"
+    assert summary["errors"] == 1 and summary["answered"] == 2
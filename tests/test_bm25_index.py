@@ -0,0 +1,111 @@
+import threading
+
+from langchain_core.documents import Document
+
+from ingestion import bm25_index
+from ingestion.bm25_index import BM25Index
+
+
+def chunk(chunk_id, text, content_hash="a"):
+    return Document(page_content=text, metadata={"chunk_id": chunk_id, "content_hash": content_hash})
+
+
+def ids(results):
+    return [document.metadata["chunk_id"] for document, _ in results]
+
+
+def test_add_remove_search():
+    index = BM25Index.from_documents([
+        chunk("c1", "photosynthesis converts light energy"),
+        chunk("c2", "the calvin cycle fixes carbon dioxide"),
+        chunk("c3", "light reactions split water", content_hash="b"),
+    ])
+    assert ids(index.search("light energy", k=2)) == ["c1", "c3"]
+    assert ids(index.search("light", k=5, where={"content_hash": "b"})) == ["c3"]
+
+    assert index.remove(["c1", "missing"]) == 1
+    assert ids(index.search("light energy", k=2)) == ["c3"]
+    assert len(index) == 2
+
+    # Re-adding a chunk_id replaces the previous version
+    index.add_documents([chunk("c2", "carbon fixation happens in the stroma")])
+    assert ids(index.search("stroma", k=5)) == ["c2"]
+    assert index.search("calvin", k=5) == []
+    assert sorted(index.chunk_ids()) == ["c2", "c3"]
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    index = BM25Index.from_documents([chunk(f"c{i}", f"term{i} shared words") for i in range(10)])
+    index.remove(["c0", "c1", "c2", "c3"])  # past the compaction ratio
+    index.save(str(tmp_path))
+
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded is not None
+    assert sorted(loaded.chunk_ids()) == sorted(index.chunk_ids())
+    for query in ("term5", "shared words", "term0"):
+        assert loaded.search(query, k=3) == index.search(query, k=3)
+
+
+def test_load_missing_directory(tmp_path):
+    assert BM25Index.load(str(tmp_path / "absent")) is None
+
+
+def test_search_snapshot_is_consistent_with_concurrent_add(monkeypatch):
+    index = BM25Index.from_documents([chunk("seed", "seed document")])
+    index.search("seed")  # build the CSR view
+    real_tokenize = bm25_index.tokenize
+    adder = threading.Thread(target=index.add_documents, args=([chunk("new", "brandnew term")],))
+
+    def tokenize_then_add(text):
+        # Another session adds a chunk with a new term while this search is in flight
+        adder.start()
+        adder.join(timeout=0.2)
+        monkeypatch.setattr(bm25_index, "tokenize", real_tokenize)
+        return real_tokenize(text)
+
+    monkeypatch.setattr(bm25_index, "tokenize", tokenize_then_add)
+    index.search("seed brandnew")
+    adder.join()
+    assert ids(index.search("brandnew")) == ["new"]
+
+
+def test_save_appends_to_the_journal_until_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25_index, "BM25_COMPACT_RATIO", 0.5)
+    directory = str(tmp_path)
+    index = BM25Index.from_documents([chunk(f"c{i}", f"term{i} shared words") for i in range(8)])
+    index.save(directory)
+    snapshot = (tmp_path / "index.json").read_bytes()
+
+    index.add_documents([chunk("n1", "fresh words")])
+    index.save(directory)
+    index.remove(["c0", "c1"])
+    index.save(directory)
+    assert (tmp_path / "index.json").read_bytes() == snapshot  # only the journal was written
+    assert len((tmp_path / "journal.1.jsonl").read_text().splitlines()) == 2
+
+    loaded = BM25Index.load(directory)
+    assert sorted(loaded.chunk_ids()) == sorted(index.chunk_ids())
+    assert loaded.search("fresh shared", k=3) == index.search("fresh shared", k=3)
+
+    # 3 journaled changes + 2 more exceed half of the 8-chunk snapshot: rewrite
+    index.add_documents([chunk("n2", "more words"), chunk("n3", "even more words")])
+    index.save(directory)
+    assert (tmp_path / "index.json").read_bytes() != snapshot
+    assert not (tmp_path / "journal.1.jsonl").exists()
+    assert sorted(BM25Index.load(directory).chunk_ids()) == sorted(index.chunk_ids())
+
+
+def test_load_ignores_a_torn_journal_line(tmp_path):
+    directory = str(tmp_path)
+    index = BM25Index.from_documents([chunk(f"c{i}", f"term{i} shared words") for i in range(8)])
+    index.save(directory)
+    index.remove(["c0"])
+    index.save(directory)
+    with open(tmp_path / "journal.1.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"remove": ["c1"')  # save interrupted mid-line
+
+    loaded = BM25Index.load(directory)
+    assert "c0" not in loaded.chunk_ids() and "c1" in loaded.chunk_ids()
+    loaded.remove(["c2"])
+    loaded.save(directory)
+    assert sorted(BM25Index.load(directory).chunk_ids()) == ["c1"] + [f"c{i}" for i in range(3, 8)]
@@ -0,0 +1,119 @@
+import time
+from typing import List, TypedDict
+
+import pytest
+from langchain_core.documents import Document
+from langgraph.graph import END, StateGraph
+
+import checkpointer
+from checkpointer import BoundedMemorySaver
+
+needs_sqlite = pytest.mark.skipif(checkpointer.SqliteSaver is None, reason="langgraph-checkpoint-sqlite not installed")
+
+
+class State(TypedDict):
+    question: str
+    documents: List[Document]
+
+
+def retrieve(state):
+    return {"documents": [Document(page_content=f"text about {state['question']}" * 50,
+                                   metadata={"chunk_id": f"{state['question']}-0", "source": "a.txt", "score": 0.9})]}
+
+
+def build(saver):
+    workflow = StateGraph(State)
+    workflow.add_node("retrieve", retrieve)
+    workflow.set_entry_point("retrieve")
+    workflow.add_edge("retrieve", END)
+    return workflow.compile(checkpointer=saver)
+
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id}}
+
+
+@pytest.fixture(params=["memory", pytest.param("sqlite", marks=needs_sqlite)])
+def make_saver(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return BoundedMemorySaver(**kwargs)
+        kwargs.pop("max_threads", None)
+        return checkpointer.BoundedSqliteSaver.from_path(str(tmp_path / "checkpoints.sqlite3"), **kwargs)
+    return make
+
+
+def test_history_is_pruned_per_thread(make_saver):
+    saver = make_saver(max_history=2)
+    app = build(saver)
+    for question in ("alpha", "beta", "gamma"):
+        app.invoke({"question": question, "documents": []}, config("t1"))
+    app.invoke({"question": "delta", "documents": []}, config("t2"))
+    assert len(list(saver.list(config("t1")))) == 2
+    assert len(list(saver.list(config("t2")))) == 2
+    assert saver.get_tuple(config("t1")).checkpoint["channel_values"]["question"] == "gamma"
+
+
+def test_documents_are_stored_as_references(make_saver):
+    saver = make_saver()
+    app = build(saver)
+    result = app.invoke({"question": "alpha", "documents": []}, config("t1"))
+    assert isinstance(result["documents"][0], Document)  # the run itself sees full documents
+    stored = saver.get_tuple(config("t1"))
+    assert stored.checkpoint["channel_values"]["documents"] == [{"chunk_id": "alpha-0", "source": "a.txt"}]
+    writes = stored.metadata.get("writes") or {}
+    for output in writes.values():
+        assert all(isinstance(doc, dict) for doc in (output or {}).get("documents", []))
+
+
+def test_compaction_can_be_disabled(make_saver):
+    saver = make_saver(compact_channels=())
+    build(saver).invoke({"question": "alpha", "documents": []}, config("t1"))
+    documents = saver.get_tuple(config("t1")).checkpoint["channel_values"]["documents"]
+    assert documents[0].metadata["score"] == 0.9
+
+
+def test_memory_saver_drops_blobs_of_pruned_checkpoints():
+    saver = BoundedMemorySaver(max_history=1)
+    app = build(saver)
+    app.invoke({"question": "alpha", "documents": []}, config("t1"))
+    blobs = saver.stats()["blobs"]
+    for question in ("beta", "gamma", "delta"):
+        app.invoke({"question": question, "documents": []}, config("t1"))
+    assert saver.stats()["blobs"] == blobs and saver.stats()["checkpoints"] == 1
+
+
+def test_memory_saver_evicts_idle_threads_after_ttl():
+    saver = BoundedMemorySaver(ttl_seconds=0.05)
+    app = build(saver)
+    app.invoke({"question": "alpha", "documents": []}, config("idle"))
+    time.sleep(0.1)
+    app.invoke({"question": "beta", "documents": []}, config("active"))
+    assert saver.get_tuple(config("idle")) is None
+    assert saver.get_tuple(config("active")) is not None
+    assert saver.stats()["threads"] == 1 and saver.stats()["evicted_threads"] == 1
+
+
+def test_memory_saver_evicts_least_recently_used_thread():
+    saver = BoundedMemorySaver(max_threads=2)
+    app = build(saver)
+    app.invoke({"question": "alpha", "documents": []}, config("a"))
+    app.invoke({"question": "beta", "documents": []}, config("b"))
+    saver.get_tuple(config("a"))  # "a" is now more recent than "b"
+    app.invoke({"question": "gamma", "documents": []}, config("c"))
+    assert saver.get_tuple(config("b")) is None
+    assert saver.get_tuple(config("a")) is not None and saver.get_tuple(config("c")) is not None
+    assert not any(key[0] == "b" for key in saver.blobs)
+
+
+@needs_sqlite
+def test_sqlite_saver_sweeps_idle_threads(tmp_path):
+    saver = checkpointer.BoundedSqliteSaver.from_path(str(tmp_path / "checkpoints.sqlite3"), ttl_seconds=0.05, sweep_interval=0)
+    app = build(saver)
+    app.invoke({"question": "alpha", "documents": []}, config("idle"))
+    time.sleep(0.1)
+    app.invoke({"question": "beta", "documents": []}, config("active"))
+    assert saver.get_tuple(config("idle")) is None
+    assert saver.get_tuple(config("active")) is not None
+    rows = saver.conn.execute("SELECT thread_id FROM thread_activity").fetchall()
+    assert rows == [("active",)]
@@ -0,0 +1,54 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from ingestion.chunker import FastSemanticChunker
+
+TOPICS = ("alpha", "beta", "gamma")
+
+
+class TopicEmbeddings:
+    """One axis per topic word, weighted by its count; records every batch it embeds."""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(list(texts))
+        vectors = np.array([[text.count(topic) for topic in TOPICS] + [0.01] for text in texts], dtype=np.float32)
+        return vectors.tolist()
+
+
+def chunker(**kwargs):
+    embeddings = TopicEmbeddings()
+    return FastSemanticChunker(embeddings, **{"buffer_size": 0, **kwargs}), embeddings
+
+
+def test_chunks_break_where_the_topic_changes():
+    text = " ".join(["The alpha sentence is here."] * 4 + ["Now a beta sentence follows."] * 4)
+    splitter, _ = chunker(breakpoint_threshold_amount=50)
+    chunks, vectors = splitter.split_documents_with_embeddings([Document(page_content=text, metadata={"source": "a"})])
+    assert [c.page_content.count("alpha") for c in chunks] == [4, 0]
+    assert [c.page_content.count("beta") for c in chunks] == [0, 4]
+    assert all(c.metadata == {"source": "a"} for c in chunks)
+    assert np.argmax(vectors[0]) == 0 and np.argmax(vectors[1]) == 1
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+
+def test_chunks_never_exceed_the_size_limit():
+    sentences = [f"Sentence {i} about alpha." for i in range(20)]
+    splitter, embeddings = chunker(max_chunk_chars=60)
+    chunks, vectors = splitter.split_documents_with_embeddings([Document(page_content=" ".join(sentences))])
+    assert all(len(c.page_content) <= 60 for c in chunks)
+    assert " ".join(c.page_content for c in chunks) == " ".join(sentences)
+    assert len(vectors) == len(chunks) and len(embeddings.batches) == 1  # sentence vectors reused
+
+
+def test_overlong_sentence_pieces_get_their_own_vectors():
+    sentence = "alpha " * 10 + "gamma " * 10 + "beta " * 5
+    splitter, embeddings = chunker(max_chunk_chars=60)
+    chunks, vectors = splitter.split_documents_with_embeddings(
+        [Document(page_content="A beta sentence. " + sentence.strip())])
+    pieces = [c.page_content for c in chunks[1:]]
+    assert "".join(pieces) == sentence.strip() and all(len(p) <= 60 for p in pieces)
+    assert embeddings.batches[1] == pieces  # one extra batch, for the pieces only
+    assert [TOPICS[int(np.argmax(v[:3]))] for v in vectors[1:]] == ["alpha", "gamma", "beta"]
@@ -0,0 +1,48 @@
+import asyncio
+import logging
+import sys
+import types
+
+import instrumentation
+from instrumentation import install_client_retry_counter, metrics
+
+
+def fake_client_module(monkeypatch):
+    module = types.ModuleType("fake_base_client")
+
+    class SyncAPIClient:
+        def _sleep_for_retry(self, *, retries_taken):
+            logging.getLogger("fake_base_client").info("Retrying request to /x in 0 seconds")
+
+    class AsyncAPIClient:
+        async def _sleep_for_retry(self, *, retries_taken):
+            logging.getLogger("fake_base_client").info("Retrying request to /x in 0 seconds")
+
+    module.SyncAPIClient, module.AsyncAPIClient = SyncAPIClient, AsyncAPIClient
+    monkeypatch.setitem(sys.modules, "fake_base_client", module)
+    monkeypatch.setattr(instrumentation, "_retry_handler_installed", False)
+    return module
+
+
+def retries():
+    return metrics.retries.snapshot().get("unknown", 0.0)
+
+
+def test_client_retries_are_counted_without_changing_the_logger_level(monkeypatch):
+    module = fake_client_module(monkeypatch)
+    client_logger = logging.getLogger("fake_base_client")
+    client_logger.setLevel(logging.WARNING)
+    before = retries()
+
+    install_client_retry_counter(("fake_base_client",))
+    install_client_retry_counter(("fake_base_client",))  # idempotent
+    module.SyncAPIClient()._sleep_for_retry(retries_taken=0)
+    asyncio.run(module.AsyncAPIClient()._sleep_for_retry(retries_taken=1))
+
+    assert retries() == before + 2
+    assert client_logger.level == logging.WARNING and not client_logger.handlers
+
+
+def test_missing_client_module_is_ignored(monkeypatch):
+    monkeypatch.setattr(instrumentation, "_retry_handler_installed", False)
+    install_client_retry_counter(("no_such_client_module",))
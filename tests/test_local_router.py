@@ -0,0 +1,60 @@
+import zlib
+
+import numpy as np
+
+from chains.local_router import LocalRouter, content_terms
+
+CORPUS = [
+    "Photosynthesis converts sunlight into chemical energy stored in glucose.",
+    "Chlorophyll absorbs sunlight in the chloroplasts of plant leaves.",
+    "Plants release oxygen during photosynthesis and take in carbon dioxide.",
+    "The Calvin cycle fixes carbon dioxide into sugars using ATP from the light reactions.",
+    "Leaves open their stomata to exchange carbon dioxide and oxygen with the air.",
+    "Chloroplasts contain thylakoid membranes where the light reactions happen.",
+]
+
+
+def embed(text):
+    """Bag of hashed content words: shared words give a high cosine similarity."""
+    vector = np.zeros(256, dtype=np.float32)
+    for term in content_terms(text):
+        vector[zlib.crc32(term.encode()) % 256] += 1.0
+    return vector.tolist()
+
+
+def router():
+    return LocalRouter.from_embeddings([embed(text) for text in CORPUS], CORPUS, n_prototypes=3, embed_fn=embed)
+
+
+def test_question_words_do_not_count_against_the_corpus():
+    local = router()
+    assert content_terms("How does photosynthesis relate to chlorophyll and sunlight?") == [
+        "photosynthesis", "relate", "chlorophyll", "sunlight"]
+    assert local._overlap(content_terms("How does photosynthesis relate to chlorophyll and sunlight?")) > 0.6
+
+
+def test_on_topic_question_goes_to_the_corpus():
+    decision = router().decide("Where do the light reactions happen in chloroplasts?")
+    assert decision.datasource == "vectorstore"
+
+
+def test_on_topic_question_with_low_similarity_is_left_to_the_llm():
+    # The embedding disagrees but the words are the corpus' own
+    question = "How does photosynthesis relate to chlorophyll and sunlight?"
+    decision = router().decide(question, vector=-np.asarray(embed(question)))
+    assert decision.similarity < 0.25
+    assert decision.datasource is None
+
+
+def test_off_topic_question_goes_to_the_web():
+    decision = router().decide("Who won the football world cup final?")
+    assert decision.datasource == "web_search"
+    assert decision.reason == "far from corpus topics"
+
+
+def test_fresh_question_goes_to_the_web():
+    assert router().decide("What is the latest research on photosynthesis?").datasource == "web_search"
+
+
+def test_question_without_content_words_is_left_to_the_llm():
+    assert router().decide("What is it?").datasource is None
@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from cache.semantic_cache import InMemoryCacheBackend, SemanticCache, SQLiteCacheBackend
+
+AXES = {"alpha": 0, "beta": 1, "gamma": 2, "delta": 3}
+
+
+def embed(question):
+    """One axis per keyword; 'almost' tilts the vector slightly (cosine ~0.995)."""
+    vector = np.zeros(8, dtype=np.float32)
+    for word, axis in AXES.items():
+        if word in question:
+            vector[axis] = 1.0
+    if "almost" in question:
+        vector[7] = 0.1
+    if "half" in question:
+        vector[7] = 1.0
+    return vector.tolist()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(**kwargs):
+        backend = InMemoryCacheBackend() if request.param == "memory" else SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"))
+        return SemanticCache(backend=backend, embed_fn=embed, **kwargs)
+    return make
+
+
+def store(cache, question, fingerprint="corpus-a"):
+    cache.store(question, fingerprint, f"answer to {question}", [Document(page_content="ctx", metadata={"source": "a.txt"})])
+
+
+def test_hit_above_threshold_only(make_cache):
+    cache = make_cache(threshold=0.95)
+    store(cache, "what is alpha")
+    hit = cache.lookup("almost alpha", "corpus-a")
+    assert hit is not None and hit.generation == "answer to what is alpha"
+    assert hit.documents()[0].metadata == {"source": "a.txt"}
+    assert cache.lookup("half alpha", "corpus-a") is None  # cosine ~0.71
+    assert cache.lookup("beta", "corpus-a") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_fingerprints_are_isolated(make_cache):
+    cache = make_cache()
+    store(cache, "alpha", fingerprint="corpus-a")
+    assert cache.lookup("alpha", "corpus-b") is None
+    store(cache, "alpha", fingerprint="corpus-b")
+    assert cache.lookup("alpha", "corpus-a").fingerprint == "corpus-a"
+    assert cache.lookup("alpha", "corpus-b").fingerprint == "corpus-b"
+
+
+def test_entries_expire_after_ttl(make_cache):
+    cache = make_cache(ttl_seconds=0.05)
+    store(cache, "alpha")
+    assert cache.lookup("alpha", "corpus-a") is not None
+    time.sleep(0.1)
+    assert cache.lookup("alpha", "corpus-a") is None
+    store(cache, "beta")  # storing evicts the expired entry
+    assert len(cache.backend) == 1
+
+
+def test_least_recently_used_entry_is_evicted(make_cache):
+    cache = make_cache(max_entries=2)
+    store(cache, "alpha")
+    time.sleep(0.01)
+    store(cache, "beta")
+    time.sleep(0.01)
+    assert cache.lookup("alpha", "corpus-a") is not None  # alpha is now the most recent
+    time.sleep(0.01)
+    store(cache, "gamma")
+    assert len(cache.backend) == 2
+    assert cache.lookup("beta", "corpus-a") is None
+    assert cache.lookup("alpha", "corpus-a") is not None
+    assert cache.lookup("gamma", "corpus-a") is not None
+
+
+def test_async_run_keeps_cache_io_off_the_event_loop(tmp_path):
+    import asyncio
+    import threading
+
+    from langgraph.checkpoint.memory import MemorySaver
+
+    from Node_constant import GENERATE, SEMANTIC_CACHE
+    from graph import AdaptiveRAGSystem
+
+    class RecordingCache(SemanticCache):
+        def lookup(self, *args, **kwargs):
+            threads.append(threading.get_ident())
+            return super().lookup(*args, **kwargs)
+
+        def store(self, *args, **kwargs):
+            threads.append(threading.get_ident())
+            return super().store(*args, **kwargs)
+
+    class StubApp:
+        async def astream(self, state, config=None):
+            yield {GENERATE: {"generation": "alpha is a letter", "documents": []}}
+
+    threads = []
+    cache = RecordingCache(backend=SQLiteCacheBackend(str(tmp_path / "cache.sqlite3")), embed_fn=embed)
+    rag = AdaptiveRAGSystem(semantic_cache=cache, use_local_router=False, checkpointer=MemorySaver(),
+                            instrument=False, speculation="off")
+    rag.app = StubApp()
+
+    async def ask():
+        return [event async for event in rag.arun("alpha", corpus_fingerprint="corpus-a")], threading.get_ident()
+
+    first, loop_thread = asyncio.run(ask())
+    second, _ = asyncio.run(ask())
+    assert GENERATE in first[0]
+    assert second == [{SEMANTIC_CACHE: {"generation": "alpha is a letter", "documents": []}}]
+    assert len(threads) == 3 and loop_thread not in threads
@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+
+from Node_constant import GENERATE
+from server import AskRequest, RAGServer, create_app
+
+
+class StubRAG:
+    """Emits a routing event, then waits for `release` before generating."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.calls = []
+        self.finished = 0
+        self.route_stats = {}
+
+    async def arun(self, question, config=None, **kwargs):
+        self.calls.append((question, config["configurable"]["thread_id"]))
+        yield {"route_question": {"datasource": "vectorstore"}}
+        await self.release.wait()
+        yield {GENERATE: {"generation": f"answer to {question}", "documents": []}}
+        self.finished += 1
+
+
+async def started(rag, tmp_path, **kwargs):
+    kwargs = {"max_in_flight": 1, "max_queue": 0, **kwargs}
+    server = RAGServer(rag=rag, micro_batching=False, default_corpus=False, upload_root=str(tmp_path), **kwargs)
+    await server.startup()
+    return server
+
+
+def client(server):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(server)), base_url="http://test")
+
+
+async def until(predicate, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def sse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        name, data = block.split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def pending(server, question, thread_id=None):
+    return server.coalescer.pending(server.coalescer.key(question, None, thread_id))
+
+
+def test_full_queue_returns_503_but_identical_questions_still_join(tmp_path):
+    async def scenario():
+        rag = StubRAG()
+        server = await started(rag, tmp_path)
+        async with client(server) as http:
+            first = asyncio.create_task(http.post("/ask", json={"question": "What is alpha?", "stream": False}))
+            await until(lambda: server.gate.running == 1)
+            rejected = await http.post("/ask", json={"question": "beta", "stream": False})
+            joined = asyncio.create_task(http.post("/ask", json={"question": "what is ALPHA", "stream": False}))
+            await until(lambda: server.coalescer.coalesced == 1)
+            rag.release.set()
+            return rejected, await first, await joined, server
+
+    rejected, first, joined, server = asyncio.run(scenario())
+    assert rejected.status_code == 503 and rejected.headers["Retry-After"] == "1"
+    assert first.status_code == 200 and first.json()["answer"] == "answer to What is alpha?"
+    assert joined.status_code == 200 and joined.json()["coalesced"] is True
+    assert server.gate.stats()["rejected"] == 1 and server.coalescer.executions == 1
+
+
+def test_queued_run_gives_up_after_the_queue_timeout(tmp_path):
+    async def scenario():
+        rag = StubRAG()
+        server = await started(rag, tmp_path, max_queue=1)
+        server.gate.queue_timeout = 0.05
+        async with client(server) as http:
+            first = asyncio.create_task(http.post("/ask", json={"question": "alpha", "stream": False}))
+            await until(lambda: server.gate.running == 1)
+            queued = await http.post("/ask", json={"question": "beta", "stream": False})
+            rag.release.set()
+            await first
+        return queued, server
+
+    queued, server = asyncio.run(scenario())
+    assert queued.status_code == 503
+    assert "file d'attente saturée" in queued.json()["error"]
+    assert server.gate.stats() == {"running": 0, "waiting": 0, "max_in_flight": 1, "max_queue": 1, "rejected": 1}
+
+
+def test_late_subscriber_replays_earlier_events(tmp_path):
+    async def scenario():
+        rag = StubRAG()
+        server = await started(rag, tmp_path)
+        async with client(server) as http:
+            first = asyncio.create_task(http.post("/ask", json={"question": "alpha"}))
+            await until(lambda: pending(server, "alpha") is not None and pending(server, "alpha").events)
+            late = asyncio.create_task(http.post("/ask", json={"question": "Alpha!"}))
+            await until(lambda: server.coalescer.coalesced == 1)
+            rag.release.set()
+            return sse_events((await first).text), sse_events((await late).text), rag
+
+    first, late, rag = asyncio.run(scenario())
+    assert [name for name, _ in late] == [name for name, _ in first] == ["node", "node", "done"]
+    assert late[0][1] == {"node": "route_question", "datasource": "vectorstore"}
+    assert late[-1][1]["answer"] == "answer to alpha" and late[-1][1]["coalesced"] is True
+    assert len(rag.calls) == 1
+
+
+def test_disconnected_client_does_not_cancel_the_run(tmp_path):
+    async def scenario():
+        rag = StubRAG()
+        server = await started(rag, tmp_path)
+        flight, _ = await server.ask(AskRequest(question="alpha"))
+        stream = server.stream(flight, False)
+        assert "route_question" in await stream.__anext__()
+        await stream.aclose()  # the client went away
+        assert flight.subscribers == 0
+        rag.release.set()
+        await flight.wait()
+        return flight, rag
+
+    flight, rag = asyncio.run(scenario())
+    assert flight.error is None and flight.answer == "answer to alpha" and rag.finished == 1
+
+
+def test_only_requests_of_the_same_thread_are_coalesced(tmp_path):
+    async def scenario():
+        rag = StubRAG()
+        server = await started(rag, tmp_path, max_in_flight=4)
+        first, _ = await server.ask(AskRequest(question="alpha", thread_id="t1"))
+        other, other_coalesced = await server.ask(AskRequest(question="alpha", thread_id="t2"))
+        same, same_coalesced = await server.ask(AskRequest(question="alpha", thread_id="t1"))
+        rag.release.set()
+        await asyncio.gather(first.wait(), other.wait())
+        return first, other, other_coalesced, same, same_coalesced, rag
+
+    first, other, other_coalesced, same, same_coalesced, rag = asyncio.run(scenario())
+    assert other is not first and not other_coalesced
+    assert same is first and same_coalesced
+    assert sorted(thread_id for _, thread_id in rag.calls) == ["t1", "t2"]
+
+
+@pytest.fixture
+def upload_root(tmp_path, monkeypatch):
+    from ingestion.retriever_cache import retriever_registry
+
+    root = tmp_path / "uploads"
+    (root / "docs").mkdir(parents=True)
+    (root / "docs" / "a.txt").write_text("alpha")
+    (root / "empty.txt").write_text("")
+    (tmp_path / "secret.txt").write_text("secret")
+    os.symlink(tmp_path / "secret.txt", root / "link.txt")
+
+    def get_or_create(files):
+        if any(os.path.getsize(path) == 0 for path in files):
+            raise ValueError("Aucun document n'a pu être chargé à partir des fichiers fournis.")
+        registered.append(files)
+        return "corpus-key", object()
+
+    registered = []
+    monkeypatch.setattr(retriever_registry, "get_or_create", get_or_create)
+    return root, registered
+
+
+def post_corpus(root, files):
+    async def scenario():
+        server = RAGServer(rag=StubRAG(), micro_batching=False, upload_root=str(root))
+        async with client(server) as http:
+            return await http.post("/corpora", json={"files": files})
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("path", ["../secret.txt", "docs/../../secret.txt", "link.txt", "ABSOLUTE"])
+def test_corpus_paths_cannot_leave_the_upload_root(upload_root, path):
+    root, registered = upload_root
+    if path == "ABSOLUTE":
+        path = str(root.parent / "secret.txt")
+    response = post_corpus(root, ["docs/a.txt", path])
+    assert response.status_code == 403
+    assert not registered
+
+
+def test_corpus_errors_do_not_reveal_the_upload_root(upload_root):
+    root, registered = upload_root
+    missing = post_corpus(root, ["docs/missing.txt"])
+    assert missing.status_code == 400
+    assert "docs/missing.txt" in missing.json()["detail"] and str(root) not in missing.json()["detail"]
+    assert post_corpus(root, ["empty.txt"]).status_code == 400
+
+
+def test_corpus_files_are_resolved_under_the_upload_root(upload_root):
+    root, registered = upload_root
+    response = post_corpus(root, ["docs/./a.txt"])
+    assert response.status_code == 200 and response.json() == {"corpus_key": "corpus-key"}
+    assert registered == [[os.path.realpath(root / "docs" / "a.txt")]]
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from ingestion.sessions import SessionRegistry
+
+
+class FakeCorpus:
+    """The parts of PersistentCorpus the session GC uses."""
+
+    def __init__(self, directory):
+        self.persist_directory = directory
+        self._lock = threading.Lock()
+        self.sources = {}
+        self.removed = []
+
+    def active_sources(self):
+        with self._lock:
+            return dict(self.sources)
+
+    def remove_sources(self, source_ids):
+        with self._lock:
+            for source_id in source_ids:
+                self.sources.pop(source_id)
+            self.removed.extend(source_ids)
+
+
+def test_gc_removes_only_unreferenced_old_sources(tmp_path):
+    corpus = FakeCorpus(str(tmp_path))
+    kept, orphan, recent = (tmp_path / "kept.txt"), (tmp_path / "orphan.txt"), (tmp_path / "recent.txt")
+    for path in (kept, orphan, recent):
+        path.write_text(path.name)
+    registry = SessionRegistry(corpus, ttl_seconds=60)
+    (kept_hash,) = registry.attach("s1", [str(kept)])
+    old = time.time() - 120
+    corpus.sources = {
+        "sha256:kept": {"content_hash": kept_hash, "ingested_at": old},
+        "sha256:orphan": {"content_hash": "orphan", "ingested_at": old},
+        "sha256:recent": {"content_hash": "recent", "ingested_at": time.time()},
+    }
+    assert registry.collect_garbage() == {"expired_sessions": 0, "removed_sources": 1}
+    assert corpus.removed == ["sha256:orphan"]
+
+
+def test_gc_waits_for_a_running_ingestion(tmp_path):
+    corpus = FakeCorpus(str(tmp_path))
+    registry = SessionRegistry(corpus, ttl_seconds=60)
+    results = []
+    with corpus._lock:  # an ingestion is updating the manifest
+        collector = threading.Thread(target=lambda: results.append(registry.collect_garbage()))
+        collector.start()
+        collector.join(timeout=0.1)
+        assert collector.is_alive()
+        corpus.sources["sha256:old"] = {"content_hash": "old", "ingested_at": time.time() - 120}
+    collector.join(timeout=5)
+    assert results == [{"expired_sessions": 0, "removed_sources": 1}]
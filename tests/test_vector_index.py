@@ -0,0 +1,163 @@
+import os
+
+import numpy as np
+import pytest
+
+from ingestion import vector_index
+from ingestion.vector_index import QuantizedVectorIndex
+
+
+def unit_vectors(n, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def nearest(index, vector):
+    return index.search(vector, k=1)[0][0]
+
+
+def crash(*args, **kwargs):
+    raise OSError("disk full")
+
+
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_interrupted_save_does_not_shift_later_rows(tmp_path, monkeypatch, quantization):
+    directory = str(tmp_path / "vectors")
+    first, lost, second = unit_vectors(4, seed=1), unit_vectors(3, seed=2), unit_vectors(2, seed=3)
+    index = QuantizedVectorIndex(quantization, directory=directory)
+    index.add([f"a{i}" for i in range(4)], first)
+    index.save()
+
+    # Crash after the rows are appended, before index.json is replaced
+    index.add([f"lost{i}" for i in range(3)], lost)
+    monkeypatch.setattr(vector_index.json, "dump", crash)
+    with pytest.raises(OSError):
+        index.save()
+    monkeypatch.undo()
+
+    reloaded = QuantizedVectorIndex.load(directory, quantization)
+    assert reloaded.chunk_ids() == [f"a{i}" for i in range(4)]
+    code_bytes, vector_bytes = reloaded._row_bytes()
+    codes_path, vectors_path, _ = reloaded._paths(directory)
+    assert os.path.getsize(codes_path) == 4 * code_bytes
+    assert os.path.getsize(vectors_path) == 4 * vector_bytes
+
+    reloaded.add(["b0", "b1"], second)
+    reloaded.save()
+    reloaded = QuantizedVectorIndex.load(directory, quantization)
+    for chunk_id, vector in zip(["a0", "a3", "b0", "b1"], [first[0], first[3], second[0], second[1]]):
+        assert nearest(reloaded, vector) == chunk_id
+
+
+def test_append_after_failed_save_in_same_process(tmp_path, monkeypatch):
+    directory = str(tmp_path / "vectors")
+    first, second, third = unit_vectors(3, seed=4), unit_vectors(3, seed=5), unit_vectors(3, seed=8)
+    index = QuantizedVectorIndex("int8", directory=directory)
+    index.add(["a0", "a1", "a2"], first)
+    index.save()
+    index.add(["b0", "b1", "b2"], second)
+    monkeypatch.setattr(vector_index.json, "dump", crash)
+    with pytest.raises(OSError):
+        index.save()
+    monkeypatch.undo()
+
+    # The retry rewrites the pending rows from the last persisted row
+    index.add(["c0", "c1", "c2"], third)
+    index.save()
+    reloaded = QuantizedVectorIndex.load(directory, "int8")
+    assert len(reloaded) == 9
+    for chunk_id, vector in zip(["a1", "b0", "c0", "c2"], [first[1], second[0], third[0], third[2]]):
+        assert nearest(reloaded, vector) == chunk_id
+
+
+def test_load_rejects_missing_rows(tmp_path):
+    directory = str(tmp_path / "vectors")
+    index = QuantizedVectorIndex("int8", directory=directory)
+    index.add(["a0", "a1"], unit_vectors(2))
+    index.save()
+    vectors_path = index._paths(directory)[1]
+    os.truncate(vectors_path, os.path.getsize(vectors_path) - 4)
+    assert QuantizedVectorIndex.load(directory, "int8") is None
+
+
+def test_int8_codes_do_not_depend_on_the_first_batch():
+    small = unit_vectors(8, seed=6) * 0.1  # a first batch with a narrow range
+    large = unit_vectors(8, seed=7)
+    index = QuantizedVectorIndex("int8")
+    index.add([f"s{i}" for i in range(8)], small)
+    index.add([f"l{i}" for i in range(8)], large)
+    codes = index._pending_rows()[0].astype(np.float32) * vector_index.INT8_SCALE
+    assert np.abs(codes - np.concatenate([small, large])).max() <= vector_index.INT8_SCALE / 2 + 1e-6
+
+
+def test_appends_share_one_pending_buffer():
+    index = QuantizedVectorIndex("int8")
+    batches = [unit_vectors(10, seed=20 + i) for i in range(5)]
+    for i, batch in enumerate(batches):
+        index.add([f"b{i}-{j}" for j in range(10)], batch)
+    buffer = index._new_vectors
+    assert len(buffer) == 1024 and index._pending == 50
+    assert np.array_equal(index._pending_rows()[1], np.concatenate(batches))
+    assert nearest(index, batches[3][7]) == "b3-7"
+
+
+def test_search_scans_a_snapshot_outside_the_lock(tmp_path, monkeypatch):
+    import threading
+
+    vectors = unit_vectors(20, seed=8)
+    index = QuantizedVectorIndex("int8", directory=str(tmp_path / "vectors"))
+    index.add([f"p{i}" for i in range(10)], vectors[:10])
+    index.save()
+    index.add([f"n{i}" for i in range(10, 20)], vectors[10:])
+    blocks = QuantizedVectorIndex._blocks
+
+    def mutate_then_scan(view):
+        # Runs while the search is scanning: must neither block nor change what it sees
+        writer = threading.Thread(target=lambda: (index.remove(["p3", "n15"]),
+                                                  index.add([f"x{i}" for i in range(2000)], unit_vectors(2000, seed=9))))
+        writer.start()
+        writer.join(timeout=5)
+        assert not writer.is_alive()
+        yield from blocks(view)
+
+    monkeypatch.setattr(QuantizedVectorIndex, "_blocks", staticmethod(mutate_then_scan))
+    assert [cid for cid, _ in index.search(vectors[15], k=20)][:1] == ["n15"]
+    monkeypatch.undo()
+    assert "n15" not in [cid for cid, _ in index.search(vectors[15], k=20)]
+    assert len(index) == 20 - 2 + 2000
+
+
+def test_vectors_returns_alive_rows_only():
+    vectors = unit_vectors(10, seed=10)
+    index = QuantizedVectorIndex("binary")
+    index.add([f"c{i}" for i in range(10)], vectors, [{"content_hash": "a" if i < 6 else "b"} for i in range(10)])
+    index.remove(["c0"])
+    assert np.array_equal(index.vectors(), vectors[1:])
+    assert np.array_equal(index.vectors(where={"content_hash": "b"}), vectors[6:])
+    assert len(index.vectors(limit=3)) == 3
+
+
+def test_quantized_store_keeps_vectors_out_of_chroma(tmp_path, monkeypatch):
+    from benchmarks.fakes import FakeEmbeddings
+    from ingestion.models import EMBEDDINGS, model_registry
+    from ingestion.store import PersistentCorpus
+
+    monkeypatch.setitem(model_registry._models, EMBEDDINGS, FakeEmbeddings())
+    path = tmp_path / "notes.txt"
+    path.write_text("Photosynthesis converts sunlight into chemical energy. " * 20
+                    + "\n\nThe Calvin cycle fixes carbon dioxide into sugars. " * 20)
+    store = str(tmp_path / "store")
+
+    corpus = PersistentCorpus(store, vector_index="int8")
+    corpus.sync_files([str(path)])
+    stored = corpus.vectorstore._collection.get(include=["embeddings"])
+    assert stored["ids"] and all(len(e) == 1 for e in stored["embeddings"])
+    assert set(corpus.vector_index.chunk_ids()) == set(stored["ids"])
+    assert corpus.vector_index.dim == 384
+
+    # Back to hnsw: the store is re-indexed with real embeddings
+    corpus = PersistentCorpus(store, vector_index="hnsw")
+    assert corpus.vector_index is None and not corpus.manifest.active_sources()
+    corpus.sync_files([str(path)])
+    stored = corpus.vectorstore._collection.get(include=["embeddings"])
+    assert stored["ids"] and all(len(e) == 384 for e in stored["embeddings"])